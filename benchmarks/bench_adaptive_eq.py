@@ -0,0 +1,60 @@
+# bench_adaptive_eq.py
+# Scaling of the tiled adaptive foreground equalization
+# (common.equalize.adaptive_equalize) with the number of threads on a
+# 50 MP plane with an Otsu mask. The global q5e/q5f path is timed too.
+# Run from the repo root: python benchmarks/bench_adaptive_eq.py [max_threads]
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.equalize import adaptive_equalize, foreground_equalize
+
+W, H = 8660, 5774  # 50 MP
+TILES = (8, 8)
+CLIP_LIMIT = 2.0
+
+def time_it(fn, repeats=3):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+def make_plane():
+    # low-frequency blobs plus noise, so tiles differ like on a portrait
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, size=(24, 36), dtype=np.uint8)
+    plane = cv2.resize(coarse, (W, H), interpolation=cv2.INTER_CUBIC)
+    return cv2.add(plane, rng.integers(0, 24, size=(H, W), dtype=np.uint8))
+
+def main():
+    max_threads = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    plane = make_plane()
+    result = foreground_equalize(plane)
+    mask = result["mask"]
+    print("Plane: %dx%d (%.1f MP), %d cores, foreground %.0f%%" % (
+        W, H, W * H / 1e6, os.cpu_count() or 1, 100.0 * result["fg_hist"].sum() / plane.size))
+
+    print("global LUT  : %7.3f s" % time_it(lambda: foreground_equalize(plane)))
+    base = None
+    n = 1
+    while n <= max_threads:
+        t = time_it(lambda: adaptive_equalize(plane, mask, TILES, CLIP_LIMIT,
+                                              global_lut=result["lut"], workers=n))
+        if base is None:
+            base = t
+        print("adaptive x%-2d: %7.3f s  speed-up %.2f" % (n, t, base / t))
+        n = n * 2
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_histogram.py
+# Foreground histogram of a q5-style plane + Otsu mask at 1, 10 and 100 MP:
+#   loop     : the original q5c nested Python loop over mask == 255
+#   np.hist  : np.histogram(plane[mask == 255], bins=256, range=(0, 255))
+#   kernel   : common.histogram.count_levels(plane, mask) (1 and N threads)
+# Run from the repo root: python benchmarks/bench_histogram.py [--threads N]
+# The Python loop takes minutes per 10 MP, so it is timed on BAND_ROWS rows
+# and scaled up. A uint16 (12-bit) plane is timed with the kernel as well.
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.histogram import count_levels
+
+SIZES = [
+    ("1 MP", 1000, 1000),
+    ("10 MP", 4000, 2500),
+    ("100 MP", 12500, 8000),
+]
+BAND_ROWS = 20
+
+def time_it(fn, repeats=3):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, result
+
+def loop_hist(plane, mask, rows):
+    # same loop as the original q5c.main(), limited to `rows` rows
+    hist = [0] * 256
+    w = plane.shape[1]
+    y = 0
+    while y < rows:
+        x = 0
+        while x < w:
+            if mask[y, x] == 255:
+                val = int(plane[y, x])
+                hist[val] = hist[val] + 1
+            x = x + 1
+        y = y + 1
+    return hist
+
+def make_plane(w, h):
+    # two overlapping blobs of brightness plus noise, like a V plane
+    rng = np.random.default_rng(0)
+    yy, xx = np.ogrid[0:h, 0:w]
+    base = 80 + 120 * (((xx - w / 2.0) ** 2 + (yy - h / 2.0) ** 2) < (min(w, h) / 3.0) ** 2)
+    noise = rng.integers(0, 50, size=(h, w), dtype=np.uint8)
+    return cv2.add(base.astype(np.uint8), noise)
+
+def main():
+    threads = 4
+    if "--threads" in sys.argv:
+        threads = int(sys.argv[sys.argv.index("--threads") + 1])
+
+    for name, w, h in SIZES:
+        print("----", name, "(%dx%d) ----" % (w, h))
+        plane = make_plane(w, h)
+        _, mask = cv2.threshold(plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        t_np, h_np = time_it(lambda: np.histogram(plane[mask == 255], bins=256, range=(0, 255))[0])
+        t_k1, h_k1 = time_it(lambda: count_levels(plane, mask))
+        t_kn, h_kn = time_it(lambda: count_levels(plane, mask, workers=threads))
+
+        t_loop, _ = time_it(lambda: loop_hist(plane, mask, BAND_ROWS), 1)
+        t_loop = t_loop * h / float(BAND_ROWS)
+
+        print("loop        : %9.2f s   (extrapolated from %d rows)" % (t_loop, BAND_ROWS))
+        print("np.hist     : %9.4f s" % t_np)
+        print("kernel x1   : %9.4f s" % t_k1)
+        print("kernel x%-3d : %9.4f s" % (threads, t_kn))
+        print("same counts :", np.array_equal(h_np, h_k1) and np.array_equal(h_k1, h_kn))
+
+        plane12 = plane.astype(np.uint16) << 4
+        t_16, _ = time_it(lambda: count_levels(plane12, mask, levels=4096, workers=threads))
+        print("kernel 12bit: %9.4f s   (x%d threads)" % (t_16, threads))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_imagecache.py
+# Decoded image and HSV planes of a 24 MP JPEG / PNG:
+#   old: cv2.imread + cv2.cvtColor (or hsv_plane) on every run
+#   new: common.imagecache.ImageCache.load on a warm cache (memory-mapped
+#        .npy; timed including hashing the source file and touching every
+#        page of the array, so it is not just the cost of mapping the file)
+# The first (cold) load, which also writes the cache entry, is shown too.
+# Wall time is the best of 5 runs. The cache lives in a temp directory.
+# Run from the repo root: python benchmarks/bench_imagecache.py
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.imagecache import ImageCache
+from common.planes import hsv_plane
+
+W, H = 6000, 4000  # 24 MP
+
+def best_of(fn, repeats=5):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, result
+
+def make_photo():
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8)
+    bgr = cv2.resize(coarse, (W, H), interpolation=cv2.INTER_LINEAR)
+    return cv2.add(bgr, rng.integers(0, 30, size=(H, W, 3), dtype=np.uint8))
+
+def touch(arr):
+    # read one byte of every 4 KB page of a (memory-mapped) result
+    return int(np.asarray(arr).reshape(-1)[::4096].sum())
+
+def warm_load(cache_dir, path, kind):
+    arr = ImageCache(cache_dir).load(path, kind)
+    touch(arr)
+    return arr
+
+def main():
+    folder = tempfile.mkdtemp()
+    try:
+        bgr = make_photo()
+        print("Image: %dx%d (%.1f MP)" % (W, H, W * H / 1e6))
+        for ext in (".jpg", ".png"):
+            path = os.path.join(folder, "photo" + ext)
+            cv2.imwrite(path, bgr)
+            cases = [
+                ("bgr", lambda: cv2.imread(path)),
+                ("hsv", lambda: cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2HSV)),
+                ("V", lambda: hsv_plane(cv2.imread(path), "V")),
+            ]
+            for kind, old_fn in cases:
+                cache = ImageCache(os.path.join(folder, "cache"))
+                cache.clear()
+                t0 = time.perf_counter()
+                touch(cache.load(path, kind))
+                cold = time.perf_counter() - t0
+                old_t, old = best_of(old_fn)
+                # a fresh ImageCache per run: the source file is hashed again,
+                # as in a new process
+                new_t, new = best_of(lambda: warm_load(cache.cache_dir, path, kind))
+                print("%s %-4s old %7.3f s | cold %7.3f s | warm %7.4f s | x%.1f  identical: %s"
+                      % (ext, kind, old_t, cold, new_t, old_t / new_t, np.array_equal(old, new)))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_lut16.py
+# q2 tissue curves on 12-bit and 16-bit slices:
+#   - LUT build: q2.build_lut_from_points_beginner(bits) vs compile_curve
+#     (4096 / 65536 entries, vectorized, disk cache off)
+#   - apply, ns per pixel: 8-bit cv2.LUT (the q2 path) as the reference;
+#     the old way for wide data (scale to 8 bits, then the 8-bit LUT);
+#     table[img] fancy indexing; common.lut.apply_wide_lut
+#   - the WM/GM pair in one pass: apply_luts on uint16
+# Slices: a stack of 256 x 512 x 512 MRI-sized slices and one 24 MP slice.
+# Wall time is the best of 5 runs.
+# Run from the repo root: python benchmarks/bench_lut16.py
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "q2"))
+
+from common.curves import clear_memory_cache, compile_curve, points_spec, scale_points
+from common.lut import apply_lut, apply_luts, apply_wide_lut
+import q2
+
+SHAPES = [("256 x 512 x 512 stack", (256 * 512, 512)), ("24 MP slice", (4000, 6000))]
+
+def best_of(fn, repeats=5):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, result
+
+def build_times(bits):
+    pts = scale_points(q2.control_pts_wm, bits)
+    with contextlib.redirect_stdout(io.StringIO()):
+        old_t, old = best_of(lambda: q2.build_lut_from_points_beginner(pts, bits)[0], repeats=2)
+    # compile_curve is memoized, so only the first call builds; time that one
+    clear_memory_cache()
+    new_t, new = best_of(lambda: compile_curve(points_spec(pts, bits), cache_dir=None), repeats=1)
+    return old_t, new_t, np.array_equal(np.array(old), new)
+
+def main():
+    rng = np.random.default_rng(0)
+    for bits in (12, 16):
+        old_t, new_t, same = build_times(bits)
+        print("%d-bit LUT (%d entries) build: beginner %.3f s | compile_curve %.4f s | identical: %s"
+              % (bits, 1 << bits, old_t, new_t, same))
+    lut8 = compile_curve(points_spec(q2.control_pts_wm))
+    for name, shape in SHAPES:
+        n = shape[0] * shape[1]
+        img8 = rng.integers(0, 256, size=shape, dtype=np.uint8)
+        out8 = np.empty_like(img8)
+        t8, _ = best_of(lambda: cv2.LUT(img8, lut8, dst=out8))
+        print("%s (%.1f MP)" % (name, n / 1e6))
+        print("  8-bit cv2.LUT               %6.2f ns/px" % (t8 * 1e9 / n))
+        for bits in (12, 16):
+            img = rng.integers(0, 1 << bits, size=shape, dtype=np.uint16)
+            wm = compile_curve(points_spec(scale_points(q2.control_pts_wm, bits), bits))
+            gm = compile_curve(points_spec(scale_points(q2.control_pts_gm, bits), bits))
+            out = np.empty_like(img)
+            shift = bits - 8
+            t_q, _ = best_of(lambda: cv2.LUT((img >> shift).astype(np.uint8), lut8, dst=out8))
+            t_f, ref = best_of(lambda: wm[img])
+            t_w, got = best_of(lambda: apply_wide_lut(img, wm, out=out))
+            t_2, pair = best_of(lambda: apply_luts(img, [wm, gm], stacked=True))
+            same = np.array_equal(ref, got) and np.array_equal(pair[1], gm[img])
+            print("  %2d-bit: quantize + 8-bit %6.2f | table[img] %6.2f | apply_wide_lut %6.2f"
+                  " (x%.2f the 8-bit time) | WM+GM pass %6.2f ns/px (%.2f per curve) | identical: %s"
+                  % (bits, t_q * 1e9 / n, t_f * 1e9 / n, t_w * 1e9 / n, t_w / t8,
+                     t_2 * 1e9 / n, t_2 * 1e9 / n / 2, same))
+            assert np.array_equal(apply_lut(img, wm), got)
+
+if __name__ == "__main__":
+    main()
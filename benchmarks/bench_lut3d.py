@@ -0,0 +1,38 @@
+# bench_lut3d.py
+# Accuracy / speed report of 3D colour cubes (common/lut3d.py) against the
+# exact q4d vibrance pipeline and the q3 Lab gamma pipeline.
+# Run from the repo root: python benchmarks/bench_lut3d.py
+
+import os
+import sys
+
+import cv2
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.lut3d import accuracy_report, lab_gamma_step, pipeline, vibrance_step
+
+PIPELINES = [
+    ("q4d vibrance (alpha=0.8, sigma=70)", pipeline(vibrance_step(0.8, 70.0))),
+    ("q3 gamma on L* (0.6)", pipeline(lab_gamma_step(0.6))),
+    ("gamma 0.6 then vibrance 0.8", pipeline(lab_gamma_step(0.6), vibrance_step(0.8, 70.0))),
+]
+
+def main():
+    bgr = cv2.imread(os.path.join(ROOT, "q4", "spider.png"))
+    big = cv2.resize(bgr, (4000, 3000), interpolation=cv2.INTER_CUBIC)
+
+    for label, image in [("spider.png", bgr), ("12 MP upscale", big)]:
+        print("=====", label, "%dx%d" % (image.shape[1], image.shape[0]), "=====")
+        for name, fn in PIPELINES:
+            print("--", name)
+            print("  size  interp        bake ms  apply ms  exact ms  max  mean   p99  exact px")
+            for r in accuracy_report(fn, image):
+                print("  %4d  %-12s %8.1f %9.1f %9.1f %4d %5.2f %5.1f %8.2f%%" % (
+                    r["size"], r["interp"], r["bake_s"] * 1e3, r["apply_s"] * 1e3,
+                    r["exact_s"] * 1e3, r["max_err"], r["mean_err"], r["p99_err"],
+                    100 * r["exact_fraction"]))
+
+if __name__ == "__main__":
+    main()
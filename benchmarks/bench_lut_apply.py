@@ -0,0 +1,60 @@
+# bench_lut_apply.py
+# Compare the old pixel-by-pixel PIL loop (q2.apply_lut_pixel_by_pixel)
+# with the vectorized common.lut.apply_lut_image on a 4K and a 20 MP image.
+# Run from the repo root: python benchmarks/bench_lut_apply.py
+# Add --skip-loop to time only the vectorized path (the loop is slow).
+
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "q2"))
+
+from common.lut import apply_lut_image
+import q2
+
+SIZES = [
+    ("4K (3840x2160)", 3840, 2160),
+    ("20 MP (5472x3648)", 5472, 3648),
+]
+
+def time_it(fn, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, result
+
+def main():
+    skip_loop = "--skip-loop" in sys.argv
+    lut, _, _ = q2.build_lut_from_points_beginner(q2.control_pts_wm)
+    rng = np.random.default_rng(0)
+
+    for name, w, h in SIZES:
+        print("----", name, "----")
+        img = Image.fromarray(rng.integers(0, 256, size=(h, w), dtype=np.uint8))
+
+        t_vec, out_vec = time_it(lambda: apply_lut_image(img, lut), 5)
+        print("vectorized : %8.4f s" % t_vec)
+
+        if skip_loop:
+            continue
+        t_loop, out_loop = time_it(lambda: q2.apply_lut_pixel_by_pixel(img, lut), 1)
+        print("pixel loop : %8.4f s" % t_loop)
+        print("speedup    : %8.0fx" % (t_loop / t_vec))
+        same = out_loop.tobytes() == out_vec.tobytes()
+        print("byte-identical:", same)
+        if not same:
+            raise SystemExit("outputs differ!")
+
+if __name__ == "__main__":
+    main()
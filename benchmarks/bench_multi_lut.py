@@ -0,0 +1,52 @@
+# bench_multi_lut.py
+# N separate apply_lut() calls vs one apply_luts() pass for N curves.
+# Run from the repo root: python benchmarks/bench_multi_lut.py
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.lut import apply_lut, apply_luts
+
+W, H = 5472, 3648  # 20 MP slice
+COUNTS = [2, 6, 12]
+
+def best_of(fn, repeats=3):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+def main():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(H, W), dtype=np.uint8)
+    print("Image: %dx%d (%.1f MP)" % (W, H, W * H / 1e6))
+
+    for n in COUNTS:
+        luts = [rng.integers(0, 256, size=256, dtype=np.uint8) for _ in range(n)]
+        out = np.empty((n, H, W), dtype=np.uint8)
+
+        def separate():
+            for i in range(n):
+                apply_lut(img, luts[i], out=out[i])
+
+        def single_pass():
+            apply_luts(img, luts, out=out)
+
+        t_sep = best_of(separate)
+        t_one = best_of(single_pass)
+        check = apply_luts(img, luts, stacked=True)
+        ok = all(np.array_equal(check[i], apply_lut(img, luts[i])) for i in range(n))
+        print("N=%2d  separate: %.4f s  single pass: %.4f s  (%.2fx)  identical: %s"
+              % (n, t_sep, t_one, t_sep / t_one, ok))
+
+if __name__ == "__main__":
+    main()
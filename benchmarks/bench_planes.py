@@ -0,0 +1,61 @@
+# bench_planes.py
+# One colour plane from BGR on a 24 MP photo:
+#   old: cv2.cvtColor(bgr, COLOR_BGR2HSV/LAB)[:, :, k] made contiguous
+#   new: common.planes.hsv_plane / lab_lightness (plane on demand)
+# Wall time is the best of 5 runs. Peak memory (tracemalloc, numpy/cv2
+# output arrays) does not count the input image.
+# Run from the repo root: python benchmarks/bench_planes.py
+
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.planes import hsv_plane, lab_lightness
+
+W, H = 6000, 4000  # 24 MP
+
+def measure(fn, repeats=5):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def make_photo():
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, size=(200, 300, 3), dtype=np.uint8)
+    bgr = cv2.resize(coarse, (W, H), interpolation=cv2.INTER_LINEAR)
+    return cv2.add(bgr, rng.integers(0, 30, size=(H, W, 3), dtype=np.uint8))
+
+def main():
+    bgr = make_photo()
+    print("Image: %dx%d (%.1f MP)" % (W, H, W * H / 1e6))
+    cases = [
+        ("HSV V", cv2.COLOR_BGR2HSV, 2, lambda: hsv_plane(bgr, "V")),
+        ("HSV S", cv2.COLOR_BGR2HSV, 1, lambda: hsv_plane(bgr, "S")),
+        ("Lab L*", cv2.COLOR_BGR2LAB, 0, lambda: lab_lightness(bgr)),
+    ]
+    for name, code, k, new_fn in cases:
+        old_t, old_peak, old = measure(lambda: np.ascontiguousarray(cv2.cvtColor(bgr, code)[:, :, k]))
+        new_t, new_peak, new = measure(new_fn)
+        print("%-7s old %7.3f s  peak %6.1f MB | new %7.3f s  peak %6.1f MB | x%.2f  identical: %s"
+              % (name, old_t, old_peak / 1e6, new_t, new_peak / 1e6, old_t / new_t,
+                 np.array_equal(old, new)))
+
+if __name__ == "__main__":
+    main()
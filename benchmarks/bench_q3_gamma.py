@@ -0,0 +1,104 @@
+# bench_q3_gamma.py
+# Wall time and peak memory of the q3 gamma-on-L* step on a 24 MP photo:
+#   old: cvtColor -> split -> per-pixel pow loop -> merge -> cvtColor
+#   new: q3.gamma_correct_lab (gamma table applied in place, reused buffers)
+# Run from the repo root: python benchmarks/bench_q3_gamma.py
+# The old per-pixel loop takes minutes at 24 MP, so by default it is timed
+# on BAND_ROWS rows and scaled up; pass --full-baseline to run all of it.
+# Peak memory is measured with tracemalloc (numpy/cv2 output arrays) and
+# does not count the input image.
+
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "q3"))
+
+import q3
+
+W, H = 6000, 4000  # 24 MP
+GAMMA = 0.6
+BAND_ROWS = 40
+
+def old_pipeline(bgr, gamma, rows):
+    # same steps as the original q3.main(), loop limited to `rows` rows
+    lab = cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB)
+    L, a, b = cv2.split(lab)
+    h = L.shape[0]
+    w = L.shape[1]
+    L_after = L.copy()
+    t0 = time.perf_counter()
+    y = 0
+    while y < min(h, rows):
+        x = 0
+        while x < w:
+            L_val = int(L[y, x])
+            L_norm = L_val / 255.0
+            L_gamma = L_norm ** gamma
+            L_after[y, x] = q3.clamp_0_255(L_gamma * 255.0)
+            x = x + 1
+        y = y + 1
+    loop_time = time.perf_counter() - t0
+    lab_out = cv2.merge([L_after, a, b])
+    bgr_out = cv2.cvtColor(lab_out, cv2.COLOR_LAB2BGR)
+    rgb_after = cv2.cvtColor(bgr_out, cv2.COLOR_BGR2RGB)
+    to_save = cv2.cvtColor(rgb_after, cv2.COLOR_RGB2BGR)
+    return to_save, loop_time
+
+def measure(fn):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, dt, peak
+
+def make_photo():
+    # smooth colour gradients plus noise, so Lab values spread like a photo
+    yy, xx = np.mgrid[0:H, 0:W].astype(np.float32)
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 40, size=(H, W, 3), dtype=np.uint8)
+    bgr = np.empty((H, W, 3), dtype=np.uint8)
+    bgr[:, :, 0] = (xx / W * 200).astype(np.uint8)
+    bgr[:, :, 1] = (yy / H * 200).astype(np.uint8)
+    bgr[:, :, 2] = ((xx + yy) / (W + H) * 200).astype(np.uint8)
+    return cv2.add(bgr, noise)
+
+def main():
+    full = "--full-baseline" in sys.argv
+    bgr = make_photo()
+    print("Image: %dx%d (%.1f MP)" % (W, H, W * H / 1e6))
+
+    rows = H if full else BAND_ROWS
+    (old_out, loop_time), old_time, old_peak = measure(lambda: old_pipeline(bgr, GAMMA, rows))
+    if not full:
+        old_time = old_time - loop_time + loop_time * H / float(rows)
+    label = "" if full else " (pixel loop extrapolated from %d rows)" % rows
+    print("old : %8.2f s  peak %7.1f MB%s" % (old_time, old_peak / 1e6, label))
+
+    # new path, first call allocates the buffers
+    (new_out), new_time, new_peak = measure(lambda: q3.gamma_correct_lab(bgr, GAMMA))
+    print("new : %8.3f s  peak %7.1f MB  (first call, allocates buffers)" % (new_time, new_peak / 1e6))
+
+    lab = np.empty_like(bgr)
+    out = np.empty_like(bgr)
+    q3.gamma_correct_lab(bgr, GAMMA, out=out, lab=lab)
+    _, reuse_time, reuse_peak = measure(lambda: q3.gamma_correct_lab(bgr, GAMMA, out=out, lab=lab))
+    print("new : %8.3f s  peak %7.1f MB  (reusing lab/out buffers)" % (reuse_time, reuse_peak / 1e6))
+
+    if full:
+        print("identical to old output:", np.array_equal(old_out, new_out))
+    else:
+        same = np.array_equal(old_out[:rows], new_out[:rows])
+        print("identical to old output on the looped rows:", same)
+
+if __name__ == "__main__":
+    main()
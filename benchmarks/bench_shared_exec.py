@@ -0,0 +1,87 @@
+# bench_shared_exec.py
+# Point ops on a 100 MP image with common.sharedexec.SharedPointExecutor,
+# 1..N worker processes (N = the cores this process may run on, or pass N
+# on the command line):
+#   in-process: cv2.LUT on the whole image (OpenCV threads, then 1 thread)
+#   run:        shared input -> shared output, rows split over the workers
+#   apply:      same plus copying the image in and the result out
+# Ops: q3 gamma on a gray image, q4 vibrance on S of an HSV image.
+# Wall time is the best of 5 runs (pool start-up excluded).
+# Run from the repo root: python benchmarks/bench_shared_exec.py [N]
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.lut import apply_lut_to_channel
+from common.pointops import gamma_lut
+from common.sharedexec import SharedPointExecutor
+from common.vibrance import vibrance_lut
+
+W, H = 10000, 10000  # 100 MP
+
+def best_of(fn, repeats=5):
+    best = None
+    result = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, result
+
+def usable_cores():
+    # os.cpu_count() counts the machine; a container or taskset may allow fewer
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def main():
+    cores = usable_cores()
+    n_max = int(sys.argv[1]) if len(sys.argv) > 1 else cores
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, size=(H, W), dtype=np.uint8)
+    hsv = rng.integers(0, 256, size=(H, W, 3), dtype=np.uint8)  # 100 MP x 3
+    cases = [
+        ("gamma, gray %dx%d" % (W, H), gray, "gamma", {"gamma": 0.6},
+         lambda img, out: cv2.LUT(img, gamma_lut(0.6), dst=out)),
+        ("vibrance on S, HSV %dx%d" % (W, H), hsv, "vibrance",
+         {"alpha": 0.8, "sigma": 70.0, "channel": 1},
+         lambda img, out: apply_lut_to_channel(img, vibrance_lut(0.8, 70.0), 1, out=out)),
+    ]
+    print("cores:", cores, "usable of", os.cpu_count())
+    if cores == 1:
+        print("  only one usable core: the workers share it, so this run cannot")
+        print("  show scaling; run it on a multi-core machine for the 1..N table")
+    for name, img, op, params, direct in cases:
+        print(name)
+        out = np.empty_like(img)
+        threads = cv2.getNumThreads()
+        t_mt, _ = best_of(lambda: direct(img, out))
+        ref = out.copy()
+        cv2.setNumThreads(1)
+        t_1, _ = best_of(lambda: direct(img, out))
+        cv2.setNumThreads(threads)
+        print("  in-process cv2 (%d threads) %7.3f s | 1 thread %7.3f s" % (threads, t_mt, t_1))
+        for workers in range(1, n_max + 1):
+            with SharedPointExecutor(workers=workers) as ex:
+                src = ex.buffer("in", img.shape)
+                dst = ex.buffer("out", img.shape)
+                src.array[...] = img
+                ex.run(op, src, dst, **params)  # start the pool, map the blocks
+                t_run, _ = best_of(lambda: ex.run(op, src, dst, **params))
+                same = np.array_equal(dst.array, ref)
+                t_apply, _ = best_of(lambda: ex.apply(img, op, out=out, **params))
+            print("  workers %2d: run %7.3f s (x%.2f vs 1 thread) | apply %7.3f s | identical: %s"
+                  % (workers, t_run, t_1 / t_run, t_apply, same))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench_vibrance.py
+# Per-pixel math.exp vibrance loop (old q4d.vibrance_channel) vs the cached
+# LUT in common/vibrance.py, on q4/spider.png and a 12 MP frame.
+# Run from the repo root: python benchmarks/bench_vibrance.py
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from common.vibrance import apply_vibrance, vibrance_lut, vibrance_pixel
+
+ALPHA = 0.8
+SIGMA = 70.0
+
+def old_vibrance_channel(S, alpha, sigma):
+    # the loop that used to live in q4b..q4e
+    h = S.shape[0]
+    w = S.shape[1]
+    out = S.copy()
+    y = 0
+    while y < h:
+        x = 0
+        while x < w:
+            out[y, x] = vibrance_pixel(int(S[y, x]), alpha, sigma)
+            x = x + 1
+        y = y + 1
+    return out
+
+def run(name, S):
+    t0 = time.perf_counter()
+    old = old_vibrance_channel(S, ALPHA, SIGMA)
+    t_old = time.perf_counter() - t0
+
+    vibrance_lut.cache_clear()
+    t0 = time.perf_counter()
+    new = apply_vibrance(S, ALPHA, SIGMA)
+    t_first = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    apply_vibrance(S, ALPHA, SIGMA)
+    t_cached = time.perf_counter() - t0
+
+    print("%-22s loop %8.3f s | LUT %7.2f ms (table built) %7.2f ms (cached) | identical: %s"
+          % (name, t_old, t_first * 1e3, t_cached * 1e3, np.array_equal(old, new)))
+
+def main():
+    bgr = cv2.imread(os.path.join(ROOT, "q4", "spider.png"))
+    S = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)[:, :, 1]
+    run("spider.png %dx%d" % (S.shape[1], S.shape[0]), S)
+
+    big = cv2.resize(S, (4000, 3000), interpolation=cv2.INTER_LINEAR)
+    run("12 MP 4000x3000", big)
+
+if __name__ == "__main__":
+    main()
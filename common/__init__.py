@@ -0,0 +1,3 @@
+# Shared helpers for the question scripts (q1..q5).
+# Scripts add the repo root to sys.path and import from here, e.g.
+#     from common.lut import apply_lut_image
@@ -0,0 +1,214 @@
+# Map-reduce over image collections with resumable checkpoints.
+#
+#   paths -> fixed-size chunks -> process pool: per-image histogram, summed
+#         per chunk -> chunk_NNNNNN.npz on disk -> sum of all chunks
+#
+# Chunk k always holds the same images (sorted list, fixed chunk size), so a
+# chunk whose file already exists is done and an interrupted run picks up
+# where it stopped. Files are written to a temp name and renamed, so a
+# crash never leaves a half-written chunk behind. run.json records which
+# image list / settings the checkpoints belong to.
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def list_images(src):
+    """
+    Sorted image paths from a directory (searched recursively) or from a
+    manifest text file (one path per line, relative to the manifest;
+    blank lines and lines starting with # are skipped).
+    Returns (root, paths): root is the directory outputs are made relative to.
+    """
+    if os.path.isdir(src):
+        paths = []
+        for folder, _, files in os.walk(src):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTS):
+                    paths.append(os.path.join(folder, name))
+        return src, sorted(paths)
+    if not os.path.isfile(src):
+        raise IOError("no such directory or manifest: %s" % src)
+    root = os.path.dirname(os.path.abspath(src))
+    paths = []
+    with open(src) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                paths.append(os.path.join(root, line))
+    return root, paths
+
+
+def chunks(items, size):
+    """Consecutive slices of `size` items (the last one may be shorter)."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _run_key(paths, chunk_size, tag):
+    h = hashlib.sha1()
+    h.update(("%d|%s|" % (chunk_size, tag)).encode("utf-8"))
+    for p in paths:
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _open_checkpoint(checkpoint_dir, key, total_chunks):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    run_file = os.path.join(checkpoint_dir, "run.json")
+    if os.path.exists(run_file):
+        with open(run_file) as f:
+            old = json.load(f)
+        if old.get("key") != key:
+            raise ValueError("checkpoint dir %s belongs to a different image list "
+                             "or settings; use another dir or delete it" % checkpoint_dir)
+        return
+    atomic_write_text(run_file, json.dumps({"key": key, "chunks": total_chunks}))
+
+
+def _atomic_write(path, write, suffix=".tmp"):
+    # write(f) into a unique temp file next to path, then rename it over
+    # path; two runs sharing a folder never write the same temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def atomic_write_text(path, text):
+    """Write a text file through a temp file and a rename."""
+    _atomic_write(path, lambda f: f.write(text.encode("utf-8")))
+
+
+def _chunk_file(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, "chunk_%06d.npz" % index)
+
+
+def _save_chunk(path, hist, images, failed):
+    _atomic_write(path, lambda f: np.savez(f, hist=hist, images=images,
+                                           failed=np.array(failed, dtype=str)))
+
+
+def _load_chunk(path):
+    with np.load(path) as data:
+        return data["hist"].astype(np.int64), int(data["images"]), list(data["failed"])
+
+
+def _count_chunk(count_fn, paths, levels, out_path):
+    # runs in a worker process
+    hist = np.zeros(levels, dtype=np.int64)
+    failed = []
+    for path in paths:
+        h = count_fn(path)
+        if h is None:
+            failed.append(path)
+            continue
+        hist += h
+    images = len(paths) - len(failed)
+    if out_path is not None:
+        _save_chunk(out_path, hist, images, failed)
+    return hist, images, failed
+
+
+def accumulate_histograms(paths, count_fn, levels=256, checkpoint_dir=None,
+                          chunk_size=1000, workers=None, tag="", progress=None):
+    """
+    Sum count_fn(path) over all paths in a process pool.
+    - count_fn(path) returns a `levels`-bin histogram, or None for an image
+      that cannot be used (counted as failed); it must be picklable
+      (a module-level function or functools.partial of one)
+    - with checkpoint_dir, each finished chunk is saved and chunks already
+      on disk are loaded instead of recomputed; tag should describe the
+      settings (e.g. the plane) so a changed run does not reuse them
+    - progress(done_chunks, total_chunks) is called as chunks finish
+    Returns a dict: hist, images, failed (paths), chunks, resumed_chunks.
+    """
+    parts = chunks(list(paths), chunk_size)
+    if checkpoint_dir is not None:
+        _open_checkpoint(checkpoint_dir, _run_key(list(paths), chunk_size, tag), len(parts))
+
+    hist = np.zeros(levels, dtype=np.int64)
+    images = 0
+    failed = []
+    todo = []
+    resumed = 0
+    for index, part in enumerate(parts):
+        out_path = None
+        if checkpoint_dir is not None:
+            out_path = _chunk_file(checkpoint_dir, index)
+            if os.path.exists(out_path):
+                h, n, bad = _load_chunk(out_path)
+                hist += h
+                images += n
+                failed += bad
+                resumed = resumed + 1
+                continue
+        todo.append((part, out_path))
+
+    done = resumed
+    if progress is not None:
+        progress(done, len(parts))
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_count_chunk, count_fn, part, levels, out_path)
+                       for part, out_path in todo]
+            for fut in as_completed(futures):
+                h, n, bad = fut.result()
+                hist += h
+                images += n
+                failed += bad
+                done = done + 1
+                if progress is not None:
+                    progress(done, len(parts))
+
+    return {
+        "hist": hist,
+        "images": images,
+        "failed": sorted(failed),
+        "chunks": len(parts),
+        "resumed_chunks": resumed,
+    }
+
+
+def _map_chunk(fn, paths):
+    # runs in a worker process
+    ok = 0
+    failed = []
+    for path in paths:
+        if fn(path):
+            ok = ok + 1
+        else:
+            failed.append(path)
+    return ok, failed
+
+
+def map_images(paths, fn, chunk_size=100, workers=None, progress=None):
+    """
+    Run fn(path) -> bool (True = done) over all paths in a process pool.
+    Returns a dict: done, failed (paths).
+    """
+    parts = chunks(list(paths), chunk_size)
+    done = 0
+    failed = []
+    finished = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_map_chunk, fn, part) for part in parts]
+        for fut in as_completed(futures):
+            ok, bad = fut.result()
+            done = done + ok
+            failed += bad
+            finished = finished + 1
+            if progress is not None:
+                progress(finished, len(parts))
+    return {"done": done, "failed": sorted(failed)}
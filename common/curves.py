@@ -0,0 +1,248 @@
+# Declarative curve specs compiled into cached numpy LUTs.
+#
+# A curve spec is a small dict that describes an 8-bit intensity transform:
+#
+#   {"kind": "points", "points": [[0, 0], [50, 50], [50, 100], ...]}
+#       piecewise-linear through control points, in the given order, with
+#       vertical jumps where two neighbouring points share the same x
+#       (same rules as q2.build_lut_from_points_beginner)
+#
+#   {"kind": "jump", "x0": 50, "y0": 100, "x1": 150, "y1": 255}
+#       identity below x0, jump to y0 at x0, linear from (x0, y0) to
+#       (x1, y1), identity above x1 (the q1.convert_intensity rule)
+#
+# compile_curve() turns a spec into a 256-entry uint8 table. Results are
+# kept in an in-process LRU and in an on-disk cache of .npy files, both
+# keyed by a hash of the normalized spec, so a curve is only ever built once.
+#
+# Both kinds take an optional "bits" (8..16, default 8; e.g. 12 or 16 for
+# medical data): coordinates are then in the native range 0..2**bits - 1
+# and, above 8, the table has 2**bits uint16 entries (4096 for 12-bit,
+# 65536 for 16-bit). 8-bit specs leave "bits" out, so their cache keys
+# are unchanged.
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# bump this when the compile rules change so old disk entries are ignored
+SPEC_VERSION = 1
+
+CACHE_DIR = os.environ.get(
+    "CURVE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "computervisionmscai", "curves"),
+)
+
+
+# ---------- building specs ----------
+def points_spec(control_pts, bits=8):
+    """
+    Spec for a control-point curve, e.g. points_spec(control_pts_wm).
+    bits > 8: points are in 0..2**bits - 1 and the LUT has 2**bits entries.
+    """
+    spec = {"kind": "points", "points": [list(p) for p in control_pts]}
+    if bits != 8:
+        spec["bits"] = bits
+    return spec
+
+
+def jump_spec(x0, y0, x1, y1, bits=8):
+    """Spec for the q1 rule: identity, jump to y0 at x0, line to (x1, y1), identity."""
+    spec = {"kind": "jump", "x0": x0, "y0": y0, "x1": x1, "y1": y1}
+    if bits != 8:
+        spec["bits"] = bits
+    return spec
+
+
+def scale_points(control_pts, bits):
+    """8-bit control points stretched to the 0..2**bits - 1 range (rounded)."""
+    top = (1 << bits) - 1
+    return [[int(round(x * top / 255.0)), int(round(y * top / 255.0))] for x, y in control_pts]
+
+
+def spec_bits(spec):
+    """Bit depth of a spec (8 unless it says otherwise)."""
+    bits = _to_int(spec.get("bits", 8))
+    if not 8 <= bits <= 16:
+        raise ValueError("curve bits must be in 8..16, got %r" % (spec.get("bits"),))
+    return bits
+
+
+def _to_int(v):
+    # same coercion as q2.make_int
+    try:
+        return int(v)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def _clamp_int(v, top=255):
+    v = _to_int(v)
+    if v < 0:
+        return 0
+    if v > top:
+        return top
+    return v
+
+
+def normalize_spec(spec):
+    """
+    Return a canonical copy of a spec: values coerced/clamped the same way
+    the compiler sees them and, for "points", endpoints at x=0 and x=top
+    (255, or 2**bits - 1). Two specs that compile to the same table
+    normalize to the same dict.
+    """
+    kind = spec.get("kind")
+    bits = spec_bits(spec)
+    top = (1 << bits) - 1
+    if kind == "points":
+        pts = [[_clamp_int(x, top), _clamp_int(y, top)] for x, y in spec["points"]]
+        if len(pts) == 0:
+            pts = [[0, 0], [top, top]]
+        if pts[0][0] != 0:
+            pts = [[0, pts[0][1]]] + pts
+        if pts[-1][0] != top:
+            pts = pts + [[top, pts[-1][1]]]
+        out = {"kind": "points", "points": pts}
+    elif kind == "jump":
+        out = {"kind": "jump"}
+        for k in ("x0", "y0", "x1", "y1"):
+            out[k] = float(spec[k])
+        if out["x1"] <= out["x0"]:
+            raise ValueError("jump spec needs x1 > x0")
+    else:
+        raise ValueError("unknown curve kind: %r" % (kind,))
+    if bits != 8:
+        out["bits"] = bits
+    return out
+
+
+def spec_key(spec):
+    """Content hash (hex sha256) of the normalized spec."""
+    norm = normalize_spec(spec)
+    text = json.dumps([SPEC_VERSION, norm], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ---------- compilers (vectorized, no per-pixel python) ----------
+def _levels(norm):
+    return 1 << norm.get("bits", 8)
+
+
+def _to_table(values, levels):
+    # clamp_top(v, levels - 1) from q2 (clamp_0_255 for 8-bit): clip, then
+    # int() (values are >= 0 so floor)
+    dtype = np.uint8 if levels == 256 else np.uint16
+    return np.clip(values, 0, levels - 1).astype(dtype)
+
+
+def _compile_points(norm):
+    pts = norm["points"]
+    levels = _levels(norm)
+    lut = np.zeros(levels, dtype=np.uint8 if levels == 256 else np.uint16)
+    known = np.zeros(levels, dtype=bool)
+
+    # walk the segments in the given order; later segments overwrite earlier ones
+    for (x0, y0), (x1, y1) in zip(pts[:-1], pts[1:]):
+        if x1 == x0:
+            # vertical jump: the value at x0 becomes the "after" level
+            lut[x0] = y1
+            known[x0] = True
+            continue
+        step = 1 if x1 > x0 else -1
+        xs = np.arange(x0, x1 + step, step)
+        t = (xs - x0) / float(x1 - x0)
+        lut[xs] = _to_table(y0 + (y1 - y0) * t, levels)
+        known[xs] = True
+
+    # forward fill, then backward fill anything still unset
+    if not known.all():
+        idx = np.arange(levels)
+        if known.any():
+            fwd = np.maximum.accumulate(np.where(known, idx, -1))
+            bwd = np.minimum.accumulate(np.where(known, idx, levels)[::-1])[::-1]
+            src = np.where(fwd >= 0, fwd, bwd)
+            lut = lut[src]
+    return lut
+
+
+def _compile_jump(norm):
+    x0, y0, x1, y1 = norm["x0"], norm["y0"], norm["x1"], norm["y1"]
+    levels = _levels(norm)
+    v = np.arange(levels, dtype=np.float64)
+    lin = y0 + ((y1 - y0) / (x1 - x0)) * (v - x0)
+    out = np.where((v >= x0) & (v <= x1), lin, v)
+    return _to_table(out, levels)
+
+
+_COMPILERS = {
+    "points": _compile_points,
+    "jump": _compile_jump,
+}
+
+
+# ---------- caching ----------
+def _disk_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], key + ".npy")
+
+
+def _load_disk(key, cache_dir, levels):
+    path = _disk_path(key, cache_dir)
+    try:
+        lut = np.load(path)
+    except (OSError, ValueError):
+        return None
+    if lut.shape != (levels,) or lut.dtype != (np.uint8 if levels == 256 else np.uint16):
+        return None
+    return lut
+
+
+def _save_disk(key, lut, cache_dir):
+    path = _disk_path(key, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file and rename so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    except OSError:
+        return  # the disk cache is best effort
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, lut)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_key(key, norm_json, cache_dir):
+    norm = json.loads(norm_json)
+    lut = None
+    if cache_dir is not None:
+        lut = _load_disk(key, cache_dir, _levels(norm))
+    if lut is None:
+        lut = _COMPILERS[norm["kind"]](norm)
+        if cache_dir is not None:
+            _save_disk(key, lut, cache_dir)
+    lut.setflags(write=False)  # shared between callers
+    return lut
+
+
+def compile_curve(spec, cache_dir=CACHE_DIR):
+    """
+    Compile a curve spec into a read-only 256-entry uint8 LUT (2**bits
+    uint16 entries for specs with bits > 8).
+    - looked up first in the in-process LRU, then in cache_dir on disk
+    - pass cache_dir=None to skip the disk cache
+    """
+    norm = normalize_spec(spec)
+    norm_json = json.dumps(norm, sort_keys=True, separators=(",", ":"))
+    return _compile_key(spec_key(norm), norm_json, cache_dir)
+
+
+def clear_memory_cache():
+    """Drop the in-process LRU (the disk cache is left alone)."""
+    _compile_key.cache_clear()
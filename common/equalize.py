@@ -0,0 +1,262 @@
+# Foreground-only histogram equalization for q5 (one histogram, one pass).
+#
+# In q5 the foreground is "plane > Otsu threshold" on the same plane that is
+# equalized. So everything can come from a single 256-bin count of the plane:
+#   - the Otsu threshold t is searched on that histogram
+#   - the foreground histogram is its tail (bins t+1..255)
+#   - CDF and equalization LUT follow from the tail in O(256)
+# and, because foreground membership only depends on the value, "apply the
+# LUT where mask == 255" is the same as one full-plane LUT that is the
+# identity for values <= t. No mask indexing, no plane[mask] copies.
+#
+# adaptive_equalize() is the tiled (CLAHE-style) variant: one clipped
+# foreground histogram and LUT per tile, and every foreground pixel takes a
+# bilinear blend of the LUTs of the four nearest tile centres. Tiles are
+# counted and blended on a thread pool; cv2.LUT and the numpy blending
+# arithmetic release the GIL, so threads run in parallel.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common.histogram import LEVELS, bincount_u8
+from common.lut import apply_lut
+from common.otsu import otsu_threshold
+from common.roi import box_slices, mask_boxes, masked_bincount
+
+
+def equalization_lut(fg_hist):
+    """
+    q5e/q5f equalization LUT from a foreground histogram:
+    floor((cdf - cdf_min) / (N - cdf_min) * 255), clipped to 0..255.
+    """
+    fg_hist = np.asarray(fg_hist)
+    cdf = np.cumsum(fg_hist)
+    cdf_nonzero = cdf[np.nonzero(cdf)]
+    if cdf_nonzero.size > 0:
+        cdf_min = cdf_nonzero.min()
+    else:
+        cdf_min = 0
+    N = int(fg_hist.sum())
+    if N == 0:
+        N = 1  # avoid divide-by-zero
+    denom = max(N - cdf_min, 1)
+    lut = np.floor((cdf - cdf_min) / denom * 255.0)
+    return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+def foreground_hist(hist, threshold):
+    """Foreground (plane > threshold) histogram: the tail of the plane histogram."""
+    fg_hist = np.array(hist, dtype=np.int64)
+    fg_hist[:threshold + 1] = 0
+    return fg_hist
+
+
+def equalize_plane(plane, threshold, lut, boxes=None):
+    """
+    lut[plane] where plane > threshold, plane elsewhere, in one LUT pass
+    (same as eq_plane[mask == 255] = lut[plane[mask == 255]]).
+    boxes: optional foreground boxes (common.roi.mask_boxes); outside them
+    the plane is only copied.
+    """
+    levels = np.arange(256)
+    full_lut = np.where(levels > threshold, lut, levels).astype(np.uint8)
+    if boxes is None:
+        return apply_lut(plane, full_lut)
+    out = plane.copy()
+    for box in boxes:
+        region = box_slices(box)
+        out[region] = apply_lut(plane[region], full_lut)
+    return out
+
+
+def threshold_mask(plane, threshold):
+    """0/255 mask of plane > threshold (same as cv2 THRESH_BINARY)."""
+    levels = np.arange(256)
+    return apply_lut(plane, np.where(levels > threshold, 255, 0))
+
+
+def foreground_equalize(plane, want_mask=True, roi="bbox"):
+    """
+    Otsu mask + foreground-only equalization of a 2D uint8 plane, from one
+    histogram. Numerically identical to the q5f steps.
+    roi: when the mask is built anyway (want_mask), the LUT is only applied
+    inside its foreground boxes ("bbox", "components" or "full", see
+    common/roi.py). Without the mask one full LUT pass is cheaper than
+    finding the boxes.
+    Returns a dict with:
+        threshold, hist (full plane), fg_hist, cdf, lut (foreground LUT),
+        eq_plane, mask (0/255) and boxes (only if want_mask)
+    """
+    hist = bincount_u8(plane)
+    t = otsu_threshold(hist)
+
+    fg_hist = foreground_hist(hist, t)
+    lut = equalization_lut(fg_hist)
+    mask = boxes = None
+    if want_mask:
+        mask = threshold_mask(plane, t)
+        boxes = mask_boxes(mask, roi)
+    eq_plane = equalize_plane(plane, t, lut, boxes)
+
+    result = {
+        "threshold": t,
+        "hist": hist,
+        "fg_hist": fg_hist,
+        "cdf": np.cumsum(fg_hist),
+        "lut": lut,
+        "eq_plane": eq_plane,
+    }
+    if want_mask:
+        result["mask"] = mask
+        result["boxes"] = boxes
+    return result
+
+
+# ---------- tiled adaptive equalization ----------
+def clip_histogram(hist, limit):
+    """
+    Clip every bin at `limit` and spread the excess evenly over all bins
+    (remainder to the lowest bins), like CLAHE. Counts stay integers and
+    the total is unchanged.
+    """
+    hist = np.array(hist, dtype=np.int64)
+    limit = int(limit)
+    excess = int(np.maximum(hist - limit, 0).sum())
+    if excess == 0:
+        return hist
+    hist = np.minimum(hist, limit)
+    hist += excess // hist.size
+    hist[:excess % hist.size] += 1
+    return hist
+
+
+def _tile_edges(n, tiles):
+    return np.linspace(0, n, tiles + 1).round().astype(int)
+
+
+def _tile_lut(hist, clip_limit, min_pixels, fallback):
+    n = int(hist.sum())
+    if n == 0:
+        return fallback
+    if clip_limit > 0:
+        hist = clip_histogram(hist, max(1, clip_limit * n / LEVELS))
+    lut = equalization_lut(hist)
+    if n < min_pixels:
+        # few foreground pixels: lean on the global LUT, more so the fewer
+        w = float(n) / min_pixels
+        lut = np.floor(w * lut + (1.0 - w) * fallback + 0.5).astype(np.uint8)
+    return lut
+
+
+def _blend_axis(edges, n):
+    # interpolation cells between tile centres along one axis:
+    # (start, stop, tile_lo, tile_hi, weight of tile_hi per row/col)
+    centres = (edges[:-1] + edges[1:]) / 2.0
+    cuts = np.concatenate(([0], np.ceil(centres).astype(int), [n]))
+    last = len(centres) - 1
+    cells = []
+    k = 0
+    while k < len(cuts) - 1:
+        a, b = int(cuts[k]), int(cuts[k + 1])
+        if b > a:
+            lo, hi = max(k - 1, 0), min(k, last)
+            if hi == lo:
+                w = np.zeros(b - a, dtype=np.float32)
+            else:
+                pos = np.arange(a, b, dtype=np.float32)
+                w = (pos - centres[lo]) / float(centres[hi] - centres[lo])
+            cells.append((a, b, lo, hi, w.astype(np.float32)))
+        k = k + 1
+    return cells
+
+
+def _intersect(a, b):
+    box = (max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+    if box[0] >= box[1] or box[2] >= box[3]:
+        return None
+    return box
+
+
+def adaptive_equalize(plane, mask, tiles=(8, 8), clip_limit=2.0,
+                      min_pixels=256, global_lut=None, workers=None, roi="bbox"):
+    """
+    Tiled adaptive equalization of the foreground (mask != 0) of a 2D uint8
+    plane; background pixels are returned unchanged.
+    - tiles: (rows, cols) of the tile grid
+    - clip_limit: CLAHE clip factor (bin limit = clip_limit * pixels / 256),
+      <= 0 disables clipping
+    - tiles with fewer than min_pixels foreground pixels blend their LUT
+      towards global_lut (default: the global foreground LUT as in q5e);
+      tiles with none use it directly
+    - workers: threads for the tile histograms and the blending
+      (default: os.cpu_count())
+    - roi: only tiles and blend cells inside the mask's foreground boxes are
+      touched ("bbox", "components" or "full", see common/roi.py)
+    """
+    if plane.dtype != np.uint8 or plane.ndim != 2:
+        raise ValueError("expected a 2D uint8 plane")
+    if mask.shape != plane.shape:
+        raise ValueError("mask shape %s does not match plane %s" % (mask.shape, plane.shape))
+    h, w = plane.shape
+    ty, tx = min(tiles[0], h), min(tiles[1], w)
+    ys, xs = _tile_edges(h, ty), _tile_edges(w, tx)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    boxes = mask_boxes(mask, roi)
+    out = plane.copy()
+    if not boxes:
+        return out
+    if global_lut is None:
+        global_lut = equalization_lut(masked_bincount(plane, mask, roi))
+    fallback = np.asarray(global_lut, dtype=np.uint8)
+
+    def tile_lut(idx):
+        r, c = divmod(idx, tx)
+        tile = (ys[r], ys[r + 1], xs[c], xs[c + 1])
+        # boxes are disjoint and the mask is empty outside them, so the
+        # tile's foreground histogram is the sum over its box overlaps
+        hist = np.zeros(LEVELS, dtype=np.int64)
+        for box in boxes:
+            part = _intersect(tile, box)
+            if part is not None:
+                region = box_slices(part)
+                hist += bincount_u8(plane[region], mask[region])
+        return _tile_lut(hist, clip_limit, min_pixels, fallback)
+
+    # blend cells clipped to the foreground boxes
+    parts = []
+    for cy in _blend_axis(ys, h):
+        for cx in _blend_axis(xs, w):
+            for box in boxes:
+                part = _intersect((cy[0], cy[1], cx[0], cx[1]), box)
+                if part is not None:
+                    parts.append((cy, cx, part))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        luts = list(pool.map(tile_lut, range(ty * tx)))
+
+        def blend(item):
+            (y0, _, r0, r1, wy), (x0, _, c0, c1, wx), part = item
+            region = box_slices(part)
+            src = plane[region]
+            wy = wy[part[0] - y0:part[1] - y0, None]
+            wx = wx[part[2] - x0:part[3] - x0]
+            top = _lookup(src, luts[r0 * tx + c0], luts[r0 * tx + c1], wx)
+            bot = _lookup(src, luts[r1 * tx + c0], luts[r1 * tx + c1], wx)
+            val = top * (1.0 - wy) + bot * wy
+            np.copyto(out[region], np.floor(val + 0.5).astype(np.uint8),
+                      where=mask[region] != 0)
+
+        list(pool.map(blend, parts))
+    return out
+
+
+def _lookup(src, lut_a, lut_b, wb):
+    # lut_a[src] and lut_b[src] blended with weight wb (float32)
+    a = apply_lut(src, lut_a).astype(np.float32)
+    if lut_b is lut_a:
+        return a
+    b = apply_lut(src, lut_b).astype(np.float32)
+    return a * (1.0 - wb) + b * wb
@@ -0,0 +1,197 @@
+# Histogram engine for 8-bit planes and LUT-based stages.
+#
+# For a point operation y = lut[x] the output histogram follows exactly from
+# the input histogram: every count at level x moves to level lut[x]. So a
+# stage only ever needs one pass over the pixels (a bincount of its input);
+# the histogram after the stage is derived from the 256 input bins.
+#
+# count_levels() is the counting kernel: exact integer bins (one per level,
+# uint8 or uint16), an optional mask that never materializes plane[mask],
+# and row blocks that can be counted on several threads and summed.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+LEVELS = 256
+_MAX_BLOCK_PIXELS = 1 << 24  # float32 counts in cv2.calcHist stay exact
+
+
+def _block_rows(width, block_bytes=1 << 20):
+    return max(1, block_bytes // max(width, 1))
+
+
+def _levels_for(plane, levels):
+    if plane.dtype == np.uint8:
+        full = LEVELS
+    elif plane.dtype == np.uint16:
+        full = 1 << 16
+    else:
+        raise ValueError("expected a uint8 or uint16 plane, got %s" % plane.dtype)
+    if levels is None:
+        return full
+    if levels < 1 or levels > full:
+        raise ValueError("levels must be in 1..%d for %s" % (full, plane.dtype))
+    return int(levels)
+
+
+def _count_block(values, mask, levels):
+    # values: 2D block of the plane, mask: matching block or None.
+    if values.dtype == np.uint8 and levels == LEVELS:
+        return _count_block_cv2(values, mask)
+    # With a mask, each pixel gets key 2 * value + (mask != 0) so one integer
+    # bincount counts both groups; the odd bins are the masked histogram.
+    # Values >= levels (e.g. stray bits in 12-bit data) are an error, not
+    # silently dropped, whether they are masked in or not.
+    if mask is None:
+        counts = np.bincount(values.ravel(), minlength=levels)
+        if counts.size > levels:
+            raise ValueError("plane has values >= %d" % levels)
+        return counts.astype(np.int64)
+    keys = values.astype(np.intp)
+    keys *= 2
+    keys += mask != 0
+    counts = np.bincount(keys.ravel(), minlength=2 * levels)
+    if counts.size > 2 * levels:
+        raise ValueError("plane has values >= %d" % levels)
+    return counts[1::2].astype(np.int64)
+
+
+def _count_block_cv2(values, mask):
+    # cv2.calcHist counts in float32, exact while a bin stays below 2**24,
+    # so blocks are kept under that many pixels. Its own mask argument is
+    # slow; instead background pixels are zeroed with one bitwise_and and
+    # their count is taken back out of bin 0.
+    if mask is None:
+        hist = cv2.calcHist([values], [0], None, [LEVELS], [0, LEVELS])
+        return hist.ravel().astype(np.int64)
+    if mask.dtype == np.bool_:
+        mask = mask.view(np.uint8)
+    mask = cv2.compare(mask, 0, cv2.CMP_NE)  # 0/255
+    fg = cv2.bitwise_and(values, mask)
+    counts = cv2.calcHist([fg], [0], None, [LEVELS], [0, LEVELS]).ravel().astype(np.int64)
+    counts[0] -= mask.size - cv2.countNonZero(mask)
+    return counts
+
+
+def count_levels(plane, mask=None, levels=None, workers=1, block_rows=None):
+    """
+    Exact per-level counts (int64) of a 2D uint8 or uint16 plane.
+    - one bin per integer level: 256 for uint8, 65536 for uint16, or pass
+      levels (e.g. 4096 for 12-bit data stored in uint16)
+    - mask: optional 2D array, same shape; only pixels where mask != 0 are
+      counted. No plane[mask] copy is made, blocks are counted in place.
+    - workers > 1 counts row blocks on a thread pool and sums the partial
+      histograms (uint8 blocks go through cv2, which releases the GIL)
+    """
+    if plane.ndim != 2:
+        raise ValueError("expected a 2D plane, got shape %s" % (plane.shape,))
+    levels = _levels_for(plane, levels)
+    if mask is not None and mask.shape != plane.shape:
+        raise ValueError("mask shape %s does not match plane %s" % (mask.shape, plane.shape))
+
+    if block_rows is None:
+        block_rows = _block_rows(plane.shape[1] * plane.itemsize)
+    block_rows = max(1, min(block_rows, _MAX_BLOCK_PIXELS // max(plane.shape[1], 1)))
+
+    starts = range(0, plane.shape[0], block_rows)
+
+    def count(y):
+        m = None if mask is None else mask[y:y + block_rows]
+        return _count_block(plane[y:y + block_rows], m, levels)
+
+    counts = np.zeros(levels, dtype=np.int64)
+    if workers <= 1:
+        for y in starts:
+            counts += count(y)
+        return counts
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(count, starts):
+            counts += part
+    return counts
+
+
+def bincount_u8(plane, mask=None):
+    """
+    Exact per-level counts (int64, 256 bins) of a 2D uint8 plane.
+    Works on strided views (e.g. lab[:, :, 0]) block by block, so no
+    full-size copy of the plane is made. See count_levels() for the mask.
+    """
+    if plane.dtype != np.uint8:
+        raise ValueError("expected a uint8 plane, got %s" % plane.dtype)
+    return count_levels(plane, mask)
+
+
+class Histogram:
+    """
+    256-bin histogram with the summary numbers the scripts print/plot.
+    - Histogram.from_plane(plane) counts once
+    - hist.through(lut) gives the histogram after a LUT stage in O(256)
+    """
+
+    def __init__(self, counts):
+        counts = np.asarray(counts, dtype=np.int64)
+        if counts.shape != (LEVELS,):
+            raise ValueError("histogram needs %d bins, got shape %s" % (LEVELS, counts.shape))
+        self.counts = counts
+
+    @classmethod
+    def from_plane(cls, plane):
+        return cls(bincount_u8(plane))
+
+    def through(self, lut):
+        """Histogram of lut[plane], derived from this one without touching pixels."""
+        lut = np.asarray(lut)
+        if lut.shape != (LEVELS,):
+            raise ValueError("LUT must have 256 entries")
+        moved = np.bincount(lut.astype(np.intp), weights=self.counts, minlength=LEVELS)
+        return Histogram(np.rint(moved).astype(np.int64))
+
+    # -- summary numbers --
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def cdf(self):
+        """Cumulative counts (same as np.cumsum(hist) in q5)."""
+        return np.cumsum(self.counts)
+
+    @property
+    def mean(self):
+        n = self.total
+        if n == 0:
+            return 0.0
+        return float(np.dot(self.counts, np.arange(LEVELS)) / n)
+
+    @property
+    def median(self):
+        n = self.total
+        if n == 0:
+            return 0
+        return int(np.searchsorted(self.cdf, (n + 1) // 2))
+
+    @property
+    def clip_low(self):
+        """Fraction of pixels at 0."""
+        n = self.total
+        return float(self.counts[0]) / n if n else 0.0
+
+    @property
+    def clip_high(self):
+        """Fraction of pixels at 255."""
+        n = self.total
+        return float(self.counts[LEVELS - 1]) / n if n else 0.0
+
+    def summary(self):
+        return {
+            "total": self.total,
+            "mean": self.mean,
+            "median": self.median,
+            "clip_low": self.clip_low,
+            "clip_high": self.clip_high,
+        }
+
+    def __repr__(self):
+        return "Histogram(total=%d, mean=%.2f)" % (self.total, self.mean)
@@ -0,0 +1,246 @@
+# Decoded images and colour planes cached on disk as .npy files.
+#
+# Every q4/q5 script starts with cv2.imread (JPEG/PNG decode) and usually a
+# cvtColor to HSV. Those results only depend on the bytes of the source
+# file, so they are stored once and memory-mapped on later runs:
+#   <cache_dir>/<sha[:2]>/<sha256 of the file>.<kind>.npy
+# np.load(mmap_mode="r") maps the file read-only: no decode, no conversion,
+# no copy (pages come from the OS page cache). Arrays handed out are
+# therefore read-only; copy before writing into them.
+#
+# kinds: "bgr" (the decoded image), "rgb", "gray", "hsv", "lab", and single
+# planes "H", "S", "V" (HSV) and "L" (Lab lightness).
+#
+# The q4/q5 scripts only use the cache when their CACHE setting is True
+# (off by default, since it writes to disk). Entries then go to
+# $IMAGE_CACHE_DIR, or image_cache in the system temp directory; the cache
+# stays under 2 GiB unless ImageCache is given another max_bytes.
+#
+# The directory is kept under max_bytes: every hit refreshes the entry's
+# mtime. The cache keeps a running total of the bytes it has seen (one
+# scan of the directory on the first write); only when a write takes that
+# total over the limit is the directory rescanned and the least recently
+# used entries deleted (down to 3/4 of the limit).
+# Entries are written to a temp name and renamed, so concurrent runs and
+# crashes never leave a half-written array behind.
+
+import hashlib
+import os
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+from common.planes import hsv_plane, lab_lightness
+
+ENV_CACHE_DIR = "IMAGE_CACHE_DIR"
+
+# kind -> (function of the BGR image, kind it is computed from)
+CONVERSIONS = {
+    "rgb": (lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), "bgr"),
+    "gray": (lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), "bgr"),
+    "hsv": (lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV), "bgr"),
+    "lab": (lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB), "bgr"),
+    "H": (lambda bgr: hsv_plane(bgr, "H"), "bgr"),
+    "S": (lambda bgr: hsv_plane(bgr, "S"), "bgr"),
+    "V": (lambda bgr: hsv_plane(bgr, "V"), "bgr"),
+    "L": (lambda bgr: lab_lightness(bgr), "bgr"),
+}
+KINDS = ("bgr",) + tuple(CONVERSIONS)
+
+
+def default_cache_dir():
+    """$IMAGE_CACHE_DIR, or image_cache in the system temp directory."""
+    return os.environ.get(ENV_CACHE_DIR) or os.path.join(tempfile.gettempdir(), "image_cache")
+
+
+def file_digest(path, block=1 << 20):
+    """Hex sha256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class ImageCache:
+    """
+    Content-addressed cache of decoded images and their colour conversions.
+        cache = ImageCache()
+        bgr = cache.load("jeniffer.jpg")        # like cv2.imread (None if unreadable)
+        S = cache.load("jeniffer.jpg", "S")     # == hsv_plane(bgr, "S")
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2 << 30):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = int(max_bytes)
+        self._digests = {}
+        self._total = None  # bytes on disk, None until the first write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, path):
+        # hashing reads the file once; remember it while size/mtime are unchanged
+        st = os.stat(path)
+        stamp = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(stamp)
+        if digest is None:
+            digest = file_digest(path)
+            with self._lock:
+                self._digests[stamp] = digest
+        return digest
+
+    def entry_path(self, digest, kind):
+        return os.path.join(self.cache_dir, digest[:2], "%s.%s.npy" % (digest, kind))
+
+    def _read(self, entry):
+        try:
+            arr = np.load(entry, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(entry)  # mark as recently used
+        except OSError:
+            pass
+        return arr
+
+    def _write(self, entry, arr):
+        folder = os.path.dirname(entry)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        except OSError:
+            return False  # the cache is best effort
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr))
+            os.replace(tmp, entry)
+        except BaseException as e:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            if isinstance(e, OSError):
+                return False
+            raise
+        with self._lock:
+            if self._total is None:
+                self._total = self.nbytes()
+            else:
+                self._total += os.path.getsize(entry)
+            over = self._total > self.max_bytes
+        if over:
+            # down to 3/4 of the limit, so a full cache is not rescanned on
+            # every write
+            self.evict(self.max_bytes * 3 // 4)
+        return True
+
+    def _get(self, path, digest, kind):
+        entry = self.entry_path(digest, kind)
+        arr = self._read(entry)
+        if arr is not None:
+            with self._lock:
+                self.hits += 1
+            return arr
+        with self._lock:
+            self.misses += 1
+        if kind == "bgr":
+            arr = cv2.imread(path, cv2.IMREAD_COLOR)
+            if arr is None:
+                return None
+        else:
+            fn, source = CONVERSIONS[kind]
+            src = self._get(path, digest, source)
+            if src is None:
+                return None
+            arr = fn(src)
+        if self._write(entry, arr):
+            mapped = self._read(entry)
+            if mapped is not None:
+                return mapped
+        arr.setflags(write=False)
+        return arr
+
+    def load(self, path, kind="bgr"):
+        """
+        Read-only array of `kind` (see KINDS) for the image file at path,
+        from the cache when present. Returns None if the file cannot be
+        read or decoded (like cv2.imread).
+        """
+        if kind not in KINDS:
+            raise ValueError("kind must be one of %s, got %r" % (", ".join(KINDS), kind))
+        try:
+            digest = self._digest(path)
+        except OSError:
+            return None
+        return self._get(path, digest, kind)
+
+    # ---------- size limit ----------
+    def entries(self):
+        """(mtime, size, path) of every cached array, oldest first."""
+        found = []
+        if not os.path.isdir(self.cache_dir):
+            return found
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".npy"):
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, st.st_size, e.path))
+        found.sort()
+        return found
+
+    def nbytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, target=None):
+        """
+        Delete least recently used entries until the cache fits target bytes
+        (default max_bytes).
+        """
+        if target is None:
+            target = self.max_bytes
+        found = self.entries()
+        total = sum(size for _, size, _ in found)
+        removed = 0
+        # the newest entry is kept even if it alone is over the limit
+        for _, size, entry in found[:-1]:
+            if total <= target:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        return removed
+
+    def clear(self):
+        for _, _, entry in self.entries():
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+        self._total = None
+
+
+_default = None
+
+
+def cached_image(path, kind="bgr"):
+    """ImageCache().load(path, kind) on one shared cache in the default directory."""
+    global _default
+    if _default is None:
+        _default = ImageCache()
+    return _default.load(path, kind)
@@ -0,0 +1,325 @@
+# Vectorized LUT application shared by q1 and q2.
+#
+# A "LUT" here is anything with 256 entries: the python list returned by
+# build_lut_list() / build_lut_from_points_beginner(), or a numpy array.
+# Instead of walking every pixel through Image.load() we index the whole
+# image with the table in one call (cv2.LUT). lut_into() is the one place
+# a table is applied into an existing buffer; the streaming, volume and
+# process-pool paths all go through it.
+#
+# apply_luts() does the same for N tables at once (e.g. the q2 WM/GM pair):
+# the image is walked in cache-sized row blocks and every block is mapped
+# through all N tables before moving on, so the input is read from memory
+# once no matter how many curves there are.
+#
+# uint16 images (12-bit / 16-bit medical data) take "wide" tables of up to
+# 65536 uint16 entries (see curves.py, bits=12/16). Shorter tables are
+# padded to 65536 entries with their last value, so values past the end
+# of a table get its last entry. OpenCV 5 maps uint16 images through a
+# 65536-entry table in cv2.LUT: 12-bit slices run at 1.1x-1.4x the 8-bit
+# time per pixel, full 16-bit ones at 1.7x-2x (twice the bytes in and out,
+# and the 128 KB table no longer fits in L1; benchmarks/bench_lut16.py).
+# OpenCV 4 is 8-bit only, and there the tables go through np.take on
+# cache-sized blocks (1.7x to 4x slower, np.take widens every index to intp).
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def as_lut_array(lut):
+    """
+    Turn a 256-entry LUT (list, tuple or array) into a contiguous uint8 array.
+    Raises ValueError if the table has the wrong size or values outside 0..255.
+    """
+    arr = np.asarray(lut)
+    if arr.shape != (256,):
+        raise ValueError("LUT must have exactly 256 entries, got shape %s" % (arr.shape,))
+    if arr.dtype != np.uint8:
+        if arr.size and (arr.min() < 0 or arr.max() > 255):
+            raise ValueError("LUT values must be in 0..255")
+        arr = arr.astype(np.uint8)
+    return np.ascontiguousarray(arr)
+
+
+def as_wide_lut_array(lut):
+    """
+    Turn a table of 2..65536 entries (for uint16 images) into a contiguous
+    uint16 array. Raises ValueError for other sizes or values outside 0..65535.
+    """
+    arr = np.asarray(lut)
+    if arr.ndim != 1 or not 2 <= arr.size <= 65536:
+        raise ValueError("wide LUT needs 2..65536 entries, got shape %s" % (arr.shape,))
+    if arr.dtype != np.uint16:
+        if arr.min() < 0 or arr.max() > 65535:
+            raise ValueError("wide LUT values must be in 0..65535")
+        arr = arr.astype(np.uint16)
+    return np.ascontiguousarray(arr)
+
+
+def _cv2_lut16():
+    # OpenCV 5 accepts uint16 images with a 65536-entry table; 4.x raises
+    try:
+        cv2.LUT(np.zeros((1, 1), dtype=np.uint16), np.zeros(65536, dtype=np.uint16))
+    except cv2.error:
+        return False
+    return True
+
+
+_CV2_LUT16 = _cv2_lut16()
+
+
+def stack_wide_luts(luts):
+    """
+    Build a (65536, N) uint16 table from N wide LUTs (or from a (L, N)
+    array whose columns are the curves, L = 2..65536). Tables shorter than
+    65536 are padded with their last entry. Column i is curve i.
+    """
+    if isinstance(luts, np.ndarray):
+        if luts.ndim != 2:
+            raise ValueError("multi-LUT table must be 2D (entries x N), got %s" % (luts.shape,))
+        luts = [luts[:, i] for i in range(luts.shape[1])]
+    cols = [as_wide_lut_array(lut) for lut in luts]
+    if len(cols) == 0:
+        raise ValueError("need at least one LUT")
+    table = np.empty((65536, len(cols)), dtype=np.uint16)
+    for i, col in enumerate(cols):
+        table[:col.size, i] = col
+        table[col.size:, i] = col[-1]
+    return table
+
+
+def _wide_into(table, img, out):
+    # table: 65536 uint16 entries; out: uint16 array of img's shape
+    if _CV2_LUT16 and out.flags.c_contiguous:
+        cv2.LUT(img, table, dst=out)
+        return out
+    return _take_blocks(table, img, out)
+
+
+def load_gray16(src):
+    """
+    Get a 2D uint16 array from a file path, a PIL image or an array, keeping
+    the native bit depth (16-bit PNG/TIFF open as mode I;16 or I). 8-bit
+    images are widened unchanged.
+    """
+    if isinstance(src, np.ndarray):
+        arr = src
+    else:
+        img = src if isinstance(src, Image.Image) else Image.open(src)
+        if img.mode not in ("I;16", "I;16B", "I;16L", "I", "L"):
+            img = img.convert("L")
+        arr = np.asarray(img)
+    if arr.ndim != 2:
+        raise ValueError("expected a 2D image, got shape %s" % (arr.shape,))
+    if arr.dtype == np.uint16:
+        return arr
+    if arr.dtype.kind in "ui" and (arr.size == 0 or (arr.min() >= 0 and arr.max() <= 65535)):
+        return arr.astype(np.uint16)
+    raise ValueError("expected 16-bit (or narrower) integer data, got %s" % arr.dtype)
+
+
+def _take_blocks(table, img, out, block=1 << 16):
+    # np.take over 64K-pixel slices: its intp copy of the indices stays in
+    # cache; mode="clip" sends values past the table to the last entry
+    src = img.reshape(-1) if img.flags.c_contiguous else None
+    dst = out.reshape(-1) if out.flags.c_contiguous else None
+    if src is None or dst is None:
+        rows = max(1, block // max(img.shape[-1], 1))
+        for y in range(0, img.shape[0], rows):
+            np.take(table, img[y:y + rows], out=out[y:y + rows], mode="clip")
+        return out
+    for i in range(0, src.size, block):
+        np.take(table, src[i:i + block], out=dst[i:i + block], mode="clip")
+    return out
+
+
+def apply_wide_lut(img, lut, out=None):
+    """
+    Apply a wide (up to 65536-entry) LUT to a uint16 image, e.g. a 4096-entry
+    table to 12-bit data. Returns a uint16 array (out if it was given).
+    """
+    img = load_gray16(img)
+    table = stack_wide_luts([lut])[:, 0].copy()
+    if out is None:
+        out = np.empty(img.shape, dtype=np.uint16)
+    elif out.shape != img.shape or out.dtype != np.uint16:
+        raise ValueError("out must be a uint16 array of shape %s" % (img.shape,))
+    return _wide_into(table, img, out)
+
+
+def load_gray(src):
+    """
+    Get a 2D uint8 grayscale array from a file path, a PIL image or an array.
+    - paths and PIL images go through .convert("L") like the q1/q2 scripts
+    - arrays must already be 2D uint8 (no copy is made)
+    """
+    if isinstance(src, np.ndarray):
+        if src.ndim != 2 or src.dtype != np.uint8:
+            raise ValueError("expected a 2D uint8 array, got %s %s" % (src.dtype, src.shape))
+        return src
+    if isinstance(src, Image.Image):
+        img = src
+    else:
+        img = Image.open(src)
+    if img.mode != "L":
+        img = img.convert("L")
+    return np.asarray(img)
+
+
+def apply_lut(src, lut, out=None):
+    """
+    Apply a 256-entry LUT to a whole grayscale image at once.
+    src: file path, PIL image or 2D uint8 array
+    out: optional preallocated uint8 array with the same shape as the image
+    Returns the mapped image as a uint8 array (out if it was given).
+    A uint16 array with a wide table goes to apply_wide_lut().
+    """
+    if isinstance(src, np.ndarray) and src.dtype == np.uint16:
+        return apply_wide_lut(src, lut, out=out)
+    gray = load_gray(src)
+    table = as_lut_array(lut)
+    if out is None:
+        return cv2.LUT(gray, table)
+    return lut_into(gray, table, out)
+
+
+def lut_into(src, table, dst):
+    """
+    Map a uint8 array (any number of channels) through a 256-entry uint8
+    table into dst, a uint8 array of the same shape (a mapped window of an
+    output file, a shared memory block, a slice of a bigger array).
+    dst must be C-contiguous: cv2.LUT writes anything else into a buffer
+    of its own and leaves dst untouched. Returns dst.
+    """
+    _check_out(dst, src.shape, np.uint8)
+    cv2.LUT(src, table, dst=dst)
+    return dst
+
+
+def _check_out(out, shape, dtype):
+    ok = out.shape == shape and out.dtype == dtype
+    if not (ok and out.flags.c_contiguous and out.flags.writeable):
+        raise ValueError("out must be a writable C-contiguous %s array of shape %s"
+                         % (np.dtype(dtype).name, shape))
+
+
+def channel_lut(lut, channel, channels=3):
+    """
+    Build a (1, 256, channels) table for cv2.LUT that maps one channel
+    through lut and leaves the others unchanged (identity).
+    """
+    table = np.empty((1, 256, channels), dtype=np.uint8)
+    table[0, :, :] = np.arange(256, dtype=np.uint8)[:, None]
+    table[0, :, channel] = as_lut_array(lut)
+    return table
+
+
+def apply_lut_to_channel(img, lut, channel, out=None):
+    """
+    Map a single channel of an interleaved uint8 image (e.g. L* of a Lab
+    buffer or S of an HSV buffer) without splitting/merging the planes.
+    Pass out=img to do it in place.
+    """
+    if img.ndim != 3 or img.dtype != np.uint8:
+        raise ValueError("expected an (H, W, C) uint8 image, got %s %s" % (img.dtype, img.shape))
+    table = channel_lut(lut, channel, img.shape[2])
+    if out is not None:
+        _check_out(out, img.shape, np.uint8)
+    return cv2.LUT(img, table, dst=out)
+
+
+def stack_luts(luts):
+    """
+    Build a (256, N) uint8 table from N 256-entry LUTs (or check an existing
+    (256, N) array). Column i is curve i.
+    """
+    if isinstance(luts, np.ndarray) and luts.ndim == 2:
+        if luts.shape[0] != 256:
+            raise ValueError("multi-LUT table must be 256 x N, got %s" % (luts.shape,))
+        if luts.dtype != np.uint8 and luts.size and (luts.min() < 0 or luts.max() > 255):
+            raise ValueError("LUT values must be in 0..255")
+        return np.ascontiguousarray(luts, dtype=np.uint8)
+    cols = [as_lut_array(lut) for lut in luts]
+    if len(cols) == 0:
+        raise ValueError("need at least one LUT")
+    return np.stack(cols, axis=1)
+
+
+def _block_rows(width, block_bytes=1 << 18):
+    # rows per block so one block of input stays in cache (~256 KB)
+    return max(1, block_bytes // max(width, 1))
+
+
+def apply_luts(src, luts, stacked=False, out=None):
+    """
+    Apply N LUTs to one image in a single pass over the input.
+    src:     file path, PIL image or 2D uint8 array
+    luts:    list of 256-entry LUTs, or a (256, N) table
+    stacked: if True return one (N, H, W) uint8 array, otherwise a list of
+             N (H, W) planes (views into that array, each one contiguous)
+    out:     optional preallocated (N, H, W) uint8 array
+    A uint16 array with wide tables (a list, or an (L, N) table, see
+    stack_wide_luts) gives uint16 planes (see apply_wide_lut).
+    """
+    if isinstance(src, np.ndarray) and src.dtype == np.uint16:
+        return _apply_wide_luts(src, luts, stacked, out)
+    gray = load_gray(src)
+    table = stack_luts(luts)
+    n = table.shape[1]
+    h, w = gray.shape
+    if out is None:
+        out = np.empty((n, h, w), dtype=np.uint8)
+    elif out.shape != (n, h, w) or out.dtype != np.uint8:
+        raise ValueError("out must be a uint8 array of shape %s" % ((n, h, w),))
+
+    cols = [np.ascontiguousarray(table[:, i]) for i in range(n)]
+    step = _block_rows(w)
+    y = 0
+    while y < h:
+        block = gray[y:y + step]
+        i = 0
+        while i < n:
+            lut_into(block, cols[i], out[i, y:y + step])
+            i = i + 1
+        y = y + step
+
+    if stacked:
+        return out
+    return [out[i] for i in range(n)]
+
+
+def _apply_wide_luts(img, luts, stacked, out):
+    table = stack_wide_luts(luts)
+    n = table.shape[1]
+    tables = [np.ascontiguousarray(table[:, i]) for i in range(n)]
+    h, w = img.shape
+    if out is None:
+        out = np.empty((n, h, w), dtype=np.uint16)
+    elif out.shape != (n, h, w) or out.dtype != np.uint16:
+        raise ValueError("out must be a uint16 array of shape %s" % ((n, h, w),))
+    step = _block_rows(w * 2)
+    y = 0
+    while y < h:
+        block = img[y:y + step]
+        i = 0
+        while i < n:
+            _wide_into(tables[i], block, out[i, y:y + step])
+            i = i + 1
+        y = y + step
+    if stacked:
+        return out
+    return [out[i] for i in range(n)]
+
+
+def apply_luts_images(src, luts):
+    """apply_luts() returning a list of PIL images in mode "L"."""
+    return [Image.fromarray(plane) for plane in apply_luts(src, luts)]
+
+
+def apply_lut_image(src, lut):
+    """
+    Same as apply_lut() but returns a PIL image in mode "L", so it is a drop-in
+    replacement for the old pixel-by-pixel loops (output is byte-identical).
+    """
+    return Image.fromarray(apply_lut(src, lut))
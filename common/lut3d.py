@@ -0,0 +1,229 @@
+# 3D colour LUTs: bake a per-pixel BGR -> BGR pipeline into a cube.
+#
+# The q3/q4 colour pipelines (BGR -> HSV -> vibrance on S -> BGR, BGR -> Lab
+# -> gamma on L* -> BGR, per-channel curves) only depend on the colour of
+# each pixel. So they can be evaluated once on a grid of colours (the cube)
+# and then applied to any image with a single pass over its BGR pixels:
+#
+#   cube = ColorCube.bake(pipeline(vibrance_step(0.8, 70.0)), size=33)
+#   out = cube.apply(bgr)                       # tetrahedral interpolation
+#   exact = ColorCube.bake(pipe, size=256)      # 256^3 cube, no interpolation
+#
+# accuracy_report() compares cubes of several sizes against the exact
+# pipeline so the cube size can be chosen with numbers in hand.
+#
+# Note: OpenCV's 8-bit HSV->BGR / Lab->BGR can round a colour differently
+# depending on whether it lands in a SIMD block or a row tail, so even the
+# 256^3 cube can be off by 1 from the direct pipeline on a few pixels.
+
+import time
+
+import cv2
+import numpy as np
+
+from common.lut import apply_lut_to_channel
+from common.pointops import gamma_lut
+from common.vibrance import vibrance_lut
+
+INTERPOLATIONS = ("trilinear", "tetrahedral")
+
+
+# ---------- pipeline steps (each maps an (H, W, 3) uint8 BGR image) ----------
+def vibrance_step(alpha, sigma):
+    """q4d: BGR -> HSV, vibrance on S, HSV -> BGR."""
+    lut = vibrance_lut(alpha, sigma)
+
+    def step(bgr):
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        apply_lut_to_channel(hsv, lut, 1, out=hsv)
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    return step
+
+
+def lab_gamma_step(gamma):
+    """q3: BGR -> Lab, gamma on L*, Lab -> BGR."""
+    lut = gamma_lut(gamma)
+
+    def step(bgr):
+        lab = cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB)
+        apply_lut_to_channel(lab, lut, 0, out=lab)
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+    return step
+
+
+def channel_curve_step(lut, channel):
+    """A 256-entry curve on one BGR channel (0 = B, 1 = G, 2 = R)."""
+    def step(bgr):
+        return apply_lut_to_channel(bgr, lut, channel)
+    return step
+
+
+def pipeline(*steps):
+    """Chain steps in application order into one BGR -> BGR function."""
+    def run(bgr):
+        for step in steps:
+            bgr = step(bgr)
+        return bgr
+    return run
+
+
+# ---------- the cube ----------
+def _nodes(size):
+    # grid positions on the 0..255 axis (integers, so the uint8 pipeline can
+    # be evaluated exactly on them)
+    return np.rint(np.linspace(0, 255, size)).astype(np.int64)
+
+
+def _axis_tables(nodes):
+    # for every input level: index of the lower node and the fraction
+    # towards the next one
+    size = len(nodes)
+    levels = np.arange(256)
+    base = np.searchsorted(nodes, levels, side="right") - 1
+    base = np.clip(base, 0, size - 2)
+    lo = nodes[base]
+    hi = nodes[base + 1]
+    frac = (levels - lo) / (hi - lo).astype(np.float64)
+    return base.astype(np.int64), frac.astype(np.float32)
+
+
+class ColorCube:
+    """
+    BGR -> BGR colour cube with size^3 nodes.
+    - table: (size^3, 3) uint8, index (b * size + g) * size + r
+    - size == 256 is the exact mode: a plain lookup, no interpolation
+    """
+
+    def __init__(self, table, size):
+        table = np.ascontiguousarray(table, dtype=np.uint8).reshape(size * size * size, 3)
+        self.table = table
+        self.size = size
+        self.nodes = _nodes(size)
+        if size != 256:
+            self._base, self._frac = _axis_tables(self.nodes)
+
+    @classmethod
+    def bake(cls, fn, size=33):
+        """Evaluate fn (BGR uint8 image -> BGR uint8 image) on every node."""
+        if size < 2 or size > 256:
+            raise ValueError("cube size must be in 2..256")
+        nodes = _nodes(size).astype(np.uint8)
+        b, g, r = np.meshgrid(nodes, nodes, nodes, indexing="ij")
+        grid = np.stack([b, g, r], axis=-1).reshape(size * size, size, 3)
+        out = fn(np.ascontiguousarray(grid))
+        return cls(out.reshape(-1, 3), size)
+
+    # -- application --
+    def apply(self, bgr, interp="tetrahedral", out=None, block_pixels=1 << 18):
+        """
+        Map an (H, W, 3) uint8 BGR image through the cube in one pass
+        (block by block, so temporaries stay small).
+        out: optional C-contiguous uint8 array of the image's shape (the
+             blocks are written through flat views of it)
+        """
+        if bgr.ndim != 3 or bgr.shape[2] != 3 or bgr.dtype != np.uint8:
+            raise ValueError("expected an (H, W, 3) uint8 BGR image")
+        if interp not in INTERPOLATIONS:
+            raise ValueError("interp must be one of %s" % (INTERPOLATIONS,))
+        if out is None:
+            out = np.empty(bgr.shape, dtype=np.uint8)
+        elif out.shape != bgr.shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            raise ValueError("out must be a C-contiguous uint8 array of shape %s" % (bgr.shape,))
+        h, w = bgr.shape[:2]
+        rows = max(1, block_pixels // max(w, 1))
+        y = 0
+        while y < h:
+            src = bgr[y:y + rows].reshape(-1, 3)
+            dst = out[y:y + rows].reshape(-1, 3)
+            if self.size == 256:
+                self._apply_exact(src, dst)
+            elif interp == "trilinear":
+                self._apply_trilinear(src, dst)
+            else:
+                self._apply_tetrahedral(src, dst)
+            y = y + rows
+        return out
+
+    def _apply_exact(self, src, dst):
+        idx = (src[:, 0].astype(np.int64) << 16) | (src[:, 1].astype(np.int64) << 8) | src[:, 2]
+        np.take(self.table, idx, axis=0, out=dst)
+
+    def _split(self, src):
+        n = self.size
+        base = self._base[src]        # (N, 3) lower node per axis
+        frac = self._frac[src]        # (N, 3) fraction per axis
+        idx0 = (base[:, 0] * n + base[:, 1]) * n + base[:, 2]
+        return idx0, frac, (n * n, n, 1)
+
+    def _apply_trilinear(self, src, dst):
+        idx0, f, steps = self._split(src)
+        table = self.table
+        acc = np.zeros((len(idx0), 3), dtype=np.float32)
+        for db in (0, 1):
+            wb = f[:, 0] if db else 1.0 - f[:, 0]
+            for dg in (0, 1):
+                wg = f[:, 1] if dg else 1.0 - f[:, 1]
+                for dr in (0, 1):
+                    wr = f[:, 2] if dr else 1.0 - f[:, 2]
+                    corner = idx0 + db * steps[0] + dg * steps[1] + dr * steps[2]
+                    acc += (wb * wg * wr)[:, None] * table[corner]
+        np.clip(np.rint(acc), 0, 255, out=acc)
+        dst[...] = acc
+
+    def _apply_tetrahedral(self, src, dst):
+        idx0, f, steps = self._split(src)
+        table = self.table
+        steps = np.asarray(steps)
+        # walk from the lower corner towards the upper one along the axes in
+        # order of decreasing fraction; that picks the enclosing tetrahedron
+        order = np.argsort(-f, axis=1, kind="stable")
+        fs = np.take_along_axis(f, order, axis=1)
+        idx1 = idx0 + steps[order[:, 0]]
+        idx2 = idx1 + steps[order[:, 1]]
+        idx3 = idx0 + steps.sum()
+        acc = (1.0 - fs[:, 0])[:, None] * table[idx0]
+        acc += (fs[:, 0] - fs[:, 1])[:, None] * table[idx1]
+        acc += (fs[:, 1] - fs[:, 2])[:, None] * table[idx2]
+        acc += fs[:, 2][:, None] * table[idx3]
+        np.clip(np.rint(acc), 0, 255, out=acc)
+        dst[...] = acc
+
+    def __repr__(self):
+        return "ColorCube(size=%d)" % self.size
+
+
+# ---------- accuracy ----------
+def _error_stats(exact, approx):
+    err = np.abs(exact.astype(np.int16) - approx.astype(np.int16))
+    return {
+        "max_err": int(err.max()),
+        "mean_err": float(err.mean()),
+        "p99_err": float(np.percentile(err, 99)),
+        "exact_fraction": float((err.max(axis=-1) == 0).mean()),
+    }
+
+
+def accuracy_report(fn, image, sizes=(17, 33, 65, 256), interps=INTERPOLATIONS):
+    """
+    Compare cubes of several sizes against the exact pipeline on one image.
+    Returns a list of dicts (size, interp, bake_s, apply_s, exact_s, max_err,
+    mean_err, p99_err, exact_fraction); errors are per channel in 0..255.
+    """
+    t0 = time.perf_counter()
+    exact = fn(image)
+    exact_s = time.perf_counter() - t0
+
+    rows = []
+    for size in sizes:
+        t0 = time.perf_counter()
+        cube = ColorCube.bake(fn, size)
+        bake_s = time.perf_counter() - t0
+        for interp in (interps if size != 256 else ("exact",)):
+            t0 = time.perf_counter()
+            approx = cube.apply(image, interp=interp if interp != "exact" else "tetrahedral")
+            apply_s = time.perf_counter() - t0
+            row = {"size": size, "interp": interp, "bake_s": bake_s,
+                   "apply_s": apply_s, "exact_s": exact_s}
+            row.update(_error_stats(exact, approx))
+            rows.append(row)
+    return rows
@@ -0,0 +1,161 @@
+# Otsu thresholding from a histogram.
+#
+# cv2.threshold(..., THRESH_OTSU) scans the image to build a 256-bin
+# histogram and then searches it. When we already have that histogram (we
+# need it for the foreground statistics anyway) the threshold costs O(256)
+# and no extra pass over the pixels.
+#
+# Multi-level Otsu (3+ classes, e.g. background / skin / hair / highlights)
+# works from the same histogram. With cumulative tables
+#   P[i] = sum(h[:i])        S[i] = sum(k * h[k] for k < i)
+# the between-class term of a class covering levels i..j-1 is
+# (S[j] - S[i])**2 / (P[j] - P[i]), an O(1) lookup. Two thresholds are an
+# exhaustive O(L^2) search over that table; more classes use dynamic
+# programming, O(classes * L^2).
+
+import math
+from fractions import Fraction
+
+import numpy as np
+
+from common.histogram import bincount_u8
+from common.lut import apply_lut
+
+FLT_EPSILON = 1.1920928955078125e-07
+
+
+def _fma(a, b, c):
+    # a * b + c with a single rounding, like the fused multiply-adds the
+    # compiler emits in OpenCV's loop (only matters when two thresholds tie)
+    return float(Fraction(a) * Fraction(b) + Fraction(c))
+
+
+if hasattr(math, "fma"):  # python 3.13+
+    _fma = math.fma  # noqa: F811
+
+
+def otsu_threshold(hist):
+    """
+    Otsu threshold of a 256-bin histogram, same result as
+    cv2.threshold(plane, 0, 255, THRESH_BINARY + THRESH_OTSU)[0].
+    Foreground is plane > threshold. Returns an int.
+    """
+    h = [float(c) for c in np.asarray(hist).ravel()]
+    total = sum(h)
+    if total == 0:
+        return 0
+    scale = 1.0 / total
+
+    # same accumulation order as OpenCV's getThreshVal_Otsu_8u
+    mu = 0.0
+    i = 0
+    while i < len(h):
+        mu += i * h[i]
+        i = i + 1
+    mu *= scale
+
+    mu1 = 0.0
+    q1 = 0.0
+    max_sigma = 0.0
+    max_val = 0
+    i = 0
+    while i < len(h):
+        p_i = h[i] * scale
+        mu1 *= q1
+        q1 += p_i
+        q2 = 1.0 - q1
+        if min(q1, q2) < FLT_EPSILON or max(q1, q2) > 1.0 - FLT_EPSILON:
+            i = i + 1
+            continue
+        mu1 = _fma(i, p_i, mu1) / q1
+        mu2 = _fma(-q1, mu1, mu) / q2
+        sigma = q1 * q2 * (mu1 - mu2) * (mu1 - mu2)
+        if sigma > max_sigma:
+            max_sigma = sigma
+            max_val = i
+        i = i + 1
+    return max_val
+
+
+def _class_scores(hist):
+    # score[i, j] = (S[j] - S[i])**2 / (P[j] - P[i]) for a class over levels
+    # i..j-1 (0 for empty classes, -inf where j <= i)
+    h = np.asarray(hist, dtype=np.float64).ravel()
+    P = np.concatenate(([0.0], np.cumsum(h)))
+    S = np.concatenate(([0.0], np.cumsum(h * np.arange(h.size))))
+    dP = P[None, :] - P[:, None]
+    dS = S[None, :] - S[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(dP > 0, dS * dS / dP, 0.0)
+    score[np.tril_indices(h.size + 1)] = -np.inf
+    return score
+
+
+def multi_otsu_thresholds(hist, classes=3):
+    """
+    Otsu thresholds splitting a histogram into `classes` classes.
+    Returns a list of classes - 1 increasing ints; class k holds the values
+    v with thresholds[k - 1] < v <= thresholds[k] (same "> threshold" rule
+    as the binary mask). classes=2 gives [otsu_threshold(hist)].
+    """
+    if classes < 2:
+        raise ValueError("need at least 2 classes, got %d" % classes)
+    h = np.asarray(hist).ravel()
+    L = h.size
+    if classes > L:
+        raise ValueError("cannot split %d levels into %d classes" % (L, classes))
+    if classes == 2:
+        return [otsu_threshold(h)]
+
+    score = _class_scores(h)
+    if classes == 3:
+        # first class 0..i-1, middle i..j-1, last j..L-1
+        total = score[0, :, None] + score + score[None, :, L]
+        i, j = np.unravel_index(np.argmax(total), total.shape)
+        return [int(i) - 1, int(j) - 1]
+
+    # best[k][j]: best sum of scores putting levels 0..j-1 into k + 1 classes
+    best = score[0].copy()
+    back = []
+    k = 1
+    while k < classes:
+        cand = best[:, None] + score
+        back.append(np.argmax(cand, axis=0))
+        best = cand.max(axis=0)
+        k = k + 1
+    cuts = [L]
+    for arg in reversed(back):
+        cuts.append(int(arg[cuts[-1]]))
+    cuts.reverse()
+    return [c - 1 for c in cuts[:-1]]
+
+
+def label_lut(thresholds, levels=256):
+    """LUT mapping each level to its class index (0 = lowest class)."""
+    return np.searchsorted(np.asarray(thresholds), np.arange(levels), side="left").astype(np.uint8)
+
+
+def label_map(plane, thresholds):
+    """uint8 label map of a plane: 0 for v <= thresholds[0], 1 for the next class, ..."""
+    return apply_lut(plane, label_lut(thresholds))
+
+
+def class_mask(labels, keep):
+    """
+    0/255 mask of the pixels whose label is in `keep` (an int or a list),
+    usable anywhere the binary Otsu mask is used.
+    """
+    if np.isscalar(keep):
+        keep = [keep]
+    table = np.zeros(256, dtype=np.uint8)
+    table[list(keep)] = 255
+    return apply_lut(labels, table)
+
+
+def multi_otsu(plane, classes=3, mask=None):
+    """
+    Multi-level Otsu on a uint8 plane (optionally only the pixels under
+    mask). Returns (thresholds, label_map).
+    """
+    thresholds = multi_otsu_thresholds(bincount_u8(plane, mask), classes)
+    return thresholds, label_map(plane, thresholds)
@@ -0,0 +1,71 @@
+# Single colour planes straight from BGR, without a full-image conversion.
+#
+# The q5 scripts convert the whole image to HSV and then keep one plane.
+# hsv_plane() / lab_lightness() produce just that plane:
+#   - V = max(B, G, R): three cv2.max calls per block, no HSV at all
+#   - S, H and Lab L*: cvtColor on cache-sized row blocks, keeping only the
+#     wanted channel, so the full 3-channel HSV/Lab image never exists
+# Results are identical to cv2.cvtColor(...)[:, :, k]. (An exact S from
+# OpenCV's fixed-point formula was tried as well; gathering it per pixel is
+# slower than OpenCV's SIMD conversion, so S goes through cvtColor blocks.)
+# When H is needed for the recombination, do the full cvtColor as before.
+
+import cv2
+import numpy as np
+
+HSV_PLANES = ("H", "S", "V")
+
+
+def _block_rows(width, block_bytes=1 << 22):
+    return max(1, block_bytes // max(3 * width, 1))
+
+
+def _check_bgr(bgr):
+    if bgr.dtype != np.uint8 or bgr.ndim != 3 or bgr.shape[2] != 3:
+        raise ValueError("expected an (H, W, 3) uint8 BGR image, got %s %s" % (bgr.dtype, bgr.shape))
+
+
+def _by_blocks(bgr, fn, out):
+    h, w = bgr.shape[:2]
+    if out is None:
+        out = np.empty((h, w), dtype=np.uint8)
+    elif out.shape != (h, w) or out.dtype != np.uint8:
+        raise ValueError("out must be a (%d, %d) uint8 array" % (h, w))
+    step = _block_rows(w)
+    y = 0
+    while y < h:
+        out[y:y + step] = fn(bgr[y:y + step])
+        y = y + step
+    return out
+
+
+def _max3(block):
+    b, g, r = cv2.split(block)
+    return cv2.max(cv2.max(b, g), r)
+
+
+def _converted_channel(code, channel):
+    def fn(block):
+        return cv2.extractChannel(cv2.cvtColor(block, code), channel)
+    return fn
+
+
+def hsv_plane(bgr, name="V", out=None):
+    """
+    One plane ("H", "S" or "V") of cv2.cvtColor(bgr, COLOR_BGR2HSV) as a
+    contiguous 2D uint8 array, computed block by block from BGR.
+    out: optional preallocated (H, W) uint8 array.
+    """
+    _check_bgr(bgr)
+    name = name.upper()
+    if name not in HSV_PLANES:
+        raise ValueError("plane must be one of %s, got %r" % (", ".join(HSV_PLANES), name))
+    if name == "V":
+        return _by_blocks(bgr, _max3, out)
+    return _by_blocks(bgr, _converted_channel(cv2.COLOR_BGR2HSV, HSV_PLANES.index(name)), out)
+
+
+def lab_lightness(bgr, out=None):
+    """L* of cv2.cvtColor(bgr, COLOR_BGR2LAB), without the full Lab image."""
+    _check_bgr(bgr)
+    return _by_blocks(bgr, _converted_channel(cv2.COLOR_BGR2LAB, 0), out)
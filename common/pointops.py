@@ -0,0 +1,125 @@
+# Point-operation algebra for 8-bit images.
+#
+# Every intensity transform in this project (the q1 piecewise map, the q2
+# control-point curves, the q3 gamma on L*, the q4 vibrance bump) maps an
+# 8-bit value to an 8-bit value, so each one is fully described by a
+# 256-entry LUT. PointOp wraps that LUT and composes symbolically:
+#
+#     f @ g        -> the op "f after g", with lut = f.lut[g.lut]
+#     chain(a, b)  -> apply a, then b (same as b @ a)
+#
+# so a chain of any length collapses into a single table and runs as one
+# pass over the image with one output allocation.
+
+import functools
+
+import cv2
+import numpy as np
+
+from common.curves import compile_curve
+from common.lut import apply_lut, as_lut_array, lut_into
+from common.vibrance import vibrance_lut
+
+
+# ---------- scalar reference rules (evaluated 256 times, not per pixel) ----------
+def _clamp_0_255(v):
+    if v < 0:
+        return 0
+    if v > 255:
+        return 255
+    return int(v)
+
+
+def gamma_pixel(v, gamma):
+    # q3: out = (in / 255) ** gamma, scaled back to 0..255
+    return _clamp_0_255(((v / 255.0) ** gamma) * 255.0)
+
+
+def table_from_function(fn):
+    """Evaluate a scalar 0..255 -> 0..255 rule once per level into a uint8 table."""
+    lut = np.array([fn(i) for i in range(256)], dtype=np.int64)
+    return as_lut_array(lut)
+
+
+@functools.lru_cache(maxsize=64)
+def gamma_lut(gamma):
+    """Read-only 256-entry table of the q3 gamma rule (cached per gamma)."""
+    lut = table_from_function(lambda v: gamma_pixel(v, gamma))
+    lut.setflags(write=False)
+    return lut
+
+
+# ---------- the transform object ----------
+class PointOp:
+    """
+    An 8-bit point operation stored as its 256-entry LUT.
+    - compose with @ (f @ g means "g first, then f") or chain(g, f)
+    - call it on an image (array, PIL image or path) to apply it in one pass
+    """
+
+    def __init__(self, lut, name="op"):
+        table = as_lut_array(lut).copy()
+        table.setflags(write=False)
+        self._lut = table
+        self.name = name
+
+    @property
+    def lut(self):
+        return self._lut
+
+    # -- constructors for the transforms used in q1..q4 --
+    @classmethod
+    def identity(cls):
+        return cls(np.arange(256, dtype=np.uint8), name="identity")
+
+    @classmethod
+    def from_function(cls, fn, name=None):
+        return cls(table_from_function(fn), name=name or getattr(fn, "__name__", "fn"))
+
+    @classmethod
+    def from_curve(cls, spec, name="curve"):
+        return cls(compile_curve(spec), name=name)
+
+    @classmethod
+    def gamma(cls, gamma):
+        return cls(gamma_lut(gamma), name="gamma(%g)" % gamma)
+
+    @classmethod
+    def vibrance(cls, alpha, sigma):
+        return cls(vibrance_lut(alpha, sigma), name="vibrance(%g,%g)" % (alpha, sigma))
+
+    # -- algebra --
+    def __matmul__(self, other):
+        if not isinstance(other, PointOp):
+            return NotImplemented
+        return PointOp(self._lut[other._lut], name="%s o %s" % (self.name, other.name))
+
+    def then(self, other):
+        """self first, then other."""
+        return other @ self
+
+    # -- application --
+    def __call__(self, img, out=None):
+        """
+        Apply the op. 2D or multi-channel uint8 arrays go straight through
+        cv2.LUT (every channel gets the same table); paths and PIL images are
+        read as grayscale like q1/q2.
+        """
+        if isinstance(img, np.ndarray) and img.ndim == 3 and img.dtype == np.uint8:
+            if out is None:
+                return cv2.LUT(img, self._lut)
+            return lut_into(img, self._lut, out)
+        return apply_lut(img, self._lut, out=out)
+
+    def __repr__(self):
+        return "PointOp(%s)" % self.name
+
+
+def chain(*ops):
+    """Fuse ops given in application order into one PointOp: chain(a, b)(x) == b(a(x))."""
+    result = PointOp.identity()
+    for op in ops:
+        result = op @ result
+    if ops:
+        result.name = " -> ".join(op.name for op in ops)
+    return result
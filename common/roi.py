@@ -0,0 +1,112 @@
+# Foreground boxes: where masked q5 work actually has to happen.
+#
+# Outside the foreground every masked operation is the identity (background
+# keeps its value, contributes nothing to a masked histogram), so the work
+# can be limited to boxes that cover the mask:
+#   - "bbox": one bounding box of all foreground pixels (cv2.boundingRect,
+#     a single cheap scan of the mask)
+#   - "components": one box per connected component, overlapping boxes
+#     merged until they are disjoint (worth it for a few separate subjects;
+#     labelling costs more than a bbox scan)
+# When the boxes cover most of the frame, the full frame is returned
+# instead so dense masks do not pay for the bookkeeping.
+# Boxes are (y0, y1, x0, x1), half-open, and never overlap, so summing
+# per-box histograms or writing per-box results is exact.
+
+import cv2
+import numpy as np
+
+from common.histogram import LEVELS, bincount_u8
+
+ROI_MODES = ("bbox", "components", "full")
+
+
+def full_box(shape):
+    return (0, shape[0], 0, shape[1])
+
+
+def box_slices(box):
+    """(rows, cols) slices for indexing a plane with a box."""
+    y0, y1, x0, x1 = box
+    return slice(y0, y1), slice(x0, x1)
+
+
+def box_area(box):
+    y0, y1, x0, x1 = box
+    return (y1 - y0) * (x1 - x0)
+
+
+def _as_u8(mask):
+    if mask.dtype == np.bool_:
+        return mask.view(np.uint8)
+    if mask.dtype != np.uint8:
+        return (mask != 0).view(np.uint8)
+    return mask
+
+
+def _overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+
+def _merge_disjoint(boxes):
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        i = 0
+        while i < len(boxes):
+            j = i + 1
+            while j < len(boxes):
+                if _overlap(boxes[i], boxes[j]):
+                    a, b = boxes[i], boxes.pop(j)
+                    boxes[i] = (min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3]))
+                    merged = True
+                else:
+                    j = j + 1
+            i = i + 1
+    return sorted(boxes)
+
+
+def mask_boxes(mask, mode="bbox", dense_fraction=0.6, max_boxes=32):
+    """
+    Disjoint boxes covering every nonzero pixel of a 2D mask.
+    - mode: "bbox", "components" or "full" (see the top of this file)
+    - if the boxes cover more than dense_fraction of the frame, the whole
+      frame is returned as one box
+    - "components" falls back to "bbox" when there are more than max_boxes
+      components (e.g. a noisy mask full of specks)
+    Returns [] for an empty mask.
+    """
+    if mode not in ROI_MODES:
+        raise ValueError("roi mode must be one of %s, got %r" % (", ".join(ROI_MODES), mode))
+    full = [full_box(mask.shape)]
+    if mode == "full":
+        return full
+    m = _as_u8(mask)
+    if mode == "components":
+        n, _, stats, _ = cv2.connectedComponentsWithStats(m, connectivity=8)
+        if n - 1 <= max_boxes:
+            boxes = []
+            for k in range(1, n):
+                x, y, w, h = stats[k, :4]
+                boxes.append((int(y), int(y + h), int(x), int(x + w)))
+            boxes = _merge_disjoint(boxes)
+            if sum(box_area(b) for b in boxes) > dense_fraction * m.size:
+                return full
+            return boxes
+    x, y, w, h = cv2.boundingRect(m)
+    if w == 0 or h == 0:
+        return []
+    box = (y, y + h, x, x + w)
+    if box_area(box) > dense_fraction * m.size:
+        return full
+    return [box]
+
+
+def masked_bincount(plane, mask, roi="bbox"):
+    """bincount_u8(plane, mask), counting only inside the mask's boxes."""
+    counts = np.zeros(LEVELS, dtype=np.int64)
+    for box in mask_boxes(mask, roi):
+        region = box_slices(box)
+        counts += bincount_u8(plane[region], mask[region])
+    return counts
@@ -0,0 +1,189 @@
+# Run-length encoded foreground masks.
+#
+# A q5 Otsu mask is a full uint8 image of 0/255 bytes. A RunMask keeps only
+# the foreground runs of every row:
+#   row_ptr[y] .. row_ptr[y + 1]  index the runs of row y
+#   starts[i], ends[i]            run i covers columns starts[i] .. ends[i]-1
+# Built once from the threshold (one pass over the plane), it turns the
+# masked steps into work proportional to the foreground:
+#   - histogram(plane)      = bincount_u8(plane, mask)
+#   - apply_lut(plane, lut) = plane with lut applied where mask == 255
+#   - extract(plane)        = cv2.bitwise_and(plane, mask)
+# to_dense() / from_dense() convert to and from the usual 0/255 mask.
+# Only the runs are stored (row, start, end: 12 bytes per run);
+# pixel coordinates are expanded for a few runs at a time while an
+# operation runs and never kept.
+
+import cv2
+import numpy as np
+
+from common.histogram import LEVELS
+from common.lut import as_lut_array
+
+
+class RunMask:
+    """
+    Per-row foreground runs of a (height, width) mask.
+    - RunMask.from_threshold(plane, t): runs of plane > t
+    - RunMask.from_dense(mask): runs of mask != 0
+    - rm.to_dense(): 0/255 uint8 mask
+    """
+
+    def __init__(self, shape, row_ptr, starts, ends):
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.row_ptr = np.asarray(row_ptr, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+        if self.row_ptr.shape != (self.shape[0] + 1,):
+            raise ValueError("row_ptr needs %d entries" % (self.shape[0] + 1))
+        if self.starts.shape != self.ends.shape or self.row_ptr[-1] != self.starts.size:
+            raise ValueError("starts/ends do not match row_ptr")
+        self._rows = None
+
+    # ---------- building ----------
+    @classmethod
+    def from_binary(cls, fg):
+        """
+        Runs of a 2D 0/1 uint8 (or bool) array. Only the bounding box of
+        the foreground is scanned: its rows are laid end to end with a 0
+        after each row, so every run is a 0->1 ... 1->0 pair of transitions
+        in one flat array.
+        """
+        if fg.ndim != 2:
+            raise ValueError("expected a 2D mask, got shape %s" % (fg.shape,))
+        h, w = fg.shape
+        fg = fg.view(np.uint8) if fg.dtype == np.bool_ else fg
+        x, y, bw, bh = cv2.boundingRect(fg)
+        row_ptr = np.zeros(h + 1, dtype=np.int64)
+        if bw == 0 or bh == 0:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls((h, w), row_ptr, empty, empty)
+        flat = np.zeros(1 + bh * (bw + 1), dtype=np.uint8)
+        flat[1:].reshape(bh, bw + 1)[:, :bw] = fg[y:y + bh, x:x + bw]
+        edges = np.flatnonzero(flat[1:] != flat[:-1])
+        rows, cols = np.divmod(edges, bw + 1)
+        starts = cols[0::2] + x
+        ends = cols[1::2] + x
+        row_ptr[y + 1:y + bh + 1] = np.cumsum(np.bincount(rows[0::2], minlength=bh))
+        row_ptr[y + bh + 1:] = row_ptr[y + bh]
+        return cls((h, w), row_ptr, starts, ends)
+
+    @classmethod
+    def from_threshold(cls, plane, threshold):
+        """Runs of plane > threshold (the cv2 THRESH_BINARY / Otsu foreground)."""
+        if plane.ndim != 2:
+            raise ValueError("expected a 2D plane, got shape %s" % (plane.shape,))
+        _, fg = cv2.threshold(plane, threshold, 1, cv2.THRESH_BINARY)
+        return cls.from_binary(fg)
+
+    @classmethod
+    def from_dense(cls, mask):
+        """Runs of mask != 0."""
+        if mask.ndim != 2:
+            raise ValueError("expected a 2D mask, got shape %s" % (mask.shape,))
+        if mask.dtype == np.uint8:
+            return cls.from_binary(cv2.compare(mask, 0, cv2.CMP_NE) // 255)
+        return cls.from_binary(mask != 0)
+
+    def to_dense(self, value=255):
+        """uint8 mask with `value` on the runs and 0 elsewhere."""
+        h, w = self.shape
+        edges = np.zeros((h, w + 1), dtype=np.int8)
+        rows = self.run_rows()
+        edges[rows, self.starts] = 1
+        edges[rows, self.ends] = -1
+        dense = np.cumsum(edges[:, :w], axis=1, dtype=np.int8).view(np.uint8)
+        if value != 1:
+            dense *= np.uint8(value)
+        return dense
+
+    # ---------- summary numbers ----------
+    @property
+    def runs(self):
+        return int(self.starts.size)
+
+    @property
+    def area(self):
+        """Number of foreground pixels."""
+        return int((self.ends - self.starts).sum())
+
+    def run_rows(self):
+        """Row index of every run."""
+        if self._rows is None:
+            counts = np.diff(self.row_ptr)
+            self._rows = np.repeat(np.arange(self.shape[0], dtype=np.int32), counts)
+        return self._rows
+
+    def bbox(self):
+        """(y0, y1, x0, x1) of the foreground (half-open), None if empty."""
+        if self.runs == 0:
+            return None
+        rows = self.run_rows()
+        return (int(rows[0]), int(rows[-1]) + 1, int(self.starts.min()), int(self.ends.max()))
+
+    # ---------- foreground pixel coordinates ----------
+    def _pixel_blocks(self, block=1 << 16):
+        # (rows, cols) of the foreground pixels, row-major, for groups of
+        # whole runs covering about `block` pixels each
+        lengths = (self.ends - self.starts).astype(np.int64)
+        done = np.cumsum(lengths)
+        run_rows = self.run_rows()
+        i = 0
+        while i < lengths.size:
+            base = done[i] - lengths[i]
+            j = max(i + 1, int(np.searchsorted(done, base + block, side="right")))
+            lens = lengths[i:j]
+            cols = np.arange(int(done[j - 1] - base), dtype=np.intp)
+            cols += np.repeat(self.starts[i:j] - (done[i:j] - lens - base), lens)
+            yield np.repeat(run_rows[i:j], lens), cols
+            i = j
+
+    def _check(self, plane):
+        if plane.shape[:2] != self.shape:
+            raise ValueError("plane shape %s does not match mask %s" % (plane.shape, self.shape))
+
+    def values(self, plane):
+        """Foreground values of plane, row-major (same as plane[mask == 255])."""
+        self._check(plane)
+        parts = [plane[rows, cols] for rows, cols in self._pixel_blocks()]
+        if len(parts) == 0:
+            return plane[:0, 0]
+        return np.concatenate(parts)
+
+    # ---------- masked operations ----------
+    def histogram(self, plane):
+        """Exact 256-bin histogram of the foreground pixels of a uint8 plane."""
+        if plane.dtype != np.uint8:
+            raise ValueError("expected a uint8 plane, got %s" % plane.dtype)
+        self._check(plane)
+        hist = np.zeros(LEVELS, dtype=np.int64)
+        for rows, cols in self._pixel_blocks():
+            hist += np.bincount(plane[rows, cols], minlength=LEVELS)
+        return hist
+
+    def apply_lut(self, plane, lut, out=None):
+        """
+        Copy of plane with lut applied on the foreground only (same as
+        out[mask == 255] = lut[plane[mask == 255]]). Pass out=plane to map
+        in place; then only foreground pixels are touched.
+        """
+        self._check(plane)
+        table = as_lut_array(lut)
+        if out is None:
+            out = plane.copy()
+        elif out.shape != plane.shape:
+            raise ValueError("out has shape %s, plane has shape %s" % (out.shape, plane.shape))
+        for rows, cols in self._pixel_blocks():
+            out[rows, cols] = table[plane[rows, cols]]
+        return out
+
+    def extract(self, plane):
+        """Foreground of plane, 0 elsewhere (same as cv2.bitwise_and(plane, mask))."""
+        self._check(plane)
+        out = np.zeros_like(plane)
+        for rows, cols in self._pixel_blocks():
+            out[rows, cols] = plane[rows, cols]
+        return out
+
+    def __repr__(self):
+        return "RunMask(shape=%s, runs=%d, area=%d)" % (self.shape, self.runs, self.area)
@@ -0,0 +1,251 @@
+# Point operations on big images with a process pool over shared memory.
+#
+# A point op (the q1 piecewise map, q3 gamma, q4 vibrance, any LUT) treats
+# every row independently, so rows can be split across processes. Input
+# and output live in multiprocessing.shared_memory blocks; a task only
+# carries the op name, its small parameters (a 256-byte table at most),
+# the names of the two blocks and a row range:
+#
+#   parent: image -> shared input ---------------------> shared output -> result
+#   worker:            attach once, rows y0..y1 through the op, in place
+#
+# so no pixel data is ever pickled. Workers keep cv2 single-threaded to
+# avoid oversubscribing cores (cv2.LUT is itself parallel in one process).
+#
+# Ops are looked up by name in OPS; register_op() adds new ones. Register
+# at module level so worker processes (spawned or forked) know them too.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from common.curves import compile_curve
+from common.lut import apply_lut_to_channel, as_lut_array, lut_into
+from common.pointops import gamma_lut
+from common.vibrance import vibrance_lut
+
+OPS = {}
+
+
+def register_op(name):
+    """
+    Decorator: register fn(src_rows, dst_rows, **params) as op `name`.
+    fn writes the result for src_rows into dst_rows (same shape).
+    """
+    def deco(fn):
+        OPS[name] = fn
+        return fn
+    return deco
+
+
+@register_op("lut")
+def _op_lut(src, dst, table):
+    lut_into(src, as_lut_array(table), dst)
+
+
+@register_op("lut_channel")
+def _op_lut_channel(src, dst, table, channel):
+    # one channel of an interleaved image (L* of Lab, S of HSV); others copied
+    apply_lut_to_channel(src, table, channel, out=dst)
+
+
+@register_op("gamma")
+def _op_gamma(src, dst, gamma):
+    lut_into(src, gamma_lut(gamma), dst)
+
+
+@register_op("vibrance")
+def _op_vibrance(src, dst, alpha, sigma, channel=1):
+    # an S plane, or the S channel of an HSV image (H and V copied)
+    if src.ndim == 3:
+        apply_lut_to_channel(src, vibrance_lut(alpha, sigma), channel, out=dst)
+    else:
+        lut_into(src, vibrance_lut(alpha, sigma), dst)
+
+
+@register_op("curve")
+def _op_curve(src, dst, spec):
+    lut_into(src, compile_curve(spec), dst)
+
+
+# ---------- shared arrays ----------
+class SharedArray:
+    """
+    A numpy array backed by a shared memory block.
+    spec is the picklable (name, shape, dtype) a worker needs to attach.
+    """
+
+    def __init__(self, shape, dtype=np.uint8):
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+        self.spec = (self._shm.name, shape, dtype.str)
+
+    @classmethod
+    def copy_of(cls, arr):
+        shared = cls(arr.shape, arr.dtype)
+        shared.array[...] = arr
+        return shared
+
+    def close(self):
+        """Release and delete the block (drop any views of .array first)."""
+        if self._shm is not None:
+            self.array = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- worker side ----------
+_attached = {}
+
+
+def _worker_init():
+    cv2.setNumThreads(1)
+
+
+def _attach(specs):
+    # map the blocks of this task; drop mappings of blocks from earlier
+    # tasks, so a worker never holds more than one src/dst pair
+    for spec in list(_attached):
+        if spec not in specs:
+            shm, arr = _attached.pop(spec)
+            del arr
+            shm.close()
+    arrays = []
+    for spec in specs:
+        if spec not in _attached:
+            name, shape, dtype = spec
+            shm = shared_memory.SharedMemory(name=name)
+            _attached[spec] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+        arrays.append(_attached[spec][1])
+    return arrays
+
+
+def _run_task(op, src_spec, dst_spec, y0, y1, params):
+    src, dst = _attach((src_spec, dst_spec))
+    OPS[op](src[y0:y1], dst[y0:y1], **params)
+    return y1 - y0
+
+
+# ---------- parent side ----------
+def _check_op(op):
+    if op not in OPS:
+        raise ValueError("unknown op %r (registered: %s)" % (op, ", ".join(sorted(OPS))))
+
+
+def _chunks(h, rows):
+    return [(y, min(h, y + rows)) for y in range(0, h, rows)]
+
+
+class SharedPointExecutor:
+    """
+    Run registered point ops over image rows on a process pool.
+        with SharedPointExecutor(workers=4) as ex:
+            out = ex.apply(img, "gamma", gamma=0.8)
+    workers:    processes (default os.cpu_count()); 1 runs in this process
+    chunk_rows: rows per task (default: about 4 tasks per worker, at least
+                1 MB each)
+    """
+
+    def __init__(self, workers=None, chunk_rows=None):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.chunk_rows = chunk_rows
+        self._pool = None
+        self._buffers = {}
+
+    def _ensure_pool(self):
+        if self._pool is None and self.workers > 1:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_worker_init)
+        return self._pool
+
+    def _rows_per_task(self, shape):
+        if self.chunk_rows:
+            return max(1, int(self.chunk_rows))
+        row_bytes = int(np.prod(shape[1:])) if len(shape) > 1 else 1
+        rows = -(-shape[0] // (4 * self.workers))
+        return max(rows, (1 << 20) // max(row_bytes, 1), 1)
+
+    def buffer(self, slot, shape, dtype=np.uint8):
+        """
+        Reusable shared array for slot ("in", "out", ...); reallocated only
+        when the shape or dtype changes. Write an image into
+        ex.buffer("in", img.shape).array to skip the copy in apply().
+        """
+        shared = self._buffers.get(slot)
+        if shared is not None and shared.spec[1:] != (tuple(shape), np.dtype(dtype).str):
+            self._release(slot)
+            shared = None
+        if shared is None:
+            shared = SharedArray(shape, dtype)
+            self._buffers[slot] = shared
+        return shared
+
+    def _release(self, slot):
+        # workers drop their mapping of the old block on their next task
+        self._buffers.pop(slot).close()
+
+    def run(self, op, src, dst, **params):
+        """
+        op over all rows of SharedArray src into SharedArray dst (shared
+        memory to shared memory, nothing copied).
+        """
+        _check_op(op)
+        if src.array.shape != dst.array.shape:
+            raise ValueError("src %s and dst %s differ in shape" % (src.array.shape, dst.array.shape))
+        h = src.array.shape[0]
+        parts = _chunks(h, self._rows_per_task(src.array.shape))
+        pool = self._ensure_pool()
+        if pool is None or len(parts) == 1:
+            OPS[op](src.array, dst.array, **params)
+            return dst
+        futures = [pool.submit(_run_task, op, src.spec, dst.spec, y0, y1, params)
+                   for y0, y1 in parts]
+        done = sum(f.result() for f in futures)
+        if done != h:
+            raise RuntimeError("workers mapped %d of %d rows" % (done, h))
+        return dst
+
+    def apply(self, img, op, out=None, **params):
+        """
+        op on a uint8 image (any number of channels) with the rows split
+        over the workers. Returns a new array (or out). The image is
+        copied into the shared input block once; use buffer() + run() to
+        avoid even that.
+        """
+        _check_op(op)
+        img = np.asarray(img)
+        src = self.buffer("in", img.shape, img.dtype)
+        dst = self.buffer("out", img.shape, img.dtype)
+        if img is not src.array:
+            src.array[...] = img
+        self.run(op, src, dst, **params)
+        if out is None:
+            return dst.array.copy()
+        out[...] = dst.array
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for slot in list(self._buffers):
+            self._buffers.pop(slot).close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
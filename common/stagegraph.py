@@ -0,0 +1,80 @@
+# Tiny lazy stage graph.
+#
+# Stages are named nodes with a function and the names of the stages they
+# read. Nothing runs until a value is asked for; asking for a node runs only
+# the stages it depends on, and every stage runs at most once (results are
+# kept). Each stage's own run time is recorded so it is easy to see where
+# the time goes.
+#
+#   g = StageGraph()
+#   g.add("bgr", lambda: cv2.imread(path))
+#   g.add("hsv", lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV), ["bgr"])
+#   hsv = g["hsv"]
+
+import time
+
+
+class StageGraph:
+    def __init__(self):
+        self._nodes = {}    # name -> (fn, deps)
+        self._order = []    # insertion order (a valid topological order)
+        self._values = {}
+        self.timings = {}   # name -> seconds spent in that stage itself
+
+    def add(self, name, fn, deps=()):
+        """
+        Register a stage. deps must already be registered, which keeps the
+        graph acyclic. fn is called with the dep values in the given order.
+        """
+        if name in self._nodes:
+            raise ValueError("stage %r already exists" % name)
+        for d in deps:
+            if d not in self._nodes:
+                raise KeyError("stage %r depends on unknown stage %r" % (name, d))
+        self._nodes[name] = (fn, tuple(deps))
+        self._order.append(name)
+        return self
+
+    def set(self, name, value):
+        """Provide a stage's value directly (e.g. an already decoded image)."""
+        if name not in self._nodes:
+            raise KeyError("unknown stage %r" % name)
+        self.invalidate(name)
+        self._values[name] = value
+        self.timings[name] = 0.0
+
+    def get(self, name):
+        if name not in self._nodes:
+            raise KeyError("unknown stage %r" % name)
+        if name in self._values:
+            return self._values[name]
+        fn, deps = self._nodes[name]
+        args = [self.get(d) for d in deps]
+        t0 = time.perf_counter()
+        value = fn(*args)
+        self.timings[name] = time.perf_counter() - t0
+        self._values[name] = value
+        return value
+
+    __getitem__ = get
+
+    def is_evaluated(self, name):
+        return name in self._values
+
+    def dependents(self, name):
+        """All stages that (directly or indirectly) read name."""
+        out = set()
+        for n in self._order:
+            if any(d == name or d in out for d in self._nodes[n][1]):
+                out.add(n)
+        return out
+
+    def invalidate(self, name):
+        """Forget name and everything computed from it."""
+        for n in {name} | self.dependents(name):
+            self._values.pop(n, None)
+            self.timings.pop(n, None)
+
+    def report(self):
+        """(name, milliseconds) for every evaluated stage, in graph order."""
+        return [(n, self.timings[n] * 1e3) for n in self._order if n in self.timings]
@@ -0,0 +1,188 @@
+# Pipelined frame streaming: decode -> process -> encode in separate threads.
+#
+#   decode thread --(bounded queue)--> N worker threads --(bounded queue)--> writer
+#
+# cv2 releases the GIL inside VideoCapture.read(), cvtColor, LUT and
+# VideoWriter.write(), so plain threads are enough for the stages to overlap.
+# Workers may finish out of order; the writer keeps a small reorder buffer
+# keyed by frame number so frames are always written in input order.
+# At most queue_size frames are in flight (decoded but not yet written):
+# the decoder takes a slot before reading a frame and the writer gives it
+# back after writing one, so one slow frame cannot make the reorder buffer
+# grow without bound.
+
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+_STOP = object()
+
+
+def open_writer(path, size, fps, fourcc="mp4v"):
+    """
+    cv2.VideoWriter for a video file, or for an image sequence when the
+    path contains a printf pattern such as "out/frame_%04d.png".
+    """
+    if "%" in path:
+        return cv2.VideoWriter(path, 0, 0, size)
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+
+
+def _stage_stats(times):
+    if len(times) == 0:
+        return {"count": 0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    arr = np.asarray(times) * 1e3
+    return {
+        "count": len(times),
+        "mean_ms": float(arr.mean()),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def process_stream(src, dst, fn, workers=2, queue_size=8, fps=None, fourcc="mp4v"):
+    """
+    Read frames from src (video file or image-sequence pattern, anything
+    cv2.VideoCapture opens), run fn(frame) -> frame on a pool of worker
+    threads and write the results to dst in the original order. At most
+    queue_size frames are held in memory at once.
+    Returns a dict with frames, seconds, fps and per-stage latency stats
+    (decode / process / encode, plus end-to-end latency per frame).
+    """
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened():
+        raise IOError("could not open %s" % src)
+    if fps is None:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    q_in = queue.Queue(maxsize=queue_size)
+    q_out = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    in_flight = threading.Semaphore(queue_size)
+    errors = []
+    decode_t, process_t, encode_t, latency_t = [], [], [], []
+    started = {}
+
+    def put(q, item):
+        # put that gives up when another stage failed
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        # get that gives up (returns _STOP) when another stage failed
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _STOP
+
+    def acquire_slot():
+        # wait for a free in-flight slot; gives up when another stage failed
+        while not stop.is_set():
+            if in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def decoder():
+        try:
+            index = 0
+            while acquire_slot():
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                decode_t.append(time.perf_counter() - t0)
+                started[index] = t0
+                if not put(q_in, (index, frame)):
+                    break
+                index = index + 1
+        except Exception as e:  # surfaced in the caller
+            errors.append(e)
+            stop.set()
+        finally:
+            cap.release()
+            for _ in range(workers):
+                put(q_in, _STOP)
+
+    def worker():
+        try:
+            while not stop.is_set():
+                item = get(q_in)
+                if item is _STOP:
+                    break
+                index, frame = item
+                t0 = time.perf_counter()
+                out = fn(frame)
+                process_t.append(time.perf_counter() - t0)
+                if not put(q_out, (index, out)):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(q_out, _STOP)
+
+    threads = [threading.Thread(target=decoder, daemon=True)]
+    threads += [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    writer = None
+    pending = {}
+    next_index = 0
+    finished_workers = 0
+    try:
+        while finished_workers < workers:
+            item = get(q_out)
+            if stop.is_set():
+                break
+            if item is _STOP:
+                finished_workers = finished_workers + 1
+                continue
+            pending[item[0]] = item[1]
+            # write every frame that is now in order
+            while next_index in pending:
+                frame = pending.pop(next_index)
+                t0 = time.perf_counter()
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = open_writer(dst, (w, h), fps, fourcc)
+                    if not writer.isOpened():
+                        raise IOError("could not open writer for %s" % dst)
+                writer.write(frame)
+                t1 = time.perf_counter()
+                encode_t.append(t1 - t0)
+                latency_t.append(t1 - started.pop(next_index))
+                in_flight.release()
+                next_index = next_index + 1
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        if writer is not None:
+            writer.release()
+    if errors:
+        raise errors[0]
+    if pending:
+        raise RuntimeError("%d frames were never written (missing frame %d)" % (len(pending), next_index))
+
+    seconds = time.perf_counter() - t_start
+    return {
+        "frames": next_index,
+        "seconds": seconds,
+        "fps": next_index / seconds if seconds > 0 else 0.0,
+        "decode": _stage_stats(decode_t),
+        "process": _stage_stats(process_t),
+        "encode": _stage_stats(encode_t),
+        "latency": _stage_stats(latency_t),
+    }
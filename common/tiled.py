@@ -0,0 +1,314 @@
+# Streaming LUTs over images too big to hold in memory (whole-slide scans,
+# satellite mosaics).
+#
+# q1/q2 normally do Image.open(...).convert("L") and build full-size outputs.
+# Here input and outputs are uncompressed rasters in files and are walked
+# in row strips:
+#   map strip of the input -> (RGB -> L) -> LUT(s) -> mapped strip of each output
+# Only one strip of every file is mapped at a time, so memory stays around
+# (2 + number of outputs) x strip_bytes whatever the image size. Row strips
+# rather than 2D tiles: the files are row-major, so a strip is one
+# contiguous byte range and a strip of a few MB is still many rows.
+#
+# Supported files (uint8, gray (H, W) or RGB (H, W, 3)):
+#   .npy           numpy arrays (np.save / np.lib.format.open_memmap)
+#   .raw / .bin    headerless bytes; the shape has to be given
+#   .tif / .tiff   uncompressed strip TIFFs (mode L or RGB) for input;
+#                  outputs are written as single-strip baseline TIFFs
+# RGB input is turned into L with PIL's own integer formula, so the result
+# is byte-identical to Image.open(path).convert("L") followed by apply_lut.
+
+import os
+import struct
+
+import numpy as np
+from PIL import Image
+
+from common.lut import lut_into, stack_luts
+
+RAW_EXTS = (".raw", ".bin")
+TIFF_EXTS = (".tif", ".tiff")
+NPY_EXTS = (".npy",)
+
+
+def _ext(path):
+    path = str(path).lower()
+    for ext in RAW_EXTS + TIFF_EXTS + NPY_EXTS:
+        if path.endswith(ext):
+            return ext
+    return ""
+
+
+class Raster:
+    """
+    A uint8 raster stored uncompressed in a file, row-major.
+    segments: list of (y0, y1, offset): rows y0..y1-1 start at byte offset
+    (one segment for .npy/.raw; one per strip for a TIFF whose strips are
+    not back to back).
+    """
+
+    def __init__(self, path, shape, segments, writable=False):
+        self.path = path
+        self.shape = tuple(int(n) for n in shape)
+        if len(self.shape) not in (2, 3) or (len(self.shape) == 3 and self.shape[2] != 3):
+            raise ValueError("expected an (H, W) or (H, W, 3) raster, got shape %s" % (self.shape,))
+        self.segments = [(int(a), int(b), int(o)) for a, b, o in segments]
+        self.writable = writable
+
+    @property
+    def height(self):
+        return self.shape[0]
+
+    @property
+    def width(self):
+        return self.shape[1]
+
+    @property
+    def row_bytes(self):
+        n = self.shape[1]
+        if len(self.shape) == 3:
+            n = n * self.shape[2]
+        return n
+
+    def _map(self, y0, y1, seg):
+        sy0, _, offset = seg
+        return np.memmap(self.path, dtype=np.uint8, mode="r+" if self.writable else "r",
+                         offset=offset + (y0 - sy0) * self.row_bytes,
+                         shape=(y1 - y0,) + self.shape[1:])
+
+    def rows(self, y0, y1):
+        """
+        Rows y0..y1-1 as an array mapped from the file (writable for
+        outputs). Only when the rows span several TIFF strips is a copy made.
+        """
+        if not 0 <= y0 < y1 <= self.height:
+            raise ValueError("rows %d..%d outside 0..%d" % (y0, y1, self.height))
+        pieces = []
+        for seg in self.segments:
+            a, b = max(y0, seg[0]), min(y1, seg[1])
+            if a < b:
+                pieces.append(self._map(a, b, seg))
+        if len(pieces) == 1:
+            return pieces[0]
+        if self.writable:
+            raise ValueError("writable rows must lie inside one segment")
+        return np.concatenate(pieces)
+
+    def read(self):
+        """The whole raster in memory (for small images and checks)."""
+        return np.array(self.rows(0, self.height))
+
+    def __repr__(self):
+        return "Raster(%r, shape=%s)" % (self.path, self.shape)
+
+
+# ---------- opening inputs ----------
+def npy_layout(path):
+    """(shape, offset of the data) of a C-order uint8 .npy file."""
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype != np.uint8 or fortran:
+        raise ValueError("%s: expected a C-order uint8 array, got %s" % (path, dtype))
+    return shape, offset
+
+
+def _open_npy(path):
+    shape, offset = npy_layout(path)
+    return Raster(path, shape, [(0, shape[0], offset)])
+
+
+def _open_tiff(path):
+    # Image.open only parses the header; lift the decompression-bomb limit
+    # for it, since the pixels are never decoded here
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as img:
+            mode = img.mode
+            w, h = img.size
+            tiles = list(img.tile)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    if mode not in ("L", "RGB"):
+        raise ValueError("%s: only L and RGB TIFFs can be streamed, got mode %s" % (path, mode))
+    shape = (h, w) if mode == "L" else (h, w, 3)
+    segments = []
+    for tile in tiles:
+        codec, box, offset, args = tile[0], tile[1], tile[2], tile[3]
+        x0, y0, x1, y1 = box
+        if codec != "raw" or args[0] != mode or (len(args) > 2 and args[2] != 1):
+            raise ValueError("%s: compressed or unusual TIFF (%s); convert it to an "
+                             "uncompressed TIFF or .npy first" % (path, codec))
+        if x0 != 0 or x1 != w:
+            raise ValueError("%s: tiled TIFFs are not supported, only strips" % path)
+        segments.append((y0, min(y1, h), offset))
+    segments.sort()
+    # merge strips that follow each other in the file into one segment
+    merged = []
+    row_bytes = w * (1 if mode == "L" else 3)
+    for seg in segments:
+        if merged:
+            a, b, off = merged[-1]
+            if seg[0] == b and seg[2] == off + (b - a) * row_bytes:
+                merged[-1] = (a, seg[1], off)
+                continue
+        merged.append(seg)
+    return Raster(path, shape, merged)
+
+
+def open_raster(path, shape=None, offset=0):
+    """
+    Open an input raster without reading its pixels.
+    path:   .npy, .raw/.bin or uncompressed .tif/.tiff (see the top of this file)
+    shape:  (H, W) or (H, W, 3), required for .raw/.bin
+    offset: header bytes to skip in a .raw/.bin file
+    """
+    ext = _ext(path)
+    if ext in NPY_EXTS:
+        return _open_npy(path)
+    if ext in TIFF_EXTS:
+        return _open_tiff(path)
+    if ext in RAW_EXTS:
+        if shape is None:
+            raise ValueError("shape is required for raw files")
+        return Raster(path, shape, [(0, shape[0], offset)])
+    raise ValueError("unsupported raster file (use .npy, .raw/.bin or .tif): %s" % path)
+
+
+# ---------- creating outputs ----------
+_TIFF_DATA_OFFSET = 8 + 2 + 9 * 12 + 4
+
+
+def _write_tiff_header(f, h, w):
+    # baseline gray TIFF, one uncompressed strip right after the header
+    def entry(tag, kind, value):
+        if kind == 3:  # SHORT
+            return struct.pack("<HHIHxx", tag, 3, 1, value)
+        return struct.pack("<HHII", tag, 4, 1, value)  # LONG
+
+    entries = [
+        entry(256, 4, w),                   # ImageWidth
+        entry(257, 4, h),                   # ImageLength
+        entry(258, 3, 8),                   # BitsPerSample
+        entry(259, 3, 1),                   # Compression: none
+        entry(262, 3, 1),                   # Photometric: BlackIsZero
+        entry(273, 4, _TIFF_DATA_OFFSET),   # StripOffsets
+        entry(277, 3, 1),                   # SamplesPerPixel
+        entry(278, 4, h),                   # RowsPerStrip
+        entry(279, 4, h * w),               # StripByteCounts
+    ]
+    f.write(b"II*\x00" + struct.pack("<I", 8))
+    f.write(struct.pack("<H", len(entries)) + b"".join(entries) + struct.pack("<I", 0))
+
+
+def create_raster(path, shape):
+    """
+    Create a writable uint8 output raster of the given (H, W) shape
+    (.npy, .raw/.bin or .tif). The file is allocated at full size (sparse
+    where the filesystem allows it); nothing is held in memory.
+    """
+    h, w = (int(n) for n in shape)
+    ext = _ext(path)
+    if ext in NPY_EXTS:
+        arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(h, w))
+        offset = arr.offset
+        del arr
+    elif ext in TIFF_EXTS:
+        if _TIFF_DATA_OFFSET + h * w >= 1 << 32:
+            raise ValueError("TIFF output is limited to 4 GB; use .npy for %dx%d" % (w, h))
+        with open(path, "wb") as f:
+            _write_tiff_header(f, h, w)
+            f.truncate(_TIFF_DATA_OFFSET + h * w)
+        offset = _TIFF_DATA_OFFSET
+    elif ext in RAW_EXTS:
+        with open(path, "wb") as f:
+            f.truncate(h * w)
+        offset = 0
+    else:
+        raise ValueError("unsupported raster file (use .npy, .raw/.bin or .tif): %s" % path)
+    return Raster(path, (h, w), [(0, h, offset)], writable=True)
+
+
+# ---------- streaming ----------
+def same_file(a, b):
+    """True if paths a and b name the same file (b need not exist yet)."""
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return os.path.realpath(a) == os.path.realpath(b)
+
+
+def rgb_to_l(rgb):
+    """PIL's RGB -> L conversion, (R*19595 + G*38470 + B*7471 + 0x8000) >> 16."""
+    acc = rgb[:, :, 0].astype(np.uint32)
+    acc *= 19595
+    acc += rgb[:, :, 1].astype(np.uint32) * 38470
+    acc += rgb[:, :, 2].astype(np.uint32) * 7471
+    acc += 0x8000
+    acc >>= 16
+    return acc.astype(np.uint8)
+
+
+def strip_rows(row_bytes, strip_bytes=16 << 20):
+    """Rows per strip so one strip of input is about strip_bytes."""
+    return max(1, strip_bytes // max(row_bytes, 1))
+
+
+def stream_luts(src, luts, dsts, strip_bytes=16 << 20, progress=None):
+    """
+    Apply N LUTs to a raster strip by strip, writing N output rasters.
+    src:      Raster or path for open_raster()
+    luts:     list of 256-entry LUTs, or a (256, N) table
+    dsts:     N output paths (or writable Rasters of the input's H x W)
+    progress: optional progress(done_rows, total_rows), called per strip
+    Returns the output Rasters. Byte-identical to apply_luts() on the
+    whole image.
+    """
+    if not isinstance(src, Raster):
+        src = open_raster(src)
+    table = stack_luts(luts)
+    n = table.shape[1]
+    if len(dsts) != n:
+        raise ValueError("%d LUTs but %d outputs" % (n, len(dsts)))
+    h, w = src.shape[:2]
+    for dst in dsts:
+        path = dst.path if isinstance(dst, Raster) else dst
+        if same_file(src.path, path):
+            raise ValueError("output %r is the input file; it would be overwritten "
+                             "while it is read" % (path,))
+    outs = []
+    for dst in dsts:
+        if not isinstance(dst, Raster):
+            dst = create_raster(dst, (h, w))
+        if dst.shape != (h, w) or not dst.writable:
+            raise ValueError("output %r must be a writable %dx%d raster" % (dst.path, w, h))
+        outs.append(dst)
+    cols = [np.ascontiguousarray(table[:, i]) for i in range(n)]
+
+    step = strip_rows(src.row_bytes, strip_bytes)
+    y = 0
+    while y < h:
+        y1 = min(h, y + step)
+        block = src.rows(y, y1)
+        if block.ndim == 3:
+            block = rgb_to_l(block)
+        i = 0
+        while i < n:
+            # the mapped window is dropped on return; the OS writes the pages back
+            lut_into(block, cols[i], outs[i].rows(y, y1))
+            i = i + 1
+        del block
+        y = y1
+        if progress is not None:
+            progress(y, h)
+    return outs
+
+
+def stream_lut(src, lut, dst, strip_bytes=16 << 20, progress=None):
+    """stream_luts() with one LUT and one output; returns the output Raster."""
+    return stream_luts(src, [lut], [dst], strip_bytes, progress)[0]
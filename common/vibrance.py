@@ -0,0 +1,114 @@
+# Vibrance (saturation bump) shared by q4b..q4e.
+#
+# f(s) = s + alpha * 128 * exp(-(s - 128)^2 / (2 * sigma^2)), clamped to 0..255
+#
+# The rule only depends on the 8-bit input, so it is evaluated 256 times per
+# (alpha, sigma) into a memoized table and applied to the S plane with one
+# vectorized LUT call instead of math.exp once per pixel.
+#
+# For the same reason a whole alpha x sigma sweep can be scored from one
+# histogram of S: vibrance_sweep() pushes that histogram through each
+# setting's table (O(256) per setting) and never touches the pixels again.
+
+import functools
+import math
+
+import numpy as np
+
+from common.histogram import Histogram
+from common.lut import apply_lut, apply_lut_to_channel
+
+
+def clamp_0_255(v):
+    if v < 0:
+        return 0
+    if v > 255:
+        return 255
+    return int(v)
+
+
+def vibrance_pixel(s_value, alpha, sigma):
+    # Gaussian bump centered at 128 (the original per-pixel rule)
+    diff = (s_value - 128.0)
+    exp_term = math.exp(-(diff * diff) / (2.0 * sigma * sigma))
+    bump = alpha * 128.0 * exp_term
+    new_val = s_value + bump
+    return clamp_0_255(new_val)
+
+
+@functools.lru_cache(maxsize=256)
+def vibrance_lut(alpha, sigma):
+    """
+    Read-only 256-entry uint8 table of vibrance_pixel for one (alpha, sigma).
+    Memoized, so repeated calls return the same array.
+    """
+    lut = np.array([vibrance_pixel(i, alpha, sigma) for i in range(256)], dtype=np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+
+def apply_vibrance(S, alpha, sigma, out=None):
+    """Vibrance on a whole S plane (2D uint8) in one LUT call."""
+    return apply_lut(S, vibrance_lut(alpha, sigma), out=out)
+
+
+def apply_vibrance_hsv(hsv, alpha, sigma, out=None):
+    """
+    Vibrance on the S channel of an interleaved HSV image, without splitting
+    or merging channels. Pass out=hsv to modify it in place.
+    """
+    return apply_lut_to_channel(hsv, vibrance_lut(alpha, sigma), 1, out=out)
+
+
+# ---------- alpha / sigma sweep in the histogram domain ----------
+def _as_histogram(S_or_hist):
+    if isinstance(S_or_hist, Histogram):
+        return S_or_hist
+    return Histogram.from_plane(S_or_hist)
+
+
+def vibrance_sweep(S_or_hist, alphas, sigmas):
+    """
+    Score every (alpha, sigma) on the grid from one S histogram.
+    S_or_hist: the S plane (counted once) or a Histogram of it
+    Returns a list of dicts, one per setting, with:
+        alpha, sigma, mean, median, clip_high (fraction at 255),
+        mean_shift, median_shift, emd (mean |f(s) - s| over the pixels)
+    """
+    before = _as_histogram(S_or_hist)
+    n = before.total
+    levels = np.arange(256)
+    results = []
+    for sigma in sigmas:
+        for alpha in alphas:
+            lut = vibrance_lut(alpha, sigma)
+            after = before.through(lut)
+            moved = np.abs(lut.astype(np.int64) - levels)
+            emd = float(np.dot(before.counts, moved)) / n if n else 0.0
+            results.append({
+                "alpha": alpha,
+                "sigma": sigma,
+                "mean": after.mean,
+                "median": after.median,
+                "clip_high": after.clip_high,
+                "mean_shift": after.mean - before.mean,
+                "median_shift": after.median - before.median,
+                "emd": emd,
+            })
+    return results
+
+
+def choose_setting(results, max_clip=0.01, target_mean=None):
+    """
+    Pick one setting from vibrance_sweep() results.
+    - only settings with clip_high <= max_clip are considered
+    - with target_mean: the one whose mean S is closest to it
+    - otherwise: the strongest one (largest mean_shift)
+    Returns the chosen result dict, or None if every setting clips too much.
+    """
+    ok = [r for r in results if r["clip_high"] <= max_clip]
+    if len(ok) == 0:
+        return None
+    if target_mean is not None:
+        return min(ok, key=lambda r: abs(r["mean"] - target_mean))
+    return max(ok, key=lambda r: r["mean_shift"])
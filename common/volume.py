@@ -0,0 +1,184 @@
+# LUTs over 3D volumes (MRI stacks) slice by slice, with histograms.
+#
+# A volume is a stack of 2D uint8 slices:
+#   - a (D, H, W) uint8 .npy file (W != 3: a trailing 3 is an RGB image), or
+#   - a directory of slice images (png/tif/..., read like q2 with
+#     .convert("L"), in natural order: slice_2 before slice_10)
+# Outputs are (D, H, W) .npy files created at full size on disk. Every
+# slice is mapped on its own (np.memmap window at the slice's offset), so
+# only the slices being worked on are in memory, never the volume.
+#
+# Slices are spread over a thread pool: cv2.LUT and the cv2 histogram
+# kernel release the GIL, and every thread maps its own windows. The same
+# pass counts each input slice; the histograms of the outputs follow from
+# those through the LUTs (see common/histogram.py), so no output pixel is
+# read back.
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from common.batch import IMAGE_EXTS
+from common.histogram import LEVELS, bincount_u8
+from common.lut import lut_into, stack_luts
+from common.tiled import npy_layout, same_file
+
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def list_slices(folder):
+    """Slice image paths of a directory (not recursive), in natural order."""
+    names = [n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTS)]
+    return [os.path.join(folder, n) for n in sorted(names, key=_natural_key)]
+
+
+class Volume:
+    """
+    Read access to a (D, H, W) uint8 volume one slice at a time.
+        vol = Volume("brain.npy")        # or a directory of slices
+        s = vol.slice(10)                # 2D uint8 (mapped for .npy)
+    """
+
+    def __init__(self, src):
+        self.src = src
+        if os.path.isdir(src):
+            self.paths = list_slices(src)
+            if not self.paths:
+                raise ValueError("no slice images in %s" % src)
+            first = self._read_image(0)
+            self.shape = (len(self.paths),) + first.shape
+            self.offset = None
+        else:
+            shape, offset = npy_layout(src)
+            if len(shape) != 3:
+                raise ValueError("%s: expected a (D, H, W) volume, got shape %s" % (src, shape))
+            self.paths = None
+            self.shape = tuple(shape)
+            self.offset = offset
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _read_image(self, i):
+        with Image.open(self.paths[i]) as img:
+            return np.asarray(img.convert("L"))
+
+    def slice(self, i):
+        """Slice i as a 2D uint8 array."""
+        if self.paths is None:
+            _, h, w = self.shape
+            return np.memmap(self.src, dtype=np.uint8, mode="r",
+                             offset=self.offset + i * h * w, shape=(h, w))
+        arr = self._read_image(i)
+        if arr.shape != self.shape[1:]:
+            raise ValueError("%s is %s, other slices are %s" % (self.paths[i], arr.shape, self.shape[1:]))
+        return arr
+
+
+def create_volume(path, shape):
+    """Create a (D, H, W) uint8 .npy output at full size; returns its data offset."""
+    if not str(path).lower().endswith(".npy"):
+        raise ValueError("volume outputs are .npy files, got %s" % path)
+    arr = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=tuple(shape))
+    offset = arr.offset
+    del arr
+    return offset
+
+
+def _out_slice(path, offset, shape, i):
+    _, h, w = shape
+    return np.memmap(path, dtype=np.uint8, mode="r+", offset=offset + i * h * w, shape=(h, w))
+
+
+def hists_through(hists, lut):
+    """
+    Histograms after a LUT for a (N, 256) stack of histograms: every count
+    at level v moves to lut[v] (Histogram.through for many rows at once).
+    """
+    move = np.zeros((LEVELS, LEVELS), dtype=np.int64)
+    move[np.arange(LEVELS), np.asarray(lut, dtype=np.intp)] = 1
+    return np.asarray(hists, dtype=np.int64) @ move
+
+
+def volume_luts(src, luts, dsts, workers=None, progress=None):
+    """
+    Apply N LUTs to every slice of a volume, writing N (D, H, W) .npy files.
+    src:      .npy volume or directory of slices (or a Volume)
+    luts:     list of 256-entry LUTs, or a (256, N) table
+    dsts:     N output .npy paths
+    workers:  threads (default os.cpu_count()); 1 = in this thread
+    progress: optional progress(done_slices, total_slices)
+    Returns a dict with
+        slice_hist:  (D, 256) histogram of every input slice
+        volume_hist: (256,) histogram of the whole input volume
+        out_slice_hist / out_volume_hist: lists of the same, per output
+    """
+    vol = src if isinstance(src, Volume) else Volume(src)
+    table = stack_luts(luts)
+    n = table.shape[1]
+    if len(dsts) != n:
+        raise ValueError("%d LUTs but %d outputs" % (n, len(dsts)))
+    for dst in dsts:
+        if not str(dst).lower().endswith(".npy"):
+            raise ValueError("volume outputs are .npy files, got %s" % dst)
+        if same_file(vol.src, dst):
+            raise ValueError("output %r is the input volume; it would be overwritten "
+                             "while it is read" % (dst,))
+    cols = [np.ascontiguousarray(table[:, k]) for k in range(n)]
+    offsets = [create_volume(dst, vol.shape) for dst in dsts]
+    d = len(vol)
+    slice_hist = np.zeros((d, LEVELS), dtype=np.int64)
+
+    def work(i):
+        plane = vol.slice(i)
+        slice_hist[i] = bincount_u8(plane)
+        k = 0
+        while k < n:
+            lut_into(plane, cols[k], _out_slice(dsts[k], offsets[k], vol.shape, i))
+            k = k + 1
+        return i
+
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    done = 0
+    if workers == 1:
+        for i in range(d):
+            work(i)
+            done = done + 1
+            if progress is not None:
+                progress(done, d)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(work, range(d)):
+                done = done + 1
+                if progress is not None:
+                    progress(done, d)
+
+    out_slice_hist = [hists_through(slice_hist, col) for col in cols]
+    return {
+        "slice_hist": slice_hist,
+        "volume_hist": slice_hist.sum(axis=0),
+        "out_slice_hist": out_slice_hist,
+        "out_volume_hist": [h.sum(axis=0) for h in out_slice_hist],
+    }
+
+
+def is_volume(path):
+    """
+    True for a directory of slices or a (D, H, W) .npy file. A 3D .npy with
+    a last dimension of 3 is an (H, W, 3) RGB image (see common/tiled.py),
+    not a volume.
+    """
+    if os.path.isdir(path):
+        return True
+    if str(path).lower().endswith(".npy") and os.path.isfile(path):
+        try:
+            shape = npy_layout(path)[0]
+        except ValueError:
+            return False
+        return len(shape) == 3 and shape[2] != 3
+    return False
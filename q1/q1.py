@@ -2,10 +2,25 @@
 
 # NOTE: Put emma.jpg in the SAME folder before running this.
 # Run with: python beginner_style_piecewise.py
+# Huge inputs (uncompressed .tif, .npy, .raw): python q1.py big_in.tif big_out.tif
+# streams the image through the LUT strip by strip (see common/tiled.py).
+
+import os
+import sys
 
 import matplotlib.pyplot as plt
 from PIL import Image
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.curves import compile_curve, jump_spec
+from common.lut import apply_lut_image
+from common.tiled import stream_lut
+
+# Same rule as convert_intensity() below, as a curve spec that is compiled
+# (and cached) once instead of being evaluated value by value.
+PIECEWISE_SPEC = jump_spec(x0=50, y0=100, x1=150, y1=255)
+
 # ---------- helper to convert a single pixel ----------
 def convert_intensity(v):
     # Piecewise rule:
@@ -32,20 +47,33 @@ def convert_intensity(v):
 
 # ---------- build LUT (0..255) so we can also plot it ----------
 def build_lut_list():
-    lut_list = []
-    r_values = []
-    s_values = []
-    i = 0
-    while i <= 255:
-        out_v = convert_intensity(i)
-        lut_list.append(out_v)
-        r_values.append(i)
-        s_values.append(out_v)
-        i = i + 1
+    # compiled from PIECEWISE_SPEC; gives the same values as calling
+    # convert_intensity(i) for i in 0..255
+    lut_list = compile_curve(PIECEWISE_SPEC).tolist()
+    r_values = list(range(256))
+    s_values = list(lut_list)
     return lut_list, r_values, s_values
 
+# ---------- streaming mode for images too big for memory ----------
+def print_progress(done, total):
+    print("  rows %d / %d" % (done, total))
+
+def stream_main(in_path, out_path):
+    print("Streaming", in_path, "->", out_path, "strip by strip...")
+    lut_list, r_vals, s_vals = build_lut_list()
+    try:
+        out = stream_lut(in_path, lut_list, out_path, progress=print_progress)
+    except (OSError, ValueError) as e:
+        print("Could not stream", in_path, "Error:", e)
+        return
+    print("Saved output as", out_path, "size:", (out.width, out.height))
+
 # ---------- main ----------
 def main():
+    if len(sys.argv) > 2:
+        stream_main(sys.argv[1], sys.argv[2])
+        return
+
     print("Opening image...")
     try:
         img_path = "emma.jpg"
@@ -61,23 +89,10 @@ def main():
     lut_list, r_vals, s_vals = build_lut_list()
     print("LUT built with", len(lut_list), "entries.")
 
-    # Apply transform pixel-by-pixel (beginner style loops)
-    print("Applying transform (this might be a bit slow)...")
-    w, h = img.size
-    in_pixels = img.load()
-    out_img = Image.new("L", (w, h))
-    out_pixels = out_img.load()
-
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            original_v = in_pixels[x, y]
-            # use the LUT list (equivalent to convert_intensity(original_v))
-            new_v = lut_list[original_v]
-            out_pixels[x, y] = new_v
-            x = x + 1
-        y = y + 1
+    # Apply transform to the whole image at once (same result as looping
+    # over every pixel with lut_list, just much faster)
+    print("Applying transform...")
+    out_img = apply_lut_image(img, lut_list)
 
     # Save
     out_name = "emma_piecewise.png"
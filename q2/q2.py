@@ -1,16 +1,32 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
+import numpy as np
 from PIL import Image
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.curves import compile_curve, points_spec, scale_points
+from common.histogram import Histogram
+from common.lut import apply_luts, apply_luts_images, load_gray16
+from common.tiled import stream_luts
+from common.volume import is_volume, volume_luts
+
 # -----------------------------
 # Very simple helpers
 # -----------------------------
-def clamp_0_255(v):
+def clamp_top(v, top):
+    # clamp to 0..top (top = 2**bits - 1: 255, 4095 or 65535)
     if v < 0:
         return 0
-    if v > 255:
-        return 255
+    if v > top:
+        return top
     return int(v)
 
+def clamp_0_255(v):
+    return clamp_top(v, 255)
+
 def make_int(v):
     # helper to coerce to int safely
     try:
@@ -18,20 +34,20 @@ def make_int(v):
     except:
         return 0
 
-def clamp_point(x, y):
-    # clamp a single control point to [0,255]
+def clamp_point(x, y, top=255):
+    # clamp a single control point to [0,top] (top = 255 for 8-bit)
     x = make_int(x)
     y = make_int(y)
     if x < 0: x = 0
-    if x > 255: x = 255
+    if x > top: x = top
     if y < 0: y = 0
-    if y > 255: y = 255
+    if y > top: y = top
     return (x, y)
 
-def ensure_endpoints(points):
-    # make sure first x is 0 and last x is 255 (beginner style)
+def ensure_endpoints(points, top=255):
+    # make sure first x is 0 and last x is top (beginner style)
     if len(points) == 0:
-        points = [(0, 0), (255, 255)]
+        points = [(0, 0), (top, top)]
         return points
 
     first_x, first_y = points[0]
@@ -39,36 +55,40 @@ def ensure_endpoints(points):
 
     if first_x != 0:
         points = [(0, first_y)] + points
-    if last_x != 255:
-        points = points + [(255, last_y)]
+    if last_x != top:
+        points = points + [(top, last_y)]
     return points
 
-def build_lut_from_points_beginner(control_pts):
+def build_lut_from_points_beginner(control_pts, bits=8):
     """
     Beginner-style LUT builder from control points.
     - Uses simple loops and lists.
     - Respects vertical jumps when two points share the same x.
     - Fills missing values by simple forward/backward fill.
+    - bits: 8 for the usual 0..255 range, 12 or 16 for wider data (points
+      and LUT values are then in 0..2**bits - 1)
     Returns:
-        lut_list: list of 256 ints
+        lut_list: list of 256 ints (2**bits for wider data)
         r_vals:   [0..255]
         s_vals:   same as lut_list (for plotting)
     """
     print("Building LUT from control points (beginner style)...")
+    levels = 2 ** bits
+    top = levels - 1
 
-    # 1) Clamp all points to 0..255
+    # 1) Clamp all points to 0..255 (0..top)
     cps = []
     i = 0
     while i < len(control_pts):
         x, y = control_pts[i]
-        cps.append(clamp_point(x, y))
+        cps.append(clamp_point(x, y, top))
         i = i + 1
 
-    # 2) Ensure endpoints at x=0 and x=255
-    cps = ensure_endpoints(cps)
+    # 2) Ensure endpoints at x=0 and x=255 (x=top)
+    cps = ensure_endpoints(cps, top)
 
     # 3) Create a list for LUT, start with None to indicate "unset"
-    lut = [None] * 256
+    lut = [None] * levels
 
     # 4) Process segments one by one in given order
     #    If x1 == x0 -> vertical jump: set lut at that x to y1
@@ -80,7 +100,7 @@ def build_lut_from_points_beginner(control_pts):
 
         if x1 == x0:
             # Vertical jump at x0: set value at x0 to the "after" level y1
-            lut[x0] = clamp_0_255(y1)
+            lut[x0] = clamp_top(y1, top)
         else:
             # Determine segment direction (follow the order as given)
             # We'll iterate x from x0 to x1 step +1 or -1 accordingly.
@@ -106,7 +126,7 @@ def build_lut_from_points_beginner(control_pts):
                     t = (x - x0) / float(denom)
 
                 y = y0 + (y1 - y0) * t
-                lut[x] = clamp_0_255(y)
+                lut[x] = clamp_top(y, top)
 
                 if x == x1:
                     break
@@ -118,7 +138,7 @@ def build_lut_from_points_beginner(control_pts):
     # Forward fill
     last_seen = None
     i = 0
-    while i < 256:
+    while i < levels:
         if lut[i] is None:
             if last_seen is not None:
                 lut[i] = last_seen
@@ -128,7 +148,7 @@ def build_lut_from_points_beginner(control_pts):
 
     # Backward fill
     next_seen = None
-    i = 255
+    i = top
     while i >= 0:
         if lut[i] is None:
             if next_seen is not None:
@@ -139,11 +159,11 @@ def build_lut_from_points_beginner(control_pts):
 
     # Final safety clamp + int
     i = 0
-    while i < 256:
-        lut[i] = clamp_0_255(lut[i] if lut[i] is not None else 0)
+    while i < levels:
+        lut[i] = clamp_top(lut[i] if lut[i] is not None else 0, top)
         i = i + 1
 
-    r_vals = list(range(256))
+    r_vals = list(range(levels))
     s_vals = list(lut)
     print("LUT ready with", len(lut), "entries.")
     return lut, r_vals, s_vals
@@ -152,6 +172,7 @@ def apply_lut_pixel_by_pixel(gray_img, lut):
     """
     Beginner-style pixel-by-pixel LUT application using PIL .load().
     gray_img: PIL Image in mode "L"
+    Kept as the reference implementation; main() uses apply_luts_images().
     """
     print("Applying LUT to image (pixel-by-pixel, may be slow)...")
     w, h = gray_img.size
@@ -191,33 +212,139 @@ control_pts_gm = [
     (255, 255)
 ]
 
+# Bit depth of the input: 8, or 12 / 16 for native medical data. With 12 or
+# 16 the image is read without the 8-bit conversion and the curves become
+# 4096- / 65536-entry tables; the points above (0..255) are stretched to
+# that range. Put points in the native range straight into points_spec()
+# to use them as they are.
+BITS = 8
+
+# Curve specs for the shared compiler (common/curves.py). The compiled LUTs
+# match build_lut_from_points_beginner() and are cached by content hash.
+if BITS == 8:
+    WM_SPEC = points_spec(control_pts_wm)
+    GM_SPEC = points_spec(control_pts_gm)
+else:
+    WM_SPEC = points_spec(scale_points(control_pts_wm, BITS), BITS)
+    GM_SPEC = points_spec(scale_points(control_pts_gm, BITS), BITS)
+
+# -----------------------------
+# Streaming mode for images too big for memory
+#   python q2.py big_in.tif wm_out.tif gm_out.tif
+# (uncompressed .tif, .npy or .raw; see common/tiled.py)
+# -----------------------------
+def print_progress(done, total):
+    print("  rows %d / %d" % (done, total))
+
+def stream_main(in_path, wm_path, gm_path):
+    print("Streaming", in_path, "through the WM and GM LUTs strip by strip...")
+    lut_wm = compile_curve(WM_SPEC)
+    lut_gm = compile_curve(GM_SPEC)
+    try:
+        stream_luts(in_path, [lut_wm, lut_gm], [wm_path, gm_path], progress=print_progress)
+    except (OSError, ValueError) as e:
+        print("Could not stream", in_path, "Error:", e)
+        return
+    print("Saved:", wm_path)
+    print("Saved:", gm_path)
+
+# -----------------------------
+# Volume mode for 3D stacks (hundreds of slices)
+#   python q2.py brain_volume.npy wm_volume.npy gm_volume.npy
+# The input is a (slices, H, W) uint8 .npy (W != 3; an (H, W, 3) .npy is an
+# RGB image and is streamed) or a directory of slice images; outputs must
+# be .npy volumes. Slices are mapped one at a time and spread
+# over threads (see common/volume.py); input and output histograms, per
+# slice and for the whole volume, come out of the same pass.
+# -----------------------------
+VOLUME_HIST_OUT = "volume_histograms.npz"
+VOLUME_WORKERS = None   # threads; None = one per core
+
+def print_slice_progress(done, total):
+    if done == total or done % 50 == 0:
+        print("  slices %d / %d" % (done, total))
+
+def volume_main(in_path, wm_path, gm_path):
+    print("Volume mode:", in_path, "through the WM and GM LUTs slice by slice...")
+    lut_wm = compile_curve(WM_SPEC)
+    lut_gm = compile_curve(GM_SPEC)
+    try:
+        hists = volume_luts(in_path, [lut_wm, lut_gm], [wm_path, gm_path],
+                            workers=VOLUME_WORKERS, progress=print_slice_progress)
+    except (OSError, ValueError) as e:
+        print("Could not process volume", in_path, "Error:", e)
+        return
+    print("Saved:", wm_path)
+    print("Saved:", gm_path)
+
+    np.savez(VOLUME_HIST_OUT,
+             slice_hist=hists["slice_hist"], volume_hist=hists["volume_hist"],
+             wm_slice_hist=hists["out_slice_hist"][0], wm_volume_hist=hists["out_volume_hist"][0],
+             gm_slice_hist=hists["out_slice_hist"][1], gm_volume_hist=hists["out_volume_hist"][1])
+    print("Saved per-slice and whole-volume histograms:", VOLUME_HIST_OUT)
+    for name, counts in (("input", hists["volume_hist"]),
+                         ("WM", hists["out_volume_hist"][0]),
+                         ("GM", hists["out_volume_hist"][1])):
+        h = Histogram(counts)
+        print("  %-5s voxels %d  mean %.1f  median %d" % (name, h.total, h.mean, h.median))
+
 # -----------------------------
 # Main
 # -----------------------------
 def main():
+    if len(sys.argv) > 3:
+        if BITS != 8:
+            print("Streaming and volume modes are 8-bit only (BITS = %d);" % BITS,
+                  "set BITS = 8 or run q2 on a single 16-bit image without arguments.")
+            return
+        if is_volume(sys.argv[1]):
+            volume_main(sys.argv[1], sys.argv[2], sys.argv[3])
+        else:
+            stream_main(sys.argv[1], sys.argv[2], sys.argv[3])
+        return
+
     INPUT_IMAGE = "brain_proton_density_slice.png"
     WM_OUT = "wm_from_ctrlpts.png"
     GM_OUT = "gm_from_ctrlpts.png"
 
+    top = 2 ** BITS - 1
+
     print("Opening input image:", INPUT_IMAGE)
     try:
-        img = Image.open(INPUT_IMAGE).convert("L")
+        if BITS == 8:
+            img = Image.open(INPUT_IMAGE).convert("L")
+        else:
+            # native 12/16-bit values, no quantization to 8 bits
+            img = load_gray16(INPUT_IMAGE)
     except Exception as e:
         print("Failed to open image. Error:", e)
         return
 
-    print("Image size:", img.size)
+    if BITS == 8:
+        print("Image size:", img.size)
+    else:
+        print("Image size:", (img.shape[1], img.shape[0]), "bits:", BITS)
 
-    # Build the two LUTs
+    # Build the two LUTs (compiled once, then served from the curve cache)
     print("Building White Matter LUT...")
-    lut_wm, r_wm, s_wm = build_lut_from_points_beginner(control_pts_wm)
+    lut_wm = compile_curve(WM_SPEC)
 
     print("Building Gray Matter LUT...")
-    lut_gm, r_gm, s_gm = build_lut_from_points_beginner(control_pts_gm)
-
-    # Apply them
-    out_img_wm = apply_lut_pixel_by_pixel(img, lut_wm)
-    out_img_gm = apply_lut_pixel_by_pixel(img, lut_gm)
+    lut_gm = compile_curve(GM_SPEC)
+
+    r_wm = r_gm = list(range(top + 1))
+    s_wm = lut_wm.tolist()
+    s_gm = lut_gm.tolist()
+
+    # Apply both in one pass over the input (byte-identical to running
+    # apply_lut_pixel_by_pixel once per LUT)
+    print("Applying WM and GM LUTs to image...")
+    if BITS == 8:
+        out_img_wm, out_img_gm = apply_luts_images(img, [lut_wm, lut_gm])
+    else:
+        out_wm, out_gm = apply_luts(img, [lut_wm, lut_gm])
+        out_img_wm = Image.fromarray(out_wm)  # saved as 16-bit PNG
+        out_img_gm = Image.fromarray(out_gm)
 
     # Save outputs
     out_img_wm.save(WM_OUT)
@@ -233,19 +360,24 @@ def main():
     plt.plot(r_wm, s_wm, label="White Matter", linewidth=2)
     plt.plot(r_gm, s_gm, label="Gray Matter", linewidth=2, linestyle="--")
 
-    # show control points as dots (beginner style)
-    wmx = [p[0] for p in control_pts_wm]
-    wmy = [p[1] for p in control_pts_wm]
-    gmx = [p[0] for p in control_pts_gm]
-    gmy = [p[1] for p in control_pts_gm]
+    # show control points as dots (beginner style), in the curve's range
+    pts_wm = control_pts_wm
+    pts_gm = control_pts_gm
+    if BITS != 8:
+        pts_wm = scale_points(control_pts_wm, BITS)
+        pts_gm = scale_points(control_pts_gm, BITS)
+    wmx = [p[0] for p in pts_wm]
+    wmy = [p[1] for p in pts_wm]
+    gmx = [p[0] for p in pts_gm]
+    gmy = [p[1] for p in pts_gm]
     plt.scatter(wmx, wmy, s=45)
     plt.scatter(gmx, gmy, s=45)
 
     plt.title("Intensity Transform (Control-Point Based)")
     plt.xlabel("Input intensity (r)")
     plt.ylabel("Output intensity (s)")
-    plt.xlim(0, 255)
-    plt.ylim(0, 255)
+    plt.xlim(0, top)
+    plt.ylim(0, top)
     plt.grid(True)
     plt.legend()
     plt.show()
@@ -258,17 +390,17 @@ def main():
     plt.figure(figsize=(12, 5))
 
     plt.subplot(1, 3, 1)
-    plt.imshow(img, cmap="gray", vmin=0, vmax=255)
+    plt.imshow(img, cmap="gray", vmin=0, vmax=top)
     plt.title("Original")
     plt.axis("off")
 
     plt.subplot(1, 3, 2)
-    plt.imshow(out_img_wm, cmap="gray", vmin=0, vmax=255)
+    plt.imshow(out_img_wm, cmap="gray", vmin=0, vmax=top)
     plt.title("White Matter")
     plt.axis("off")
 
     plt.subplot(1, 3, 3)
-    plt.imshow(out_img_gm, cmap="gray", vmin=0, vmax=255)
+    plt.imshow(out_img_gm, cmap="gray", vmin=0, vmax=top)
     plt.title("Gray Matter")
     plt.axis("off")
 
@@ -1,6 +1,15 @@
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.histogram import Histogram
+from common.lut import apply_lut_to_channel
+from common.pointops import gamma_lut
+
 # ---------------------
 # Settings (beginner style)
 # ---------------------
@@ -15,6 +24,31 @@ def clamp_0_255(v):
         return 255
     return int(v)
 
+# ---------------------
+# Fast gamma on L* (importable)
+# ---------------------
+def gamma_on_lab_inplace(lab, gamma):
+    """
+    Apply the gamma rule to the L* channel of a Lab uint8 buffer, in place.
+    The 256-entry table is built once per gamma value (cached), so there is
+    no per-pixel pow and no split/merge copy.
+    """
+    apply_lut_to_channel(lab, gamma_lut(gamma), 0, out=lab)
+    return lab
+
+def gamma_correct_lab(bgr, gamma, out=None, lab=None):
+    """
+    Gamma-correct L* of a BGR image: BGR -> Lab, L* through the gamma table
+    in place, Lab -> BGR.
+    - lab: optional reusable (H, W, 3) uint8 work buffer
+    - out: optional reusable (H, W, 3) uint8 output buffer
+    Returns the corrected BGR image (out if it was given). Gives the same
+    pixels as the old split / per-pixel loop / merge version.
+    """
+    lab = cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB, dst=lab)
+    gamma_on_lab_inplace(lab, gamma)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=out)
+
 def main():
     print("Opening image:", INPUT_IMAGE)
     img_bgr = cv2.imread(INPUT_IMAGE)
@@ -29,40 +63,24 @@ def main():
     # Convert to Lab
     print("Converting to Lab color space...")
     lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
-    L, a, b = cv2.split(lab)
-
-    # Apply gamma to L* channel using simple loops
-    print("Applying gamma to L* (beginner pixel-by-pixel; may be slow)...")
-    h = L.shape[0]
-    w = L.shape[1]
-    L_after = L.copy()
-
-    # Gamma formula (on 0..1): out = in^gamma
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            # Read original L value (0..255)
-            L_val = int(L[y, x])
-            # Normalize to 0..1
-            L_norm = L_val / 255.0
-            # Apply gamma
-            L_gamma = L_norm ** GAMMA
-            # Scale back to 0..255 and clamp
-            L_new = clamp_0_255(L_gamma * 255.0)
-            # Write back
-            L_after[y, x] = L_new
-            x = x + 1
-        y = y + 1
-
-    # Merge channels and convert back to BGR then RGB for display
-    print("Merging channels and converting back to RGB...")
-    lab_out = cv2.merge([L_after, a, b])
-    bgr_out = cv2.cvtColor(lab_out, cv2.COLOR_LAB2BGR)
+
+    # Count the original L* once; gamma is a point operation, so the
+    # histogram after it follows from this one and the gamma table
+    print("Building histogram of L* channel...")
+    hist_before = Histogram.from_plane(lab[:, :, 0])
+    hist_after = hist_before.through(gamma_lut(GAMMA))
+
+    # Apply gamma to L* through a 256-entry table, in place (no split/merge)
+    print("Applying gamma to L*...")
+    gamma_on_lab_inplace(lab, GAMMA)
+
+    # Convert back to BGR (and RGB for display)
+    print("Converting back to BGR/RGB...")
+    bgr_out = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
     rgb_after = cv2.cvtColor(bgr_out, cv2.COLOR_BGR2RGB)
 
-    # Save output (convert back to BGR for OpenCV saving)
-    ok = cv2.imwrite(OUTPUT_IMAGE, cv2.cvtColor(rgb_after, cv2.COLOR_RGB2BGR))
+    # Save output (already BGR for OpenCV saving)
+    ok = cv2.imwrite(OUTPUT_IMAGE, bgr_out)
     if ok:
         print("Saved corrected image to:", OUTPUT_IMAGE)
     else:
@@ -86,32 +104,18 @@ def main():
     plt.tight_layout()
     plt.show()
 
-    # ---- Histograms for L channel (beginner style counts) ----
-    print("Building histograms for L* channel...")
-    hist_before = [0] * 256
-    hist_after = [0] * 256
-
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            v1 = int(L[y, x])
-            v2 = int(L_after[y, x])
-            if v1 < 0: v1 = 0
-            if v1 > 255: v1 = 255
-            if v2 < 0: v2 = 0
-            if v2 > 255: v2 = 255
-            hist_before[v1] = hist_before[v1] + 1
-            hist_after[v2] = hist_after[v2] + 1
-            x = x + 1
-        y = y + 1
+    # ---- Histograms for L channel (already computed above) ----
+    print("L* before: mean = %.1f, at 0: %.2f%%, at 255: %.2f%%"
+          % (hist_before.mean, 100 * hist_before.clip_low, 100 * hist_before.clip_high))
+    print("L* after:  mean = %.1f, at 0: %.2f%%, at 255: %.2f%%"
+          % (hist_after.mean, 100 * hist_after.clip_low, 100 * hist_after.clip_high))
 
     # Plot histograms
     print("Showing histograms...")
     plt.figure(figsize=(7, 6))
     # Beginners often just plot with default settings twice
-    plt.plot(range(256), hist_before, label="Original L*")
-    plt.plot(range(256), hist_after, label="Gamma-corrected L*")
+    plt.plot(range(256), hist_before.counts, label="Original L*")
+    plt.plot(range(256), hist_after.counts, label="Gamma-corrected L*")
     plt.title("Histograms of L* Channel")
     plt.xlabel("L* intensity (0–255)")
     plt.ylabel("Pixel count")
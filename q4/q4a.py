@@ -2,20 +2,28 @@
 # Run: python beginner_style_split_hsv.py
 # Make sure spider.png is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+
 # -----------------------
 # Settings (beginner style)
 # -----------------------
 INPUT_IMAGE = "spider.png"
+CACHE = False  # True = spider.png and its HSV image come from the disk cache
 H_OUT = "spider_H.png"
 S_OUT = "spider_S.png"
 V_OUT = "spider_V.png"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE, cv2.IMREAD_COLOR)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE, cv2.IMREAD_COLOR)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE, ". Check the path/name.")
         return
@@ -27,7 +35,7 @@ def main():
 
     # Convert to HSV (OpenCV uses H in [0..179], S and V in [0..255])
     print("Converting to HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
 
     # Split channels (beginner style: explicit indexing)
     print("Splitting channels...")
@@ -2,37 +2,30 @@
 # Run: python beginner_style_apply_to_s.py
 # Make sure spider.png is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
-import math
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+from common.vibrance import apply_vibrance, vibrance_lut
 
 # ----------------------
 # Settings (beginner style)
 # ----------------------
 INPUT_IMAGE = "spider.png"
+CACHE = False  # True = spider.png and its HSV image come from the disk cache
 OUTPUT_S = "spider_S_vibrance.png"
 
 ALPHA = 0.8   # strength of bump
 SIGMA = 70.0  # spread of bump
 
-def clamp_0_255(v):
-    if v < 0:
-        return 0
-    if v > 255:
-        return 255
-    return int(v)
-
-def vibrance_pixel(s_value, alpha, sigma):
-    # Apply bump around 128
-    diff = (s_value - 128.0)
-    exp_term = math.exp(-(diff * diff) / (2.0 * sigma * sigma))
-    bump = alpha * 128.0 * exp_term
-    new_val = s_value + bump
-    return clamp_0_255(new_val)
-
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not open", INPUT_IMAGE)
         return
@@ -40,25 +33,14 @@ def main():
 
     # Convert to HSV
     print("Converting to HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
     H = hsv[:, :, 0]
     S = hsv[:, :, 1]
     V = hsv[:, :, 2]
 
-    # Apply vibrance pixel-by-pixel to S
+    # Apply vibrance to the whole S channel through the cached 256-entry table
     print("Applying vibrance transform to S channel...")
-    h = S.shape[0]
-    w = S.shape[1]
-    S_vib = S.copy()
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            orig_val = int(S[y, x])
-            new_val = vibrance_pixel(orig_val, ALPHA, SIGMA)
-            S_vib[y, x] = new_val
-            x = x + 1
-        y = y + 1
+    S_vib = apply_vibrance(S, ALPHA, SIGMA)
 
     # Save the vibrance S channel image
     ok = cv2.imwrite(OUTPUT_S, S_vib)
@@ -67,15 +49,9 @@ def main():
     else:
         print("Warning: could not save output file.")
 
-    # ---- Build transform curve f(x) for 0..255 ----
-    print("Building transform curve f(x)...")
-    x_vals = []
-    fx_vals = []
-    i = 0
-    while i <= 255:
-        fx_vals.append(vibrance_pixel(i, ALPHA, SIGMA))
-        x_vals.append(i)
-        i = i + 1
+    # ---- Transform curve f(x) for 0..255 (the same cached table) ----
+    x_vals = range(256)
+    fx_vals = vibrance_lut(ALPHA, SIGMA)
 
     # ---- Show before/after and curve ----
     print("Showing images and curve...")
@@ -2,51 +2,35 @@
 # Run: python beginner_style_choose_alpha.py
 # Make sure spider.png is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
-import math
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+from common.vibrance import apply_vibrance, choose_setting, vibrance_sweep
 
 # ------------------------
 # Settings
 # ------------------------
 INPUT_IMAGE = "spider.png"
+CACHE = False  # True = spider.png and its HSV image come from the disk cache
 SIGMA = 70.0
 ALPHAS = [0.2, 0.4, 0.6, 0.8, 1.0]   # different strengths to test
 CHOSEN_ALPHA = 0.8   # after inspection, pick this
 
-def clamp_0_255(v):
-    if v < 0:
-        return 0
-    if v > 255:
-        return 255
-    return int(v)
-
-def vibrance_pixel(s_value, alpha, sigma):
-    # Gaussian bump centered at 128
-    diff = (s_value - 128.0)
-    exp_term = math.exp(-(diff * diff) / (2.0 * sigma * sigma))
-    bump = alpha * 128.0 * exp_term
-    new_val = s_value + bump
-    return clamp_0_255(new_val)
-
-def vibrance_S_channel(S, alpha, sigma):
-    # Apply vibrance to every pixel in S
-    h = S.shape[0]
-    w = S.shape[1]
-    out = S.copy()
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            val = int(S[y, x])
-            out[y, x] = vibrance_pixel(val, alpha, sigma)
-            x = x + 1
-        y = y + 1
-    return out
+# The sweep below is scored from one S histogram (no per-setting pixel work).
+# Only the alphas listed here are rendered at full resolution.
+SIGMAS = [SIGMA]
+RENDER_ALPHAS = ALPHAS
+MAX_CLIP = 0.01      # auto-pick: at most 1% of S may end up at 255
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
@@ -56,13 +40,28 @@ def main():
     rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
 
     # Convert to HSV
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
     H = hsv[:, :, 0]
     S = hsv[:, :, 1]
     V = hsv[:, :, 2]
 
+    # Score every alpha x sigma from the S histogram
+    print("Sweeping alpha/sigma on the S histogram...")
+    results = vibrance_sweep(S, ALPHAS, SIGMAS)
+    print(" alpha  sigma   mean S  median S  at 255   mean shift")
+    for r in results:
+        print("%6.2f %6.1f %8.1f %9d %6.2f%% %11.1f" % (
+            r["alpha"], r["sigma"], r["mean"], r["median"],
+            100 * r["clip_high"], r["mean_shift"]))
+    best = choose_setting(results, max_clip=MAX_CLIP)
+    if best is not None:
+        print("Suggested alpha (strongest with <= %.0f%% clipped): %s (sigma %s)"
+              % (100 * MAX_CLIP, best["alpha"], best["sigma"]))
+    else:
+        print("Every setting clips more than %.0f%% of S." % (100 * MAX_CLIP))
+
     # Prepare plot with 2 rows: RGB results and S channels
-    cols = len(ALPHAS) + 1
+    cols = len(RENDER_ALPHAS) + 1
     plt.figure(figsize=(3.5 * cols, 7))
 
     # Original RGB
@@ -77,11 +76,11 @@ def main():
     plt.title("S (orig)")
     plt.axis("off")
 
-    # For each alpha value, apply vibrance and display
+    # For each requested alpha value, apply vibrance and display
     index = 2
-    for a in ALPHAS:
+    for a in RENDER_ALPHAS:
         print("Applying vibrance with alpha =", a)
-        S_v = vibrance_S_channel(S, a, SIGMA)
+        S_v = apply_vibrance(S, a, SIGMA)
         hsv_new = cv2.merge([H, S_v, V])
         bgr_new = cv2.cvtColor(hsv_new, cv2.COLOR_HSV2BGR)
         rgb_new = cv2.cvtColor(bgr_new, cv2.COLOR_BGR2RGB)
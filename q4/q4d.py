@@ -2,71 +2,46 @@
 # Run: python beginner_style_recombine_with_alpha.py
 # Make sure spider.png is in the same folder.
 
+import os
+import sys
+
 import cv2
-import math
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+from common.vibrance import apply_vibrance
 
 # ---------------------
 # Settings
 # ---------------------
 INPUT_IMAGE = "spider.png"
+CACHE = False  # True = spider.png and its HSV image come from the disk cache
 OUTPUT_IMAGE = "spider_vibrance.png"
 
 ALPHA = 0.8   # chosen alpha from q4c
 SIGMA = 70.0  # sigma for bump
 
-# ---------------------
-# Helpers
-# ---------------------
-def clamp_0_255(v):
-    if v < 0:
-        return 0
-    if v > 255:
-        return 255
-    return int(v)
-
-def vibrance_pixel(s_value, alpha, sigma):
-    # bump function centered at 128
-    diff = (s_value - 128.0)
-    exp_term = math.exp(-(diff * diff) / (2.0 * sigma * sigma))
-    bump = alpha * 128.0 * exp_term
-    new_val = s_value + bump
-    return clamp_0_255(new_val)
-
-def vibrance_channel(S, alpha, sigma):
-    print("Applying vibrance to S channel (pixel-by-pixel)...")
-    h = S.shape[0]
-    w = S.shape[1]
-    out = S.copy()
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            val = int(S[y, x])
-            new_val = vibrance_pixel(val, alpha, sigma)
-            out[y, x] = new_val
-            x = x + 1
-        y = y + 1
-    return out
-
 # ---------------------
 # Main
 # ---------------------
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not open", INPUT_IMAGE)
         return
     print("Image loaded. Shape:", bgr.shape)
 
     print("Converting to HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
     H = hsv[:, :, 0]
     S = hsv[:, :, 1]
     V = hsv[:, :, 2]
 
-    # Apply vibrance to S channel
-    S_v = vibrance_channel(S, ALPHA, SIGMA)
+    # Apply vibrance to S channel (one LUT call, table cached per alpha/sigma)
+    print("Applying vibrance to S channel...")
+    S_v = apply_vibrance(S, ALPHA, SIGMA)
 
     # Recombine channels
     print("Recombining channels...")
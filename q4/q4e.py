@@ -2,62 +2,34 @@
 # Run: python beginner_style_display_all.py
 # Make sure spider.png is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
-import math
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+from common.vibrance import apply_vibrance, vibrance_lut
 
 # ----------------------
 # Settings (beginner style)
 # ----------------------
 INPUT_IMAGE = "spider.png"
+CACHE = False  # True = spider.png and its HSV image come from the disk cache
 ALPHA = 0.8   # strength of vibrance bump
 SIGMA = 70.0  # spread of bump
 
-def clamp_0_255(v):
-    if v < 0:
-        return 0
-    if v > 255:
-        return 255
-    return int(v)
-
-def vibrance_pixel(s_value, alpha, sigma):
-    # Gaussian-like bump centered at 128
-    diff = (s_value - 128.0)
-    exp_term = math.exp(-(diff * diff) / (2.0 * sigma * sigma))
-    bump = alpha * 128.0 * exp_term
-    new_val = s_value + bump
-    return clamp_0_255(new_val)
-
-def apply_vibrance_to_S(S, alpha, sigma):
-    print("Applying vibrance to S channel (pixel-by-pixel)...")
-    h = S.shape[0]
-    w = S.shape[1]
-    out = S.copy()
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            s_val = int(S[y, x])
-            out[y, x] = vibrance_pixel(s_val, alpha, sigma)
-            x = x + 1
-        y = y + 1
-    return out
-
 def build_transform_curve(alpha, sigma):
-    print("Building transform curve f(x) for x in 0..255...")
-    x_vals = []
-    fx_vals = []
-    i = 0
-    while i <= 255:
-        fx = vibrance_pixel(i, alpha, sigma)
-        x_vals.append(i)
-        fx_vals.append(fx)
-        i = i + 1
+    # f(x) for x in 0..255 is exactly the memoized vibrance table
+    x_vals = range(256)
+    fx_vals = vibrance_lut(alpha, sigma)
     return x_vals, fx_vals
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not open", INPUT_IMAGE)
         return
@@ -66,13 +38,14 @@ def main():
     # Convert for display and processing
     print("Converting BGR->RGB for display and BGR->HSV for channels...")
     rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
     H = hsv[:, :, 0]
     S = hsv[:, :, 1]
     V = hsv[:, :, 2]
 
     # Apply vibrance on S, then recombine and convert back to RGB
-    S_v = apply_vibrance_to_S(S, ALPHA, SIGMA)
+    print("Applying vibrance to S channel...")
+    S_v = apply_vibrance(S, ALPHA, SIGMA)
     print("Recombining H, S_v, V and converting HSV->BGR->RGB...")
     hsv_v = cv2.merge([H, S_v, V])
     bgr_v = cv2.cvtColor(hsv_v, cv2.COLOR_HSV2BGR)
@@ -0,0 +1,174 @@
+# beginner_style_equalize_catalog.py
+# Run: python q5_batch.py images_dir_or_manifest.txt out_dir [S|V]
+#
+# Dataset-wide version of q5f: every image is equalized with ONE LUT built
+# from the foreground histograms of the whole catalog, so brightness is
+# consistent from image to image.
+#   pass 1 (map-reduce): per-image Otsu foreground histogram of the plane,
+#          summed per chunk in a process pool, chunks checkpointed to disk
+#   global histogram -> CDF -> equalization LUT (same formula as q5e/q5f)
+#   pass 2: each image's foreground goes through the global LUT, background
+#          kept, then recombined with H/S/V like q5f
+# Interrupted runs resume: finished chunks are read back from CHECKPOINT_DIR
+# and images already written to out_dir with the same global LUT are
+# skipped. pass2.json in CHECKPOINT_DIR records the LUT and when pass 2
+# started writing with it; outputs older than that (an earlier LUT, e.g.
+# before images were added) are written again. Every output goes to a temp
+# name and is renamed, so a killed run never leaves a truncated image.
+
+import functools
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.batch import accumulate_histograms, atomic_write_text, list_images, map_images
+from common.equalize import equalization_lut, equalize_plane, foreground_hist
+from common.histogram import bincount_u8
+from common.otsu import otsu_threshold
+from common.planes import hsv_plane
+
+# ------------------------
+# Settings
+# ------------------------
+INPUT_DIR = "catalog"              # folder of images, or a manifest .txt
+OUTPUT_DIR = "catalog_equalized"
+PLANE = "V"                        # choose "S" or "V"
+CHECKPOINT_DIR = None              # default: <OUTPUT_DIR>/_histograms
+CHUNK_SIZE = 1000                  # images per checkpointed chunk
+WORKERS = None                     # processes (None = one per core)
+OVERWRITE = False                  # pass 2: redo images already written
+
+# ------------------------
+# Per-image steps (run inside the worker processes)
+# ------------------------
+def image_foreground_hist(path, plane_name):
+    # Otsu foreground histogram of one image (None if it cannot be read);
+    # only the plane is needed here, no full HSV conversion
+    bgr = cv2.imread(path)
+    if bgr is None:
+        return None
+    plane = hsv_plane(bgr, plane_name)
+    hist = bincount_u8(plane)
+    return foreground_hist(hist, otsu_threshold(hist))
+
+def is_current(out_path, since):
+    # written by pass 2 with the current LUT (see pass2.json)
+    try:
+        return os.path.getmtime(out_path) >= since
+    except OSError:
+        return False
+
+def write_image(out_path, img):
+    # temp file in the same folder (same extension, so cv2 picks the
+    # encoder), renamed over out_path once it is complete
+    folder = os.path.dirname(out_path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=os.path.splitext(out_path)[1])
+    os.close(fd)
+    ok = False
+    try:
+        ok = cv2.imwrite(tmp, img)
+        if ok:
+            os.replace(tmp, out_path)
+    finally:
+        if not ok:
+            os.unlink(tmp)
+    return ok
+
+def equalize_image(path, plane_name, lut, root, out_dir, overwrite, since):
+    out_path = os.path.join(out_dir, os.path.relpath(path, root))
+    if not overwrite and is_current(out_path, since):
+        return True
+    bgr = cv2.imread(path)
+    if bgr is None:
+        return False
+    # recombination needs H, so this pass does the full HSV conversion
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    channel = 1 if plane_name.upper() == "S" else 2
+    plane = np.ascontiguousarray(hsv[:, :, channel])
+    # foreground (this image's own Otsu mask) through the global LUT
+    threshold = otsu_threshold(bincount_u8(plane))
+    hsv[:, :, channel] = equalize_plane(plane, threshold, lut)
+    bgr_out = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    return write_image(out_path, bgr_out)
+
+def pass2_since(ckpt_dir, lut):
+    # time pass 2 started writing with this LUT; a new LUT starts over
+    marker = os.path.join(ckpt_dir, "pass2.json")
+    key = hashlib.sha1(np.ascontiguousarray(lut).tobytes()).hexdigest()
+    try:
+        with open(marker) as f:
+            old = json.load(f)
+        if old.get("lut") == key:
+            return old["since"]
+    except (OSError, ValueError, KeyError):
+        pass
+    since = time.time()
+    atomic_write_text(marker, json.dumps({"lut": key, "since": since}))
+    return since
+
+def print_progress(done, total):
+    print("  chunks done: %d / %d" % (done, total))
+
+def main():
+    src = sys.argv[1] if len(sys.argv) > 1 else INPUT_DIR
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else OUTPUT_DIR
+    plane_name = sys.argv[3] if len(sys.argv) > 3 else PLANE
+    ckpt_dir = CHECKPOINT_DIR or os.path.join(out_dir, "_histograms")
+
+    print("Listing images in", src, "...")
+    try:
+        root, paths = list_images(src)
+    except IOError as e:
+        print("Error:", e)
+        return
+    print("Images found:", len(paths))
+    if not paths:
+        return
+
+    # pass 1: map-reduce of the foreground histograms
+    print("Pass 1: foreground histograms of the", plane_name.upper(), "plane...")
+    t0 = time.perf_counter()
+    try:
+        stats = accumulate_histograms(
+            paths, functools.partial(image_foreground_hist, plane_name=plane_name),
+            checkpoint_dir=ckpt_dir, chunk_size=CHUNK_SIZE, workers=WORKERS,
+            tag="q5 foreground " + plane_name.upper(), progress=print_progress)
+    except ValueError as e:
+        print("Error:", e)
+        return
+    print("Pass 1 took %.1f s (%d of %d chunks resumed from %s)"
+          % (time.perf_counter() - t0, stats["resumed_chunks"], stats["chunks"], ckpt_dir))
+    print("Images counted:", stats["images"], "| unreadable:", len(stats["failed"]))
+    for path in stats["failed"][:10]:
+        print("  could not read:", path)
+
+    # global histogram -> CDF -> LUT
+    hist = stats["hist"]
+    print("Total foreground pixels:", int(hist.sum()))
+    lut = equalization_lut(hist)
+    np.save(os.path.join(ckpt_dir, "global_hist.npy"), hist)
+    np.save(os.path.join(ckpt_dir, "global_lut.npy"), lut)
+    print("Saved global histogram and LUT to", ckpt_dir)
+
+    # pass 2: apply the one LUT to every image's foreground
+    print("Pass 2: equalizing foregrounds with the global LUT ->", out_dir)
+    t0 = time.perf_counter()
+    since = pass2_since(ckpt_dir, lut)
+    fn = functools.partial(equalize_image, plane_name=plane_name, lut=lut,
+                           root=root, out_dir=out_dir, overwrite=OVERWRITE, since=since)
+    result = map_images(paths, fn, workers=WORKERS, progress=print_progress)
+    print("Pass 2 took %.1f s" % (time.perf_counter() - t0))
+    print("Images written:", result["done"], "| failed:", len(result["failed"]))
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
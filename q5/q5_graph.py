@@ -0,0 +1,116 @@
+# beginner_style_q5_stage_graph.py
+# Run: python q5_graph.py [image] [S|V]
+# Make sure jeniffer.jpg is in the same folder (or pass another image).
+#
+# The whole q5 workflow (a..f) as one lazy stage graph:
+#   bgr -> plane -> hist -> threshold -> mask -> boxes
+#                       -> fg_hist -> cdf / lut -> eq_plane -> result_bgr
+#   bgr -> hsv ----------------------------------------------> result_bgr
+# The plane is counted once; Otsu threshold, foreground histogram and LUT
+# are all derived from that histogram (see common/equalize.py).
+# Every stage runs at most once and only when something asks for it, so
+# the image is decoded and thresholded a single time. The plane is computed
+# straight from BGR; the full HSV conversion only runs for the recombination
+# (the one step that needs H). With CACHE on, bgr, hsv and plane come from
+# the on-disk image cache, so a repeated run decodes and converts nothing.
+
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.equalize import equalization_lut, equalize_plane, foreground_hist, threshold_mask
+from common.histogram import bincount_u8
+from common.imagecache import ImageCache
+from common.otsu import otsu_threshold
+from common.planes import hsv_plane
+from common.roi import mask_boxes
+from common.stagegraph import StageGraph
+
+# ------------------------
+# Settings
+# ------------------------
+INPUT_IMAGE = "jeniffer.jpg"
+PLANE = "V"   # choose "S" or "V"
+CACHE = False  # True = bgr / hsv / plane stages read from the on-disk cache (common/imagecache.py)
+OUT_IMAGE = "jeniffer_equalized_foreground.png"
+OUT_MASK = "jeniffer_mask.png"
+
+# ------------------------
+# Stage functions (same maths as q5a..q5f, rest in common/)
+# ------------------------
+def read_image(path, kind="bgr", cache=None):
+    if cache is not None:
+        img = cache.load(path, kind)
+    else:
+        img = cv2.imread(path)
+    if img is None:
+        raise IOError("could not read " + path)
+    return img
+
+def recombine(hsv, eq_plane, plane_name):
+    hsv_out = hsv.copy()
+    channel = 1 if plane_name.upper() == "S" else 2
+    hsv_out[:, :, channel] = eq_plane
+    return cv2.cvtColor(hsv_out, cv2.COLOR_HSV2BGR)
+
+def build_graph(path, plane_name="V", cache=None):
+    """
+    Lazy q5 graph for one image; ask for any stage with g["name"].
+    With an ImageCache, bgr, hsv and plane are loaded from it directly
+    (none of them needs the decoded image on a cache hit).
+    """
+    g = StageGraph()
+    g.add("bgr", lambda: read_image(path, "bgr", cache))
+    if cache is not None:
+        g.add("hsv", lambda: read_image(path, "hsv", cache))
+        g.add("plane", lambda: read_image(path, plane_name.upper(), cache))
+    else:
+        g.add("hsv", lambda bgr: cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV), ["bgr"])
+        g.add("plane", lambda bgr: hsv_plane(bgr, plane_name), ["bgr"])
+    g.add("hist", bincount_u8, ["plane"])
+    g.add("threshold", otsu_threshold, ["hist"])
+    g.add("mask", threshold_mask, ["plane", "threshold"])
+    g.add("fg_hist", foreground_hist, ["hist", "threshold"])
+    g.add("cdf", np.cumsum, ["fg_hist"])
+    g.add("lut", equalization_lut, ["fg_hist"])
+    g.add("boxes", mask_boxes, ["mask"])
+    g.add("eq_plane", equalize_plane, ["plane", "threshold", "lut", "boxes"])
+    g.add("result_bgr", lambda hsv, eq: recombine(hsv, eq, plane_name), ["hsv", "eq_plane"])
+    return g
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else INPUT_IMAGE
+    plane_name = sys.argv[2] if len(sys.argv) > 2 else PLANE
+    g = build_graph(path, plane_name, ImageCache() if CACHE else None)
+
+    print("Asking for the mask only...")
+    try:
+        mask = g["mask"]
+    except IOError as e:
+        print("Error:", e)
+        return
+    print("Otsu threshold:", g["threshold"], "| foreground pixels:", int((mask == 255).sum()))
+    print("Equalization computed yet?", g.is_evaluated("eq_plane"))
+
+    print("Asking for the recombined result...")
+    result = g["result_bgr"]
+
+    ok_img = cv2.imwrite(OUT_IMAGE, result)
+    ok_mask = cv2.imwrite(OUT_MASK, mask)
+    if ok_img: print("Saved:", OUT_IMAGE)
+    if ok_mask: print("Saved:", OUT_MASK)
+
+    print("Stage timings:")
+    total = 0.0
+    for name, ms in g.report():
+        print("  %-10s %8.2f ms" % (name, ms))
+        total = total + ms
+    print("  %-10s %8.2f ms" % ("total", total))
+    print("Done.")
+
+if __name__ == "__main__":
+    main()
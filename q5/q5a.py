@@ -2,20 +2,28 @@
 # Run: python beginner_style_split_hsv_jennifer.py
 # Make sure jeniffer.jpg is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.imagecache import cached_image
+
 # ---------------------
 # Settings
 # ---------------------
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and its HSV image come from the disk cache
 OUT_H = "jeniffer_H.png"
 OUT_S = "jeniffer_S.png"
 OUT_V = "jeniffer_V.png"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE, cv2.IMREAD_COLOR)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE, cv2.IMREAD_COLOR)
     if bgr is None:
         print("Error: Could not read", INPUT_IMAGE)
         return
@@ -27,7 +35,7 @@ def main():
 
     # Convert BGR -> HSV
     print("Converting BGR -> HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
 
     # Split channels
     print("Splitting HSV channels...")
@@ -2,52 +2,82 @@
 # Run: python beginner_style_make_mask.py
 # Make sure jeniffer.jpg is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.bitmask import save_mask
+from common.imagecache import cached_image
+from common.otsu import class_mask, multi_otsu
+from common.planes import hsv_plane
+
 # ------------------------
 # Settings
 # ------------------------
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and the PLANE channel come from the disk cache
 OUTPUT_MASK = "jeniffer_mask.png"
+OUTPUT_MASK_PACKED = "jeniffer_mask.pmask"
+MASK_OUTPUT = "png"   # "png", "packed" (1 bit/pixel .pmask) or "both"
 PLANE = "V"   # choose "S" or "V" (Saturation or Value)
+CLASSES = 2   # 2 = binary Otsu; 3 or 4 = multi-level (background/skin/hair/highlights)
+FG_CLASSES = None   # classes kept as foreground; None = all but the darkest
+OUTPUT_LABELS = "jeniffer_labels.png"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
     print("Image loaded. Shape:", bgr.shape)
 
-    # Convert to HSV
-    print("Converting BGR -> HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
-    H = hsv[:, :, 0]
-    S = hsv[:, :, 1]
-    V = hsv[:, :, 2]
-
-    # Choose plane
+    # Choose plane (computed straight from BGR: H is never needed here,
+    # so there is no full BGR -> HSV conversion)
     if PLANE.upper() == "S":
-        plane = S
+        plane = cached_image(INPUT_IMAGE, "S") if CACHE else hsv_plane(bgr, "S")
         print("Using S (Saturation) channel for mask.")
     else:
-        plane = V
+        plane = cached_image(INPUT_IMAGE, "V") if CACHE else hsv_plane(bgr, "V")
         print("Using V (Value) channel for mask.")
 
-    # Apply Otsu's threshold
-    print("Applying Otsu threshold...")
-    thresh_val, mask = cv2.threshold(
-        plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-    print("Otsu threshold value chosen automatically:", thresh_val)
+    if CLASSES <= 2:
+        # Apply Otsu's threshold
+        print("Applying Otsu threshold...")
+        thresh_val, mask = cv2.threshold(
+            plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        )
+        print("Otsu threshold value chosen automatically:", thresh_val)
+    else:
+        # Multi-level Otsu from the plane histogram -> label map -> mask
+        print("Applying multi-level Otsu with", CLASSES, "classes...")
+        thresholds, labels = multi_otsu(plane, CLASSES)
+        print("Otsu thresholds chosen automatically:", thresholds)
+        keep = FG_CLASSES
+        if keep is None:
+            keep = list(range(1, CLASSES))
+        print("Foreground classes:", keep)
+        mask = class_mask(labels, keep)
+
+        # Save labels spread over 0..255 so they are visible
+        ok = cv2.imwrite(OUTPUT_LABELS, labels * (255 // (CLASSES - 1)))
+        if ok:
+            print("Saved label map to:", OUTPUT_LABELS)
 
     # Save mask
-    ok = cv2.imwrite(OUTPUT_MASK, mask)
-    if ok:
-        print("Saved binary mask to:", OUTPUT_MASK)
-    else:
-        print("Warning: could not save mask image.")
+    if MASK_OUTPUT in ("png", "both"):
+        ok = cv2.imwrite(OUTPUT_MASK, mask)
+        if ok:
+            print("Saved binary mask to:", OUTPUT_MASK)
+        else:
+            print("Warning: could not save mask image.")
+    if MASK_OUTPUT in ("packed", "both"):
+        save_mask(OUTPUT_MASK_PACKED, mask)
+        print("Saved bit-packed mask to:", OUTPUT_MASK_PACKED)
 
     # Display plane and mask
     print("Showing original plane and mask...")
@@ -2,65 +2,81 @@
 # Run: python beginner_style_foreground_and_hist.py
 # Make sure jeniffer.jpg is in the same folder.
 
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.histogram import bincount_u8
+from common.imagecache import cached_image
+from common.otsu import otsu_threshold
+from common.planes import hsv_plane
+from common.roi import masked_bincount
+from common.runmask import RunMask
+
 # ------------------------
 # Settings
 # ------------------------
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and the PLANE channel come from the disk cache
 PLANE = "V"   # choose "S" or "V"
+ROI = "bbox"  # masked work limited to: "bbox", "components" or "full"
+MASK_FORMAT = "runs"  # "runs" = run-length mask (work ~ foreground), "dense" = 0/255 image
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
     print("Image loaded. Shape:", bgr.shape)
 
-    # Convert to HSV
-    print("Converting BGR -> HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
-    H = hsv[:, :, 0]
-    S = hsv[:, :, 1]
-    V = hsv[:, :, 2]
-
-    # Choose plane
+    # Choose plane (computed straight from BGR: H is never needed here,
+    # so there is no full BGR -> HSV conversion)
     if PLANE.upper() == "S":
-        plane = S
+        plane = cached_image(INPUT_IMAGE, "S") if CACHE else hsv_plane(bgr, "S")
         print("Using S (Saturation) channel.")
     else:
-        plane = V
+        plane = cached_image(INPUT_IMAGE, "V") if CACHE else hsv_plane(bgr, "V")
         print("Using V (Value) channel.")
 
-    # Apply Otsu threshold to build mask
-    print("Applying Otsu threshold...")
-    thresh_val, mask = cv2.threshold(
-        plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-    print("Otsu threshold value =", thresh_val)
-
-    # Extract foreground (bitwise AND with mask)
-    print("Extracting foreground region...")
-    foreground = cv2.bitwise_and(plane, mask)
-
-    # Build histogram of foreground manually
-    print("Building histogram of foreground pixels...")
-    hist = [0] * 256
-    h = foreground.shape[0]
-    w = foreground.shape[1]
-    y = 0
-    while y < h:
-        x = 0
-        while x < w:
-            if mask[y, x] == 255:
-                val = int(foreground[y, x])
-                if val < 0: val = 0
-                if val > 255: val = 255
-                hist[val] = hist[val] + 1
-            x = x + 1
-        y = y + 1
+    if MASK_FORMAT == "runs":
+        # Otsu value only (same as cv2's), then the mask straight as per-row
+        # runs: no dense mask, the steps below only visit foreground
+        print("Computing Otsu threshold...")
+        thresh_val = otsu_threshold(bincount_u8(plane))
+        print("Otsu threshold value =", thresh_val)
+
+        print("Encoding mask as runs...")
+        runs = RunMask.from_threshold(plane, thresh_val)
+        print("Mask:", runs.runs, "runs,", runs.area, "foreground pixels")
+
+        print("Extracting foreground region...")
+        foreground = runs.extract(plane)
+
+        print("Building histogram of foreground pixels...")
+        hist = runs.histogram(plane)
+    else:
+        # Apply Otsu threshold to build mask
+        print("Applying Otsu threshold...")
+        thresh_val, mask = cv2.threshold(
+            plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+        )
+        print("Otsu threshold value =", thresh_val)
+
+        # Extract foreground (bitwise AND with mask)
+        print("Extracting foreground region...")
+        foreground = cv2.bitwise_and(plane, mask)
+
+        # Histogram of foreground pixels (exact per level, counted under the
+        # mask without copying the foreground values out, and only inside the
+        # mask's bounding box)
+        print("Building histogram of foreground pixels...")
+        hist = masked_bincount(plane, mask, ROI)
+    print("Foreground pixel count:", int(hist.sum()))
 
     # ---- Show results ----
     print("Showing results...")
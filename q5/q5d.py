@@ -1,48 +1,52 @@
+import os
+import sys
+
 import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.histogram import bincount_u8
+from common.imagecache import cached_image
+from common.otsu import otsu_threshold
+from common.planes import hsv_plane
+
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and the PLANE channel come from the disk cache
 PLANE = "V"   # choose "S" or "V"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
     print("Image loaded. Shape:", bgr.shape)
 
-    # Convert to HSV
-    print("Converting BGR -> HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
-    H = hsv[:, :, 0]
-    S = hsv[:, :, 1]
-    V = hsv[:, :, 2]
-
-    # Select plane
+    # Choose plane (computed straight from BGR: H is never needed here,
+    # so there is no full BGR -> HSV conversion)
     if PLANE.upper() == "S":
-        plane = S
+        plane = cached_image(INPUT_IMAGE, "S") if CACHE else hsv_plane(bgr, "S")
         print("Using Saturation (S) channel.")
     else:
-        plane = V
+        plane = cached_image(INPUT_IMAGE, "V") if CACHE else hsv_plane(bgr, "V")
         print("Using Value (V) channel.")
 
-    # Create mask using Otsu threshold
-    print("Applying Otsu threshold to build mask...")
-    thresh_val, mask = cv2.threshold(
-        plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-    print("Otsu threshold value chosen:", thresh_val)
+    # One histogram of the whole plane gives everything below
+    print("Building histogram of the plane (256 bins)...")
+    plane_hist = bincount_u8(plane)
 
-    # Collect values of pixels inside foreground
-    print("Collecting foreground values...")
-    vals = plane[mask == 255]   # take only the plane values where mask=255
-    print("Total foreground pixels collected:", len(vals))
+    # Otsu threshold from that histogram (same value cv2.threshold picks)
+    print("Finding Otsu threshold from the histogram...")
+    thresh_val = otsu_threshold(plane_hist)
+    print("Otsu threshold value chosen:", thresh_val)
 
-    # Build histogram using numpy
-    print("Building histogram (256 bins)...")
-    hist, _ = np.histogram(vals, bins=256, range=(0, 255))
+    # Foreground = pixels above the threshold, so its histogram is the tail
+    print("Taking foreground histogram (bins above the threshold)...")
+    hist = plane_hist.copy()
+    hist[:thresh_val + 1] = 0
+    print("Total foreground pixels collected:", int(hist.sum()))
 
     # Compute cumulative sum with numpy
     print("Computing cumulative sum using np.cumsum...")
@@ -2,72 +2,61 @@
 # Run: python beginner_style_equalize_foreground_only.py
 # Make sure jeniffer.jpg is in the same folder.
 
+import os
+import sys
+
 import cv2
-import numpy as np
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.equalize import adaptive_equalize, foreground_equalize
+from common.imagecache import cached_image
+from common.planes import hsv_plane
+
 # ------------------------
 # Settings
 # ------------------------
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and the PLANE channel come from the disk cache
 PLANE = "V"   # choose "S" or "V"
+MODE = "global"   # "global" = one LUT for the foreground, "adaptive" = tiled (CLAHE-style)
+TILES = (8, 8)    # adaptive mode: tile grid (rows, cols)
+CLIP_LIMIT = 2.0  # adaptive mode: histogram clip factor (0 = no clipping)
+ROI = "bbox"      # masked work limited to: "bbox", "components" or "full"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
     print("Image loaded. Shape:", bgr.shape)
 
-    # Convert to HSV
-    print("Converting to HSV...")
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
-    H = hsv[:, :, 0]
-    S = hsv[:, :, 1]
-    V = hsv[:, :, 2]
-
-    # Choose channel
+    # Choose plane (computed straight from BGR: H is never needed here,
+    # so there is no full BGR -> HSV conversion)
     if PLANE.upper() == "S":
-        plane = S
+        plane = cached_image(INPUT_IMAGE, "S") if CACHE else hsv_plane(bgr, "S")
         print("Using Saturation (S) channel.")
     else:
-        plane = V
+        plane = cached_image(INPUT_IMAGE, "V") if CACHE else hsv_plane(bgr, "V")
         print("Using Value (V) channel.")
 
-    # Build mask using Otsu
-    print("Building foreground mask with Otsu threshold...")
-    _, mask = cv2.threshold(
-        plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-
-    # Extract foreground pixel values
-    print("Collecting foreground pixel values...")
-    vals = plane[mask == 255]
-    print("Foreground pixel count:", vals.size)
-
-    # Histogram + CDF
-    print("Building histogram and cumulative sum...")
-    hist, _ = np.histogram(vals, bins=256, range=(0, 255))
-    cdf = np.cumsum(hist)  # 👈 np.cumsum used here
-    # find first nonzero value
-    cdf_nonzero = cdf[np.nonzero(cdf)]
-    if cdf_nonzero.size > 0:
-        cdf_min = cdf_nonzero.min()
-    else:
-        cdf_min = 0
-    N = vals.size
-
-    # Build LUT for equalization
-    print("Building equalization LUT...")
-    # formula: (cdf - cdf_min) / (N - cdf_min) * 255
-    lut = np.floor((cdf - cdf_min) / max(N - cdf_min, 1) * 255.0)
-    lut = np.clip(lut, 0, 255).astype(np.uint8)
-
-    # Apply LUT only on foreground
-    print("Applying LUT to foreground pixels...")
-    eq_plane = plane.copy()
-    eq_plane[mask == 255] = lut[plane[mask == 255]]
+    # Otsu mask, foreground histogram, CDF and equalization LUT all come
+    # from one histogram of the plane; the LUT is then applied in one pass
+    # (foreground values through the LUT, background values unchanged)
+    print("Equalizing foreground (Otsu mask from the plane histogram)...")
+    result = foreground_equalize(plane, want_mask=(MODE == "adaptive"), roi=ROI)
+    print("Otsu threshold:", result["threshold"])
+    print("Foreground pixel count:", int(result["fg_hist"].sum()))
+    lut = result["lut"]
+    eq_plane = result["eq_plane"]
+
+    if MODE == "adaptive":
+        # per-tile LUTs blended bilinearly (LUT plot below is the global one)
+        print("Adaptive equalization with", TILES, "tiles, clip limit", CLIP_LIMIT, "...")
+        eq_plane = adaptive_equalize(plane, result["mask"], TILES, CLIP_LIMIT,
+                                     global_lut=lut, roi=ROI)
 
     # ---- Show results ----
     print("Showing results...")
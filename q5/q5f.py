@@ -2,21 +2,36 @@
 # Run: python beginner_style_combine_background_with_equalized_foreground.py
 # Make sure jeniffer.jpg is in the same folder.
 
+import os
+import sys
+
 import cv2
-import numpy as np
 import matplotlib.pyplot as plt
 
+# shared helpers live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.bitmask import save_mask
+from common.equalize import adaptive_equalize, foreground_equalize
+from common.imagecache import cached_image
+
 # ------------------------
 # Settings
 # ------------------------
 INPUT_IMAGE = "jeniffer.jpg"
+CACHE = False  # True = jeniffer.jpg and its HSV image come from the disk cache
 PLANE = "V"   # choose "S" or "V"
+MODE = "global"   # "global" = one LUT for the foreground, "adaptive" = tiled (CLAHE-style)
+TILES = (8, 8)    # adaptive mode: tile grid (rows, cols)
+CLIP_LIMIT = 2.0  # adaptive mode: histogram clip factor (0 = no clipping)
+ROI = "bbox"      # masked work limited to: "bbox", "components" or "full"
 OUT_IMAGE = "jeniffer_equalized_foreground.png"
 OUT_MASK = "jeniffer_mask.png"
+OUT_MASK_PACKED = "jeniffer_mask.pmask"
+MASK_OUTPUT = "png"   # "png", "packed" (1 bit/pixel .pmask) or "both"
 
 def main():
     print("Opening image:", INPUT_IMAGE)
-    bgr = cv2.imread(INPUT_IMAGE)
+    bgr = cached_image(INPUT_IMAGE) if CACHE else cv2.imread(INPUT_IMAGE)
     if bgr is None:
         print("Error: could not read", INPUT_IMAGE)
         return
@@ -24,7 +39,7 @@ def main():
 
     print("Converting BGR->RGB (for display) and BGR->HSV (for channels)...")
     rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    hsv = cached_image(INPUT_IMAGE, "hsv") if CACHE else cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
     H = hsv[:, :, 0]
     S = hsv[:, :, 1]
     V = hsv[:, :, 2]
@@ -37,39 +52,21 @@ def main():
         plane = V
         print("Using V (Value) channel.")
 
-    # 1) Mask (foreground via Otsu)
-    print("Building foreground mask with Otsu threshold...")
-    _, mask = cv2.threshold(
-        plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-    )
-    print("Mask built. Foreground pixel count:", int((mask == 255).sum()))
-
-    # 2) Equalize foreground only (manual LUT like in part (e))
-    print("Collecting foreground pixel values...")
-    vals = plane[mask == 255]
-    print("Foreground values collected:", vals.size)
-
-    print("Building histogram and CDF (np.cumsum)...")
-    hist, _ = np.histogram(vals, bins=256, range=(0, 255))
-    cdf = np.cumsum(hist)  # <-- using np.cumsum here
-
-    # Handle case where all-zeros could happen
-    cdf_nonzero = cdf[np.nonzero(cdf)]
-    if cdf_nonzero.size > 0:
-        cdf_min = cdf_nonzero.min()
-    else:
-        cdf_min = 0
-    N = vals.size if vals.size > 0 else 1  # avoid divide-by-zero
-
-    print("Building equalization LUT...")
-    # LUT formula: (cdf - cdf_min) / (N - cdf_min) * 255
-    denom = max(N - cdf_min, 1)
-    lut = np.floor((cdf - cdf_min) / denom * 255.0)
-    lut = np.clip(lut, 0, 255).astype(np.uint8)
-
-    print("Applying LUT only on foreground pixels...")
-    eq_plane = plane.copy()
-    eq_plane[mask == 255] = lut[plane[mask == 255]]
+    # 1) + 2) Mask (foreground via Otsu) and foreground-only equalization.
+    # One histogram of the plane gives the Otsu threshold, the foreground
+    # histogram (its tail), the CDF and the LUT; the LUT is then applied in
+    # a single pass (identity for background values).
+    print("Building foreground mask and equalizing foreground...")
+    result = foreground_equalize(plane, roi=ROI)
+    mask = result["mask"]
+    eq_plane = result["eq_plane"]
+    print("Otsu threshold:", result["threshold"])
+    print("Mask built. Foreground pixel count:", int(result["fg_hist"].sum()))
+
+    if MODE == "adaptive":
+        print("Adaptive equalization with", TILES, "tiles, clip limit", CLIP_LIMIT, "...")
+        eq_plane = adaptive_equalize(plane, mask, TILES, CLIP_LIMIT,
+                                     global_lut=result["lut"], roi=ROI)
 
     # 3) Recombine with background: replace only chosen plane
     print("Recombining channels and converting back to RGB...")
@@ -88,11 +85,15 @@ def main():
 
     print("Saving outputs...")
     ok_img = cv2.imwrite(OUT_IMAGE, bgr_out)
-    ok_mask = cv2.imwrite(OUT_MASK, mask)
     if ok_img: print("Saved:", OUT_IMAGE)
     else:      print("Warning: could not save", OUT_IMAGE)
-    if ok_mask: print("Saved:", OUT_MASK)
-    else:       print("Warning: could not save", OUT_MASK)
+    if MASK_OUTPUT in ("png", "both"):
+        ok_mask = cv2.imwrite(OUT_MASK, mask)
+        if ok_mask: print("Saved:", OUT_MASK)
+        else:       print("Warning: could not save", OUT_MASK)
+    if MASK_OUTPUT in ("packed", "both"):
+        save_mask(OUT_MASK_PACKED, mask)
+        print("Saved:", OUT_MASK_PACKED)
 
     # Display: H, S, V plane, mask, original, result
     print("Showing H, S, V planes, mask, original, and result...")
@@ -0,0 +1,42 @@
+# Shared setup for the tests: the repo root and the q1/q2 script folders
+# on sys.path (the scripts are imported as modules), and a non-interactive
+# matplotlib backend so importing them never opens a window.
+# Run from the repo root: python -m pytest -q
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for path in (ROOT, os.path.join(ROOT, "q1"), os.path.join(ROOT, "q2")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def planes(rng):
+    """uint8 test planes: noise, a smooth bimodal image, a constant plane."""
+    noise = rng.integers(0, 256, size=(120, 170), dtype=np.uint8)
+    yy, xx = np.mgrid[0:120, 0:170]
+    blob = ((xx - 80) ** 2 + (yy - 60) ** 2) < 40 ** 2
+    bimodal = np.where(blob, 190, 60) + rng.integers(-25, 26, size=blob.shape)
+    return {
+        "noise": noise,
+        "bimodal": np.clip(bimodal, 0, 255).astype(np.uint8),
+        "constant": np.full((40, 50), 77, dtype=np.uint8),
+    }
+
+
+@pytest.fixture
+def luts(rng):
+    """Two random 8-bit tables (the WM/GM pair)."""
+    return [rng.integers(0, 256, size=256) for _ in range(2)]
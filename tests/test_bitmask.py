@@ -0,0 +1,18 @@
+# Bit-packed masks against the dense masks they were made from.
+
+import os
+
+import numpy as np
+
+from common.bitmask import PackedMask, load_mask, save_mask
+
+
+def test_packed_mask_round_trip(tmp_path, rng):
+    mask = (rng.random((37, 53)) < 0.4).astype(np.uint8) * 255
+    for compress in (True, False):
+        path = str(tmp_path / "m.pmask")
+        save_mask(path, mask, compress)
+        assert np.array_equal(load_mask(path), mask)
+        assert np.array_equal(load_mask(path, as_bool=True), mask == 255)
+    assert sorted(os.listdir(tmp_path)) == ["m.pmask"]
+    assert np.array_equal(PackedMask.from_mask(mask).to_uint8(), mask)
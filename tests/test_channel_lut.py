@@ -0,0 +1,13 @@
+# apply_lut_to_channel() (the q3 L* path) against indexing one channel.
+
+import numpy as np
+
+from common.lut import apply_lut_to_channel
+
+
+def test_apply_lut_to_channel(rng):
+    img = rng.integers(0, 256, size=(30, 40, 3), dtype=np.uint8)
+    lut = rng.integers(0, 256, size=256)
+    out = apply_lut_to_channel(img, lut, 1)
+    assert np.array_equal(out[:, :, 1], lut[img[:, :, 1]])
+    assert np.array_equal(out[:, :, [0, 2]], img[:, :, [0, 2]])
@@ -0,0 +1,79 @@
+# compile_curve() against the scripts' own per-value builders.
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+import q1
+import q2
+from common.curves import (compile_curve, jump_spec, normalize_spec, points_spec,
+                           scale_points, spec_key)
+
+
+def beginner_lut(control_pts, bits=8):
+    with contextlib.redirect_stdout(io.StringIO()):
+        lut = q2.build_lut_from_points_beginner(control_pts, bits)[0]
+    return np.array(lut)
+
+
+def random_points(rng, top, n=8):
+    xs = rng.integers(-20, top + 20, size=n)
+    ys = rng.integers(-20, top + 20, size=n)
+    pts = [[int(x), int(y)] for x, y in zip(xs, ys)]
+    pts.insert(n // 2, [pts[n // 2 - 1][0], int(rng.integers(0, top + 1))])  # a vertical jump
+    return pts
+
+
+@pytest.mark.parametrize("name", ["control_pts_wm", "control_pts_gm"])
+def test_q2_curves_match_beginner_builder(name):
+    pts = getattr(q2, name)
+    lut = compile_curve(points_spec(pts), cache_dir=None)
+    assert lut.dtype == np.uint8
+    assert np.array_equal(lut, beginner_lut(pts))
+
+
+@pytest.mark.parametrize("bits", [8, 10, 12, 16])
+def test_random_points_match_beginner_builder(rng, bits):
+    top = (1 << bits) - 1
+    for _ in range(5):
+        pts = random_points(rng, top)
+        lut = compile_curve(points_spec(pts, bits), cache_dir=None)
+        assert lut.shape == (top + 1,)
+        assert np.array_equal(lut, beginner_lut(pts, bits))
+
+
+@pytest.mark.parametrize("bits", [12, 16])
+def test_scaled_q2_curves_match_beginner_builder(bits):
+    pts = scale_points(q2.control_pts_wm, bits)
+    lut = compile_curve(points_spec(pts, bits), cache_dir=None)
+    assert lut.dtype == np.uint16
+    assert np.array_equal(lut, beginner_lut(pts, bits))
+
+
+def test_jump_spec_matches_q1_rule():
+    lut = compile_curve(jump_spec(x0=50, y0=100, x1=150, y1=255), cache_dir=None)
+    assert lut.tolist() == [q1.convert_intensity(v) for v in range(256)]
+
+
+def test_eight_bit_keys_unchanged():
+    pts = q2.control_pts_wm
+    assert points_spec(pts, 8) == points_spec(pts)
+    assert "bits" not in normalize_spec(points_spec(pts))
+    assert spec_key(points_spec(pts)) != spec_key(points_spec(pts, 12))
+
+
+def test_non_finite_points_coerce_like_make_int():
+    pts = [[0, 0], [float("inf"), 200], [float("nan"), 30], [255, 255]]
+    coerced = [[q2.make_int(x), q2.make_int(y)] for x, y in pts]
+    assert np.array_equal(compile_curve(points_spec(pts), cache_dir=None),
+                          beginner_lut(coerced))
+
+
+def test_disk_cache_round_trip(tmp_path):
+    spec = points_spec(q2.control_pts_gm)
+    first = compile_curve(spec, cache_dir=str(tmp_path))
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert [p.suffix for p in files] == [".npy"]
+    assert np.array_equal(np.load(files[0]), first)
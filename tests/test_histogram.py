@@ -0,0 +1,17 @@
+# bincount_u8() / count_levels() (masked, blocked, wide) against
+# np.bincount.
+
+import numpy as np
+
+from common.histogram import bincount_u8, count_levels
+
+
+def test_masked_counts(rng, planes):
+    plane = planes["bimodal"]
+    mask = (rng.random(plane.shape) < 0.3).astype(np.uint8) * 255
+    want = np.bincount(plane[mask != 0], minlength=256)
+    assert np.array_equal(bincount_u8(plane, mask), want)
+    assert np.array_equal(count_levels(plane, mask, workers=3, block_rows=7), want)
+    wide = rng.integers(0, 4096, size=(50, 60), dtype=np.uint16)
+    assert np.array_equal(count_levels(wide, levels=4096),
+                          np.bincount(wide.ravel(), minlength=4096))
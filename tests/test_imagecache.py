@@ -0,0 +1,39 @@
+# The image cache against decoding and converting directly.
+
+import os
+
+import cv2
+import numpy as np
+
+from common.imagecache import ImageCache
+
+
+def test_image_cache_matches_direct(tmp_path, rng):
+    bgr = rng.integers(0, 256, size=(40, 60, 3), dtype=np.uint8)
+    path = str(tmp_path / "img.png")
+    cv2.imwrite(path, bgr)
+    cache = ImageCache(str(tmp_path / "cache"))
+    hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+    assert np.array_equal(cache.load(path), bgr)
+    assert np.array_equal(cache.load(path, "hsv"), hsv)
+    assert np.array_equal(cache.load(path, "S"), hsv[:, :, 1])
+    assert np.array_equal(cache.load(path, "L"), cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB)[:, :, 0])
+    # second cache on the same folder: everything comes from disk
+    again = ImageCache(str(tmp_path / "cache"))
+    assert np.array_equal(again.load(path, "hsv"), hsv)
+    assert again.misses == 0
+    assert cache.load(str(tmp_path / "missing.png")) is None
+
+
+def test_image_cache_limit(tmp_path, rng):
+    paths = []
+    for i in range(6):
+        path = str(tmp_path / ("img%d.png" % i))
+        cv2.imwrite(path, rng.integers(0, 256, size=(50, 50, 3), dtype=np.uint8))
+        paths.append(path)
+    cache = ImageCache(str(tmp_path / "cache"), max_bytes=40000)
+    for path in paths:
+        assert cache.load(path) is not None
+    assert cache.nbytes() <= 40000
+    names = [n for _, _, files in os.walk(tmp_path / "cache") for n in files]
+    assert not [n for n in names if n.endswith(".tmp")]
@@ -0,0 +1,26 @@
+# LUT application against plain numpy indexing.
+
+import numpy as np
+import pytest
+
+from common.lut import apply_lut
+
+
+def test_apply_lut(rng, planes):
+    lut = rng.integers(0, 256, size=256)
+    for plane in planes.values():
+        assert np.array_equal(apply_lut(plane, lut), lut[plane])
+        out = np.empty_like(plane)
+        assert apply_lut(plane, lut, out=out) is out
+        assert np.array_equal(out, lut[plane])
+
+
+@pytest.mark.parametrize("bad", ["float32", "strided", "shape"])
+def test_apply_lut_rejects_unusable_out(planes, bad):
+    plane = planes["noise"]
+    h, w = plane.shape
+    out = {"float32": np.zeros((h, w), dtype=np.float32),
+           "strided": np.zeros((h, 2 * w), dtype=np.uint8)[:, ::2],
+           "shape": np.zeros((w, h), dtype=np.uint8)}[bad]
+    with pytest.raises(ValueError):
+        apply_lut(plane, np.arange(256), out=out)
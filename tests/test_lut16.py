@@ -0,0 +1,44 @@
+# Wide (12-bit / 16-bit) LUTs on uint16 images against numpy indexing.
+
+import numpy as np
+import pytest
+
+from common.lut import apply_lut, apply_luts, apply_wide_lut, load_gray16, stack_wide_luts
+
+
+@pytest.mark.parametrize("bits", [12, 16])
+def test_wide_lut(rng, bits):
+    img = rng.integers(0, 1 << bits, size=(90, 130), dtype=np.uint16)
+    table = rng.integers(0, 65536, size=1 << bits).astype(np.uint16)
+    assert np.array_equal(apply_wide_lut(img, table), table[img])
+    assert np.array_equal(apply_lut(img, table), table[img])
+    view = img[::2, 3:]  # strided input
+    assert np.array_equal(apply_wide_lut(view, table), table[view])
+    pair = apply_luts(img, [table, table[::-1]], stacked=True)
+    assert np.array_equal(pair[1], table[::-1][img])
+
+
+def test_wide_lut_clamps_past_the_table():
+    img = np.array([[0, 4095, 4096, 65535]], dtype=np.uint16)
+    table = np.arange(4096, dtype=np.uint16)
+    assert apply_wide_lut(img, table).tolist() == [[0, 4095, 4095, 4095]]
+
+
+def test_wide_luts_2d_table_columns_are_curves(rng):
+    img = rng.integers(0, 65536, size=(40, 50), dtype=np.uint16)
+    a, b = (rng.integers(0, 65536, size=65536).astype(np.uint16) for _ in range(2))
+    planes = apply_luts(img, np.stack([a, b], axis=1))
+    assert len(planes) == 2
+    assert np.array_equal(planes[0], a[img]) and np.array_equal(planes[1], b[img])
+    short = np.stack([a[:4096], b[:4096]], axis=1)  # (4096, 2): still two curves
+    assert np.array_equal(apply_luts(img, short)[1], b[:4096][np.minimum(img, 4095)])
+    with pytest.raises(ValueError):
+        stack_wide_luts(a)
+
+
+def test_load_gray16_keeps_png_depth(tmp_path, rng):
+    from PIL import Image
+    img = rng.integers(0, 65536, size=(20, 30), dtype=np.uint16)
+    path = tmp_path / "slice.png"
+    Image.fromarray(img).save(path)
+    assert np.array_equal(load_gray16(str(path)), img)
@@ -0,0 +1,27 @@
+# apply_luts() / stack_luts() (N tables in one pass) against one
+# indexing per table.
+
+import numpy as np
+import pytest
+
+from common.lut import apply_luts, as_lut_array, stack_luts
+
+
+def test_apply_luts_single_pass(rng, planes):
+    luts = [rng.integers(0, 256, size=256) for _ in range(3)]
+    plane = planes["noise"]
+    stacked = apply_luts(plane, luts, stacked=True)
+    assert stacked.shape == (3,) + plane.shape
+    for got, lut in zip(apply_luts(plane, luts), luts):
+        assert np.array_equal(got, lut[plane])
+    assert np.array_equal(stacked, np.stack([lut[plane] for lut in luts]))
+
+
+@pytest.mark.parametrize("bad", [300, -1])
+def test_tables_out_of_range_rejected(bad):
+    lut = np.arange(256)
+    lut[7] = bad
+    with pytest.raises(ValueError):
+        as_lut_array(lut)
+    with pytest.raises(ValueError):
+        stack_luts(np.stack([np.arange(256), lut], axis=1))
@@ -0,0 +1,45 @@
+# Histogram-derived Otsu and foreground equalization against the original
+# cv2 / numpy steps of q5.
+
+import cv2
+import numpy as np
+
+from common.equalize import foreground_equalize
+from common.histogram import bincount_u8
+from common.otsu import otsu_threshold
+
+
+def q5f_reference(plane):
+    # the baseline q5f steps
+    _, mask = cv2.threshold(plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    vals = plane[mask == 255]
+    hist, _ = np.histogram(vals, bins=256, range=(0, 255))
+    cdf = np.cumsum(hist)
+    cdf_nonzero = cdf[np.nonzero(cdf)]
+    cdf_min = cdf_nonzero.min() if cdf_nonzero.size > 0 else 0
+    N = vals.size if vals.size > 0 else 1
+    denom = max(N - cdf_min, 1)
+    lut = np.clip(np.floor((cdf - cdf_min) / denom * 255.0), 0, 255).astype(np.uint8)
+    eq_plane = plane.copy()
+    eq_plane[mask == 255] = lut[plane[mask == 255]]
+    return mask, eq_plane
+
+
+def test_otsu_matches_cv2(rng, planes):
+    cases = dict(planes)
+    for k in range(5):
+        img = rng.integers(0, 256, size=(64, 64), dtype=np.uint8)
+        cases["blur%d" % k] = cv2.GaussianBlur(img, (9, 9), 1 + k)
+    for name, plane in cases.items():
+        want = cv2.threshold(plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[0]
+        assert otsu_threshold(bincount_u8(plane)) == want, name
+
+
+def test_foreground_equalize_matches_q5f(planes):
+    for name, plane in planes.items():
+        mask, eq_plane = q5f_reference(plane)
+        for want_mask in (True, False):
+            got = foreground_equalize(plane, want_mask=want_mask)
+            assert np.array_equal(got["eq_plane"], eq_plane), name
+            if want_mask:
+                assert np.array_equal(got["mask"], mask), name
@@ -0,0 +1,30 @@
+# RunMask (run-length masks) against dense masks and plain indexing.
+
+import cv2
+import numpy as np
+import pytest
+
+from common.runmask import RunMask
+
+
+@pytest.mark.parametrize("fill", [0.0, 0.3, 0.95, 1.0])
+def test_runmask_matches_dense(rng, planes, fill):
+    plane = planes["noise"]
+    mask = (rng.random(plane.shape) < fill).astype(np.uint8) * 255
+    runs = RunMask.from_dense(mask)
+    fg = mask == 255
+    assert np.array_equal(runs.to_dense(), mask)
+    assert runs.area == int(fg.sum())
+    assert np.array_equal(runs.values(plane), plane[fg])
+    assert np.array_equal(runs.histogram(plane), np.bincount(plane[fg], minlength=256))
+    assert np.array_equal(runs.extract(plane), cv2.bitwise_and(plane, mask))
+    lut = rng.integers(0, 256, size=256)
+    want = plane.copy()
+    want[fg] = lut[plane[fg]]
+    assert np.array_equal(runs.apply_lut(plane, lut), want)
+
+
+def test_runmask_from_threshold(planes):
+    plane = planes["bimodal"]
+    t, mask = cv2.threshold(plane, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    assert np.array_equal(RunMask.from_threshold(plane, t).to_dense(), mask)
@@ -0,0 +1,40 @@
+# Streamed (row strip) LUTs against the in-memory path.
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from common.lut import apply_luts
+from common.tiled import open_raster, stream_lut, stream_luts
+
+
+@pytest.mark.parametrize("dst_ext", [".npy", ".tif", ".raw"])
+def test_stream_matches_apply_luts(tmp_path, planes, luts, dst_ext):
+    gray = planes["noise"]
+    src = str(tmp_path / "in.npy")
+    np.save(src, gray)
+    dsts = [str(tmp_path / ("out%d%s" % (i, dst_ext))) for i in range(2)]
+    outs = stream_luts(src, luts, dsts, strip_bytes=1000)  # many strips
+    for out, want in zip(outs, apply_luts(gray, luts)):
+        assert np.array_equal(out.read(), want)
+    if dst_ext == ".tif":
+        with Image.open(dsts[0]) as img:
+            assert np.array_equal(np.asarray(img), outs[0].read())
+
+
+def test_stream_rgb_matches_pil_convert(tmp_path, rng, luts):
+    rgb = rng.integers(0, 256, size=(64, 80, 3), dtype=np.uint8)
+    path = str(tmp_path / "in.tif")
+    Image.fromarray(rgb).save(path)
+    out = stream_lut(path, luts[0], str(tmp_path / "out.npy"), strip_bytes=2000)
+    gray = np.asarray(Image.fromarray(rgb).convert("L"))
+    assert np.array_equal(out.read(), luts[0][gray])
+    assert open_raster(path).shape == (64, 80, 3)
+
+
+def test_stream_refuses_to_overwrite_input(tmp_path, planes, luts):
+    src = str(tmp_path / "x.npy")
+    np.save(src, planes["noise"])
+    with pytest.raises(ValueError):
+        stream_lut(src, luts[0], str(tmp_path / "." / "x.npy"))
+    assert np.array_equal(np.load(src), planes["noise"])
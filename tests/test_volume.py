@@ -0,0 +1,47 @@
+# Volume LUTs against one LUT per slice.
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from common.histogram import bincount_u8
+from common.volume import is_volume, volume_luts
+
+
+def test_volume_matches_per_slice(tmp_path, rng, luts):
+    vol = rng.integers(0, 256, size=(6, 30, 40), dtype=np.uint8)
+    src = str(tmp_path / "vol.npy")
+    np.save(src, vol)
+    dsts = [str(tmp_path / "a.npy"), str(tmp_path / "b.npy")]
+    hists = volume_luts(src, luts, dsts, workers=3)
+    for dst, lut, out_hist in zip(dsts, luts, hists["out_volume_hist"]):
+        out = np.load(dst)
+        assert np.array_equal(out, lut[vol])
+        assert np.array_equal(out_hist, np.bincount(out.ravel(), minlength=256))
+    for i in range(len(vol)):
+        assert np.array_equal(hists["slice_hist"][i], bincount_u8(vol[i]))
+
+
+def test_volume_from_slice_directory(tmp_path, rng, luts):
+    vol = rng.integers(0, 256, size=(12, 20, 30), dtype=np.uint8)
+    folder = tmp_path / "slices"
+    folder.mkdir()
+    for i, s in enumerate(vol):
+        Image.fromarray(s).save(folder / ("slice_%d.png" % i))  # natural order
+    dst = str(tmp_path / "out.npy")
+    volume_luts(str(folder), luts[:1], [dst], workers=1)
+    assert np.array_equal(np.load(dst), luts[0][vol])
+
+
+def test_volume_detection_and_outputs(tmp_path, rng, luts):
+    rgb = str(tmp_path / "rgb.npy")
+    np.save(rgb, rng.integers(0, 256, size=(64, 80, 3), dtype=np.uint8))
+    vol = str(tmp_path / "vol.npy")
+    np.save(vol, rng.integers(0, 256, size=(4, 20, 30), dtype=np.uint8))
+    assert not is_volume(rgb)
+    assert is_volume(vol)
+    assert is_volume(str(tmp_path))
+    with pytest.raises(ValueError):
+        volume_luts(vol, luts[:1], [str(tmp_path / "out.tif")])
+    with pytest.raises(ValueError):
+        volume_luts(vol, luts[:1], [vol])